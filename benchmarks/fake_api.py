@@ -0,0 +1,381 @@
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+from dataclasses import field, dataclass
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qsl
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+BOT_ID = 1
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found"}
+
+
+@dataclass
+class APICall:
+    method: str
+    params: dict
+    files: dict[str, bytes]
+    timestamp: float = field(default_factory=time.monotonic)
+
+
+def _decode_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _parse_multipart(content_type: str, body: bytes) -> tuple[dict, dict]:
+    message = BytesParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    params, files = {}, {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        if part.get_filename() is not None:
+            files[name] = payload
+        else:
+            params[name] = _decode_value(payload.decode())
+    return params, files
+
+
+class FakeTelegramAPI:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8081,
+        latency: float = 0.0,
+        bot_username: str = "carry_fake_bot",
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.bot_username = bot_username
+        self.calls: list[APICall] = []
+        self.files: dict[str, bytes] = {}
+        self.webhook_url: str | None = None
+        self.webhook_secret: str | None = None
+        self._updates: asyncio.Queue[dict] = asyncio.Queue()
+        self._server: asyncio.Server | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._connections: set[asyncio.Task] = set()
+        self._next_update_id = 1
+        self._next_message_id = 1
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return f"http://{self.host}:{self.port}/file/bot"
+
+    @property
+    def bot_user(self) -> dict:
+        return {
+            "id": BOT_ID,
+            "is_bot": True,
+            "first_name": "Carry",
+            "username": self.bot_username,
+            "can_join_groups": False,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False,
+        }
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"[CARRY] Fake Telegram API is listening on {self.base_url}")
+
+    async def stop(self) -> None:
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "FakeTelegramAPI":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
+
+    def calls_to(self, method: str) -> list[APICall]:
+        return [call for call in self.calls if call.method == method]
+
+    def add_file(self, content: bytes) -> str:
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = content
+        return file_id
+
+    def make_message_update(
+        self,
+        user_id: int,
+        text: str,
+        first_name: str = "User",
+        username: str | None = None,
+        document: dict | None = None,
+    ) -> dict:
+        message = {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {
+                "id": user_id,
+                "is_bot": False,
+                "first_name": first_name,
+                "username": username,
+            },
+        }
+        if document is not None:
+            message["document"] = document
+            message["caption"] = text
+        else:
+            message["text"] = text
+        if text.startswith("/"):
+            command = text.split()[0]
+            entities = [
+                {"type": "bot_command", "offset": 0, "length": len(command)}
+            ]
+            message["caption_entities" if document else "entities"] = entities
+        return {"message": message}
+
+    def make_callback_query_update(self, user_id: int, data: str) -> dict:
+        return {
+            "callback_query": {
+                "id": uuid.uuid4().hex,
+                "chat_instance": str(user_id),
+                "data": data,
+                "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+                "message": {
+                    "message_id": self._new_message_id(),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": self.bot_user,
+                    "text": "...",
+                },
+            }
+        }
+
+    async def push_update(self, update: dict) -> None:
+        update = {"update_id": self._next_update_id, **update}
+        self._next_update_id += 1
+
+        if self.webhook_url is None:
+            await self._updates.put(update)
+            return
+
+        headers = {}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        response = await self._client.post(
+            self.webhook_url, json=update, headers=headers
+        )
+        response.raise_for_status()
+
+    def _new_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    def _message(self, params: dict, **content) -> dict:
+        return {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": self.bot_user,
+            **content,
+        }
+
+    def _file(self, files: dict, name: str, params: dict) -> dict:
+        content = files.get(name)
+        file_id = (
+            self.add_file(content)
+            if content is not None
+            else str(params.get(name))
+        )
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": len(self.files.get(file_id, b"")),
+        }
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        timeout = float(params.get("timeout", 0))
+        limit = int(params.get("limit", 100))
+        updates = []
+        try:
+            updates.append(
+                await asyncio.wait_for(self._updates.get(), timeout or 0.01)
+            )
+        except asyncio.TimeoutError:
+            return updates
+
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def call(self, method: str, params: dict, files: dict):
+        self.calls.append(APICall(method, params, files))
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+
+        match method:
+            case "getMe":
+                return self.bot_user
+            case "getUpdates":
+                return await self._get_updates(params)
+            case "setWebhook":
+                self.webhook_url = params.get("url") or None
+                self.webhook_secret = params.get("secret_token")
+                return True
+            case "deleteWebhook":
+                self.webhook_url = self.webhook_secret = None
+                return True
+            case "getWebhookInfo":
+                return {
+                    "url": self.webhook_url or "",
+                    "has_custom_certificate": False,
+                    "pending_update_count": self._updates.qsize(),
+                }
+            case "sendMessage" | "editMessageText":
+                return self._message(params, text=params.get("text", ""))
+            case "sendPhoto":
+                photo = {
+                    **self._file(files, "photo", params),
+                    "width": 370,
+                    "height": 370,
+                }
+                return self._message(params, photo=[photo])
+            case "sendDocument":
+                document = self._file(files, "document", params)
+                return self._message(params, document=document)
+            case "getFile":
+                file_id = params["file_id"]
+                return {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "file_size": len(self.files.get(file_id, b"")),
+                    "file_path": file_id,
+                }
+            case _:
+                return True
+
+    async def _handle_request(
+        self, method: str, target: str, headers: dict, body: bytes
+    ) -> tuple[int, str, bytes]:
+        path = urlsplit(target).path
+        content_type = headers.get("content-type", "")
+
+        if path == "/fake/updates" and method == "POST":
+            await self.push_update(json.loads(body))
+            return 200, "application/json", b'{"ok": true}'
+
+        if path == "/fake/calls":
+            calls = [
+                {
+                    "method": call.method,
+                    "params": call.params,
+                    "timestamp": call.timestamp,
+                }
+                for call in self.calls
+            ]
+            return 200, "application/json", json.dumps(calls).encode()
+
+        if path.startswith("/file/bot"):
+            content = self.files.get(path.rsplit("/", 1)[-1])
+            if content is None:
+                return 404, "text/plain", b"Not Found"
+            return 200, "application/octet-stream", content
+
+        if not path.startswith("/bot"):
+            return 404, "text/plain", b"Not Found"
+
+        files = {}
+        if content_type.startswith("multipart/form-data"):
+            params, files = _parse_multipart(content_type, body)
+        elif content_type.startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            query = body.decode() or urlsplit(target).query
+            params = {k: _decode_value(v) for k, v in parse_qsl(query)}
+
+        result = await self.call(path.rsplit("/", 1)[-1], params, files)
+        response = {"ok": True, "result": result}
+        return 200, "application/json", json.dumps(response).encode()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while request_line := await reader.readline():
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(
+                    int(headers.get("content-length", 0))
+                )
+                status, content_type, payload = await self._handle_request(
+                    method, target, headers, body
+                )
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        "\r\n"
+                    ).encode()
+                    + payload
+                )
+                await writer.drain()
+        except (
+            ConnectionError,
+            asyncio.CancelledError,
+            asyncio.IncompleteReadError,
+        ):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+
+async def _serve(host: str, port: int, latency: float) -> None:
+    async with FakeTelegramAPI(host, port, latency):
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(args.host, args.port, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+from load_test import DisposableDatabase, percentile
+
+USER_ID = 1
+
+
+async def create_schema() -> None:
+    from carry.db import users
+    from carry.db.core import database, metadata
+
+    async with database.engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+        await connection.execute(
+            users.insert().values(
+                id=USER_ID, chat_id=USER_ID, first_name="Bench", bonuses=0
+            )
+        )
+
+
+async def hammer(build, workers: int, operations: int) -> tuple[float, list]:
+    from carry.db.core import database
+
+    latencies = []
+
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            query, params = build()
+            started = time.perf_counter()
+            async with database.engine.begin() as connection:
+                await connection.execute(query, params)
+                await asyncio.sleep(0.001)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(worker(operations // workers) for _ in range(workers))
+    )
+    return time.perf_counter() - started, latencies
+
+
+async def measure_writes(workers: int, operations: int) -> None:
+    from sqlalchemy import update
+
+    from carry.db import users
+    from carry.core.entities import BonusReason
+    from carry.core.repositories import ADD_BONUSES
+
+    cases = {
+        "update hot row": lambda: (
+            update(users)
+            .where(users.c.id == USER_ID)
+            .values(bonuses=users.c.bonuses + 1),
+            None,
+        ),
+        "append to ledger": lambda: (
+            ADD_BONUSES,
+            {"user_id": USER_ID, "delta": 1, "reason": BonusReason.INCREASE},
+        ),
+    }
+    print(f"{'increase':<22}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, build in cases.items():
+        elapsed, latencies = await hammer(build, workers, operations)
+        print(
+            f"{name:<22}{len(latencies) / elapsed:>10.0f}"
+            f"{statistics.median(latencies) * 1e3:>10.2f}"
+            f"{percentile(latencies, 0.95) * 1e3:>10.2f}"
+        )
+
+
+async def fetch_balance_time(rounds: int) -> float:
+    from carry.db.core import database
+    from carry.core.repositories import FETCH_BALANCE
+
+    async with database.engine.connect() as connection:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            result = await connection.execute(
+                FETCH_BALANCE, {"user_id": USER_ID}
+            )
+            result.scalar_one()
+        return (time.perf_counter() - started) / rounds
+
+
+async def measure_reads(rounds: int) -> None:
+    from carry.telegram_bot.ledger import ledger_compactor
+
+    before = await fetch_balance_time(rounds)
+    compacted = await ledger_compactor.compact()
+    after = await fetch_balance_time(rounds)
+    print(
+        f"fetch_balance µs: {before * 1e6:.1f} with the ledger tail, "
+        f"{after * 1e6:.1f} after compacting {compacted} balances"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    from carry.db.core import database
+
+    await create_schema()
+    try:
+        await measure_writes(args.workers, args.operations)
+        await measure_reads(args.rounds)
+    finally:
+        await database.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Concurrent increments of one balance: hot row UPDATE "
+        "against ledger appends, and balance reads before/after compaction"
+    )
+    parser.add_argument(
+        "--postgres",
+        required=True,
+        help="maintenance database used to create a disposable database",
+    )
+    parser.add_argument("--workers", type=int, default=12)
+    parser.add_argument("--operations", type=int, default=2400)
+    parser.add_argument("--rounds", type=int, default=1000)
+    args = parser.parse_args()
+
+    database = DisposableDatabase(args.postgres)
+    asyncio.run(database.create())
+    os.environ["CARRY_DB__URI"] = database.uri
+    try:
+        asyncio.run(run(args))
+    finally:
+        asyncio.run(database.drop())
+
+
+if __name__ == "__main__":
+    main()
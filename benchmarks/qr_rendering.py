@@ -0,0 +1,85 @@
+import time
+import asyncio
+import argparse
+import statistics
+
+from carry.core.bl import render_qr_code
+from carry.core.qr import QRCodeRenderer
+
+URL = "https://t.me/carry_bot?start={}"
+
+
+def bench_output(output: str, rounds: int) -> float:
+    started = time.perf_counter()
+    for user_id in range(rounds):
+        render_qr_code(URL.format(user_id), output)
+    return (time.perf_counter() - started) / rounds
+
+
+async def _measure_loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    interval = 0.001
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def bench_renderer(
+    executor: str, output: str, requests: int, workers: int
+) -> dict:
+    renderer = QRCodeRenderer(
+        executor=executor,
+        max_workers=workers,
+        max_queue=requests,
+        output=output,
+    )
+    await renderer.render(URL.format(0))
+
+    stop, lags = asyncio.Event(), []
+    lag_task = asyncio.create_task(_measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(renderer.render(URL.format(user_id)) for user_id in range(requests))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+    renderer.shutdown()
+
+    return {
+        "throughput": requests / elapsed,
+        "max_loop_lag": max(lags, default=0.0),
+        "mean_loop_lag": statistics.fmean(lags) if lags else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="QR-code rendering benchmark")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    print("Single render (ms per image):")
+    for output in ("pypng", "fast"):
+        print(f"  {output:<8}{bench_output(output, args.rounds) * 1000:8.2f}")
+
+    print(
+        f"\n{args.requests} concurrent renders, {args.workers} workers "
+        "(images/s, max/mean event loop lag in ms):"
+    )
+    for executor in ("inline", "thread", "process"):
+        for output in ("pypng", "fast"):
+            result = asyncio.run(
+                bench_renderer(executor, output, args.requests, args.workers)
+            )
+            print(
+                f"  {executor:<8}{output:<8}"
+                f"{result['throughput']:8.1f}"
+                f"{result['max_loop_lag'] * 1000:10.2f}"
+                f"{result['mean_loop_lag'] * 1000:10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import json
+import asyncio
+import argparse
+
+from load_test import DisposableDatabase
+from sqlalchemy.engine import make_url
+
+WRITER_ID, READER_ID = 1, 2
+
+
+async def create_schema() -> None:
+    from carry.db import users
+    from carry.db.core import database, metadata
+
+    async with database.engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+        await connection.execute(
+            users.insert(),
+            [
+                {
+                    "id": user_id,
+                    "chat_id": user_id,
+                    "first_name": "Bench",
+                    "bonuses": 0,
+                }
+                for user_id in (WRITER_ID, READER_ID)
+            ],
+        )
+
+
+async def wait_for_replicas(timeout: float) -> None:
+    from carry.db.core import replica_router
+
+    await replica_router.start()
+    for _ in range(int(timeout / replica_router.check_interval)):
+        if all(replica.healthy for replica in replica_router.replicas):
+            return
+        await asyncio.sleep(replica_router.check_interval)
+    raise RuntimeError("Replicas are not replaying the primary")
+
+
+async def read_after_writes(rounds: int, pin_window: float) -> tuple:
+    from carry.context import ctx
+    from carry.db.core import replica_router
+    from carry.db.replicas import routed_reads
+    from carry.core.repositories import UserRepository
+
+    @ctx.with_request_context
+    async def write() -> int:
+        user = await ctx.user_repository.increase_user_balance(WRITER_ID, 1)
+        return user.bonuses
+
+    @ctx.with_request_context(read_only=True)
+    async def read(user_id: int) -> int:
+        return await UserRepository(ctx.db_scope).fetch_balance(user_id)
+
+    replica_router.pin_window = pin_window
+    routed_reads._values.clear()
+    stale = 0
+    for _ in range(rounds):
+        expected = await write()
+        stale += await read(WRITER_ID) < expected
+        await read(READER_ID)
+
+    routed = dict(routed_reads._values)
+    primary = routed.pop(("primary",), 0)
+    return stale, primary, sum(routed.values())
+
+
+async def run(args: argparse.Namespace) -> None:
+    from carry.db.core import database, replica_router
+
+    await create_schema()
+    try:
+        await wait_for_replicas(args.timeout)
+        print(f"{'pin window':<14}{'stale':>8}{'primary':>10}{'replica':>10}")
+        for pin_window in (0.0, args.pin_window):
+            stale, primary, replica = await read_after_writes(
+                args.rounds, pin_window
+            )
+            print(f"{pin_window:<14}{stale:>8}{primary:>10}{replica:>10}")
+    finally:
+        await replica_router.stop()
+        await database.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Reads a balance right after changing it: stale replica "
+        "reads with and without read-your-writes pins"
+    )
+    parser.add_argument(
+        "--postgres",
+        required=True,
+        help="maintenance database of the primary",
+    )
+    parser.add_argument(
+        "--replica",
+        required=True,
+        help="maintenance database of a streaming replica of the primary",
+    )
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--pin-window", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    database = DisposableDatabase(args.postgres)
+    replica_uri = (
+        make_url(args.replica)
+        .set(drivername="postgresql+asyncpg", database=database.name)
+        .render_as_string(hide_password=False)
+    )
+    asyncio.run(database.create())
+    os.environ["CARRY_DB__URI"] = database.uri
+    os.environ["CARRY_DB_REPLICAS__URIS"] = json.dumps([replica_uri])
+    os.environ["CARRY_DB_REPLICAS__CHECK_INTERVAL"] = "0.05"
+    try:
+        asyncio.run(run(args))
+    finally:
+        asyncio.run(database.drop())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import argparse
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from carry.db import users, bonus_transactions
+from carry.db.core import engine_options
+from carry.core.entities import BonusReason
+from carry.core.repositories import ADD_BONUSES, USER_COLUMNS, FETCH_USER_BY_ID
+
+USER_ID = 1
+
+
+def fetch_user_before(user_id: int):
+    return select(
+        users.c.id,
+        users.c.chat_id,
+        users.c.first_name,
+        users.c.last_name,
+        users.c.username,
+        users.c.bonuses,
+    ).where(users.c.id == user_id)
+
+
+def increase_balance_before(user_id: int, bonuses: int):
+    return (
+        update(users)
+        .where(users.c.id == user_id)
+        .values(bonuses=users.c.bonuses + bonuses)
+        .returning(
+            users.c.id,
+            users.c.chat_id,
+            users.c.first_name,
+            users.c.last_name,
+            users.c.username,
+            users.c.bonuses,
+        )
+    )
+
+
+CASES = {
+    "fetch_user_by_id": (
+        lambda: (fetch_user_before(USER_ID), None),
+        lambda: (FETCH_USER_BY_ID, {"user_id": USER_ID}),
+    ),
+    "increase_user_balance": (
+        lambda: (increase_balance_before(USER_ID, 1), None),
+        lambda: (
+            ADD_BONUSES,
+            {"user_id": USER_ID, "delta": 1, "reason": BonusReason.INCREASE},
+        ),
+    ),
+}
+POSTGRES_ONLY = ("fetch_user_by_id", "increase_user_balance")
+
+
+def bench_build(build, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        build()
+    return (time.perf_counter() - started) / rounds
+
+
+async def bench_execute(session_factory, build, rounds: int) -> float:
+    async with session_factory() as session:
+        query, params = build()
+        await session.execute(query, params)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            query, params = build()
+            (await session.execute(query, params)).one()
+        elapsed = time.perf_counter() - started
+        await session.rollback()
+    return elapsed / rounds
+
+
+async def prepare(uri: str, prepared_statements: bool):
+    engine = create_async_engine(
+        uri, **engine_options(uri, prepared_statements)
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(users.create, checkfirst=True)
+        if engine.dialect.name == "postgresql":
+            await conn.run_sync(bonus_transactions.create, checkfirst=True)
+        await conn.execute(users.delete().where(users.c.id == USER_ID))
+        await conn.execute(
+            users.insert().values(
+                id=USER_ID, chat_id=USER_ID, first_name="Bench", bonuses=0
+            )
+        )
+    return engine
+
+
+async def cleanup(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(users.delete().where(users.c.id == USER_ID))
+        if engine.dialect.name == "postgresql":
+            await conn.execute(
+                bonus_transactions.delete().where(
+                    bonus_transactions.c.user_id == USER_ID
+                )
+            )
+    await engine.dispose()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Repository statement build and execution benchmark"
+    )
+    parser.add_argument("--rounds", type=int, default=5000)
+    parser.add_argument(
+        "--db-uri",
+        default="sqlite+aiosqlite://",
+        help="database to execute against, e.g. a disposable Postgres",
+    )
+    args = parser.parse_args()
+
+    print(f"{'case':<40}{'before µs':>11}{'after µs':>11}{'speedup':>9}")
+    for name, (before, after) in CASES.items():
+        build_before = bench_build(before, args.rounds)
+        build_after = bench_build(after, args.rounds)
+        print(
+            f"{name + ' build':<40}{build_before * 1e6:>11.1f}"
+            f"{build_after * 1e6:>11.1f}{build_before / build_after:>8.1f}x"
+        )
+
+    modes = [True]
+    if args.db_uri.startswith("postgresql+asyncpg"):
+        modes.append(False)
+    for prepared_statements in modes:
+        engine = await prepare(args.db_uri, prepared_statements)
+        session_factory = sessionmaker(
+            bind=engine, expire_on_commit=False, class_=AsyncSession
+        )
+        label = "" if prepared_statements else " (no prepared)"
+        for name, (before, after) in CASES.items():
+            if name in POSTGRES_ONLY and engine.dialect.name != "postgresql":
+                continue
+            execute_before = await bench_execute(
+                session_factory, before, args.rounds
+            )
+            execute_after = await bench_execute(
+                session_factory, after, args.rounds
+            )
+            print(
+                f"{name + ' execute' + label:<40}"
+                f"{execute_before * 1e6:>11.1f}{execute_after * 1e6:>11.1f}"
+                f"{execute_before / execute_after:>8.1f}x"
+            )
+        await cleanup(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
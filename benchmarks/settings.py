@@ -0,0 +1,48 @@
+import time
+import argparse
+
+from carry.config import settings, settings_store
+
+
+def bench(lookup, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        lookup()
+    return (time.perf_counter() - started) / rounds * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Dynaconf lookups against the compiled settings snapshot"
+    )
+    parser.add_argument("--rounds", type=int, default=200000)
+    args = parser.parse_args()
+
+    user_id = max(settings.admin_ids) + 1
+    cases = {
+        "is_admin": (
+            lambda: user_id in settings.admin_ids,
+            lambda: user_id in settings_store.snapshot.admin_ids,
+        ),
+        "links": (
+            lambda: settings.usefull_links.instagram,
+            lambda: settings_store.snapshot.links.instagram,
+        ),
+        "db_options": (
+            lambda: settings.db_engine.query_cache_size,
+            lambda: settings_store.snapshot.db.query_cache_size,
+        ),
+    }
+
+    print(f"{'lookup':<14}{'dynaconf ns':>14}{'snapshot ns':>14}{'x':>8}")
+    for name, (before, after) in cases.items():
+        before_ns = bench(before, args.rounds)
+        after_ns = bench(after, args.rounds)
+        print(
+            f"{name:<14}{before_ns:>14.1f}{after_ns:>14.1f}"
+            f"{before_ns / after_ns:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
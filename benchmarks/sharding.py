@@ -0,0 +1,77 @@
+import os
+import time
+import asyncio
+import argparse
+
+from carry.telegram_bot.logging import setup_logging
+
+HOST, PORT = "127.0.0.1", 8081
+
+
+async def wait_replies(api, expected: int, timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        replies = len(api.calls_to("sendMessage"))
+        if replies >= expected:
+            return replies
+        await asyncio.sleep(0.1)
+    return len(api.calls_to("sendMessage"))
+
+
+async def run(args: argparse.Namespace) -> None:
+    from fake_api import FakeTelegramAPI
+
+    from carry.telegram_bot.workers import ShardSupervisor, serve_sharded
+
+    async with FakeTelegramAPI(HOST, PORT, args.latency) as api:
+        supervisor = ShardSupervisor(args.workers, heartbeat_interval=1.0)
+        stopping = asyncio.Event()
+        serving = asyncio.create_task(serve_sharded(supervisor, stopping))
+        while not all(health.heartbeat_at for health in supervisor.health):
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(args.warmup)
+
+        started = time.monotonic()
+        for i in range(args.updates):
+            user_id = 1000 + i % args.users
+            await api.push_update(api.make_message_update(user_id, "/help"))
+            if args.restart and i == args.updates // 2:
+                await supervisor.restart(0)
+
+        replies = await wait_replies(api, args.updates, args.timeout)
+        elapsed = time.monotonic() - started
+        stopping.set()
+        await serving
+
+    print(f"{'shard':<8}{'restarts':>10}{'received':>10}")
+    for health in supervisor.health:
+        print(f"{health.index:<8}{health.restarts:>10}{health.received:>10}")
+    print(
+        f"replies: {replies} / {args.updates}, "
+        f"{replies / elapsed:.1f} updates/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs sharded bot workers against the fake Telegram API"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("CARRY_TELEGRAM__TOKEN", "1:fake")
+    os.environ["CARRY_BOT__MODE"] = "polling"
+    os.environ["CARRY_BOT__BASE_URL"] = f"http://{HOST}:{PORT}/bot"
+    os.environ["CARRY_BOT__BASE_FILE_URL"] = f"http://{HOST}:{PORT}/file/bot"
+    setup_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
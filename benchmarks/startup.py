@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+from load_test import DisposableDatabase, git_commit
+
+HOST, PORT = "127.0.0.1", 8082
+MODULE = "carry.telegram_bot.factories"
+TRACKED = (
+    MODULE,
+    "carry.db.core",
+    "carry.core.repositories",
+    "telegram.ext",
+    "sqlalchemy",
+    "sqlalchemy.orm",
+    "asyncpg",
+    "jinja2",
+    "qrcode",
+    "dynaconf",
+)
+
+
+def import_times(module: str) -> dict[str, int]:
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.setdefault(name.strip(), int(cumulative))
+    return {name: times.get(name, 0) for name in TRACKED}
+
+
+def measure_imports(runs: int) -> dict[str, float]:
+    samples = [import_times(MODULE) for _ in range(runs)]
+    return {
+        name: statistics.median(sample[name] for sample in samples) / 1e6
+        for name in TRACKED
+    }
+
+
+async def first_update_time(timeout: float) -> float:
+    from fake_api import FakeTelegramAPI
+
+    async with FakeTelegramAPI(HOST, PORT) as api:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "carry.telegram_bot"
+        )
+        await api.push_update(api.make_message_update(1000, "/help"))
+        try:
+            while not api.calls_to("sendMessage"):
+                if time.perf_counter() - started > timeout:
+                    raise TimeoutError("The bot has not answered in time")
+                await asyncio.sleep(0.005)
+            return time.perf_counter() - started
+        finally:
+            process.terminate()
+            await process.wait()
+
+
+async def create_schema() -> None:
+    from carry.db.core import database, metadata
+
+    async with database.engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+    await database.dispose()
+
+
+async def measure_first_update(runs: int, timeout: float) -> float:
+    await create_schema()
+    samples = [await first_update_time(timeout) for _ in range(runs)]
+    return statistics.median(samples)
+
+
+def compare(result: dict, baseline: dict | None, threshold: float) -> bool:
+    current = {**result["imports"], "first_update": result["first_update"]}
+    before = {}
+    if baseline is not None:
+        before = {
+            **baseline["imports"],
+            "first_update": baseline["first_update"],
+        }
+
+    regressed = False
+    print(f"{'phase':<28}{'seconds':>10}{'Δ':>9}")
+    for name, value in current.items():
+        if value is None:
+            continue
+
+        delta = ""
+        if before.get(name):
+            change = (value - before[name]) / before[name]
+            delta = f"{change:+.0%}"
+            if name in (MODULE, "first_update") and change > threshold:
+                regressed = True
+        print(f"{name:<28}{value:>10.3f}{delta:>9}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Tracks import time and time to the first handled update"
+    )
+    parser.add_argument(
+        "--postgres",
+        help="maintenance database used to create a disposable database, "
+        "time to the first update is not measured without it",
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="file to save JSON results to")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed slowdown against the baseline before failing",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("CARRY_TELEGRAM__TOKEN", "1:fake")
+    os.environ["CARRY_WORKERS__COUNT"] = "1"
+    os.environ["CARRY_BOT__MODE"] = "polling"
+    os.environ["CARRY_BOT__BASE_URL"] = f"http://{HOST}:{PORT}/bot"
+    os.environ["CARRY_BOT__BASE_FILE_URL"] = f"http://{HOST}:{PORT}/file/bot"
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "imports": measure_imports(args.runs),
+        "first_update": None,
+    }
+    if args.postgres:
+        database = DisposableDatabase(args.postgres)
+        asyncio.run(database.create())
+        os.environ["CARRY_DB__URI"] = database.uri
+        try:
+            result["first_update"] = asyncio.run(
+                measure_first_update(args.runs, args.timeout)
+            )
+        finally:
+            asyncio.run(database.drop())
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressed = compare(result, baseline, args.threshold)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if regressed:
+        sys.exit(f"Startup is more than {args.threshold:.0%} slower")
+
+
+if __name__ == "__main__":
+    main()
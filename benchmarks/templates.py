@@ -0,0 +1,72 @@
+import time
+import argparse
+
+import jinja2
+
+from carry.config import settings
+from carry.core.templates import TemplateEngine
+
+TEMPLATES = (
+    "telegram/increase_bonuses/admin.jinja2",
+    "telegram/increase_bonuses/user.jinja2",
+    "telegram/decrease_bonuses/admin.jinja2",
+    "telegram/decrease_bonuses/user.jinja2",
+)
+PARAMS = {
+    "user_info": "Kerry Queen @kerry_queen",
+    "bonuses": 150,
+    "total_bonuses": 1200,
+}
+
+_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(searchpath=settings.templates_dir),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    autoescape=True,
+)
+
+
+def render_template_before(template_name: str, data: dict | None = None):
+    if data is None:
+        data = {}
+
+    template = _env.get_template(template_name)
+    return template.render(**data).replace("<br/>", "\n")
+
+
+def bench(render, template_name: str, data: dict | None, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        render(template_name, data)
+    return rounds / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Template rendering benchmark"
+    )
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    engine = TemplateEngine(settings.templates_dir)
+    engine.preload()
+
+    print(f"{'template':<42}{'before/s':>12}{'after/s':>12}{'speedup':>9}")
+    cases = [(name, PARAMS) for name in TEMPLATES]
+    cases.append(("telegram/help.jinja2", None))
+    for template_name, data in cases:
+        assert render_template_before(template_name, data) == engine.render(
+            template_name, data
+        )
+        before = bench(
+            render_template_before, template_name, data, args.rounds
+        )
+        after = bench(engine.render, template_name, data, args.rounds)
+        print(
+            f"{template_name:<42}{before:12.0f}{after:12.0f}"
+            f"{after / before:8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+import asyncio
+import logging
+import argparse
+
+from carry.core.bl import copy_format
+from carry.db.core import database
+from carry.core.bulk import copy_users_in, copy_users_out
+from carry.telegram_bot.logging import setup_logging
+
+log = logging.getLogger(__name__)
+
+
+async def run(args: argparse.Namespace) -> None:
+    format = args.format or copy_format(args.path)
+    try:
+        if args.command == "export-users":
+            if args.path == "-":
+                rows = await copy_users_out(sys.stdout.buffer, format)
+            else:
+                with open(args.path, "wb") as output:
+                    rows = await copy_users_out(output, format)
+            log.info(f"[CARRY] Exported {rows} users to {args.path}")
+        else:
+            if args.path == "-":
+                rows = await copy_users_in(sys.stdin.buffer, format)
+            else:
+                with open(args.path, "rb") as source:
+                    rows = await copy_users_in(source, format)
+            log.info(f"[CARRY] Imported {rows} users from {args.path}")
+    finally:
+        await database.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Streams the users table with Postgres COPY"
+    )
+    parser.add_argument("command", choices=("export-users", "import-users"))
+    parser.add_argument("path", help="file path or - for stdin/stdout")
+    parser.add_argument(
+        "--format",
+        choices=("csv", "binary"),
+        help="defaults to binary for .bin files and csv otherwise",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,83 @@
+import logging
+from typing import Callable
+from dataclasses import dataclass
+
 from dynaconf import Dynaconf
 
+log = logging.getLogger(__name__)
+
 settings = Dynaconf(
     envvar_prefix="CARRY",
     settings_files=["settings.toml", ".secrets.toml"],
     environments=True,
     load_dotenv=True,
 )
+
+
+@dataclass(frozen=True, slots=True)
+class LinksSnapshot:
+    instagram: str
+    easyweek: str
+
+
+@dataclass(frozen=True, slots=True)
+class DBSnapshot:
+    uri: str
+    query_cache_size: int
+    prepared_statements: bool
+    prepared_statement_cache_size: int
+    replicas: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class SettingsSnapshot:
+    admin_ids: frozenset[int]
+    links: LinksSnapshot
+    db: DBSnapshot
+
+    @classmethod
+    def build(cls, settings: Dynaconf) -> "SettingsSnapshot":
+        return cls(
+            admin_ids=frozenset(map(int, settings.admin_ids)),
+            links=LinksSnapshot(
+                instagram=settings.usefull_links.instagram,
+                easyweek=settings.usefull_links.easyweek,
+            ),
+            db=DBSnapshot(
+                uri=settings.db.uri,
+                query_cache_size=settings.db_engine.query_cache_size,
+                prepared_statements=settings.db_engine.prepared_statements,
+                prepared_statement_cache_size=(
+                    settings.db_engine.prepared_statement_cache_size
+                ),
+                replicas=tuple(settings.db_replicas.uris),
+            ),
+        )
+
+
+class SettingsStore:
+    def __init__(self, settings: Dynaconf):
+        self.settings = settings
+        self.snapshot = SettingsSnapshot.build(settings)
+        self._listeners: list[Callable[[SettingsSnapshot], None]] = []
+
+    def subscribe(self, listener: Callable[[SettingsSnapshot], None]) -> None:
+        self._listeners.append(listener)
+
+    def reload(self) -> None:
+        try:
+            self.settings.reload()
+            snapshot = SettingsSnapshot.build(self.settings)
+        except Exception:
+            log.exception("[CARRY] Cannot reload settings, keeping old ones")
+            return
+
+        self.snapshot = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+        log.info(
+            f"[CARRY] Settings are reloaded, {len(snapshot.admin_ids)} admins"
+        )
+
+
+settings_store = SettingsStore(settings)
@@ -1,41 +1,117 @@
+import logging
 from typing import TYPE_CHECKING, TypeVar, Callable, Awaitable, ParamSpec
-from functools import wraps
-from contextlib import AsyncExitStack
+from functools import wraps, partial
 from contextvars import ContextVar
 
-from carry.db.core import db_session_ctx
-from carry.core.repositories import UserRepository
+from carry.db.core import DBSessionScope, db_session_ctx
+from carry.core.cache import user_cache, profile_cache, user_cache_listener
+from carry.core.search import user_search_index
+from carry.core.repositories import (
+    Repository,
+    UserRepository,
+    OutboxRepository,
+    QRCodeRepository,
+    BroadcastRepository,
+    CachedUserRepository,
+    BonusExpiryRepository,
+    BonusLedgerRepository,
+    PersistenceRepository,
+)
 
 if TYPE_CHECKING:
     from sqlalchemy.ext.asyncio import AsyncSession
 
 P = ParamSpec("P")
+R = TypeVar("R", bound=Repository)
 RT = TypeVar("RT")
+log = logging.getLogger(__name__)
+
+
+def _create_user_repository(db_scope: DBSessionScope) -> UserRepository:
+    return CachedUserRepository(
+        db_scope,
+        cache=user_cache,
+        profiles=profile_cache,
+        listener=user_cache_listener,
+        search_index=user_search_index,
+    )
 
 
 class Context:
-    ctx_db: ContextVar["AsyncSession"] = ContextVar("db_session")
+    ctx_db: ContextVar[DBSessionScope] = ContextVar("db_scope")
 
     @property
-    def db_session(self) -> "AsyncSession":
+    def db_scope(self) -> DBSessionScope:
         return self.ctx_db.get()
 
+    @property
+    def db_session(self) -> "AsyncSession":
+        return self.db_scope.session
+
+    def _get_repository(self, factory: Callable[[DBSessionScope], R]) -> R:
+        repositories = self.db_scope.repositories
+        repository = repositories.get(factory)
+        if repository is None:
+            repository = repositories[factory] = factory(self.db_scope)
+        return repository
+
     @property
     def user_repository(self) -> UserRepository:
-        return UserRepository(self.db_session)
+        return self._get_repository(_create_user_repository)
+
+    @property
+    def qr_code_repository(self) -> QRCodeRepository:
+        return self._get_repository(QRCodeRepository)
+
+    @property
+    def outbox_repository(self) -> OutboxRepository:
+        return self._get_repository(OutboxRepository)
+
+    @property
+    def broadcast_repository(self) -> BroadcastRepository:
+        return self._get_repository(BroadcastRepository)
+
+    @property
+    def ledger_repository(self) -> BonusLedgerRepository:
+        return self._get_repository(BonusLedgerRepository)
+
+    @property
+    def expiry_repository(self) -> BonusExpiryRepository:
+        return self._get_repository(BonusExpiryRepository)
+
+    @property
+    def persistence_repository(self) -> PersistenceRepository:
+        return self._get_repository(PersistenceRepository)
 
     def with_request_context(
         self,
-        func: Callable[P, Awaitable[RT]],
+        func: Callable[P, Awaitable[RT]] | None = None,
+        *,
+        read_only: bool = False,
+        use_replicas: bool = True,
     ) -> Callable[P, Awaitable[RT]]:
+        if func is None:
+            return partial(
+                self.with_request_context,
+                read_only=read_only,
+                use_replicas=use_replicas,
+            )
+
         @wraps(func)
         async def decorator(
             *args: P.args, **kwargs: P.kwargs
         ) -> Awaitable[RT]:
-            async with AsyncExitStack() as exit_stack:
-                await exit_stack.enter_async_context(db_session_ctx(self))
+            async with db_session_ctx(
+                self, read_only=read_only, use_replicas=use_replicas
+            ) as scope:
                 result = await func(*args, **kwargs)
-                return result
+
+            log.debug(
+                f"[CARRY] '{func.__name__}' issued {scope.stats.statements} "
+                f"statements in {scope.stats.round_trips} round trips "
+                f"({scope.stats.checkouts} connection checkouts)"
+            )
+            return result
 
         return decorator
 
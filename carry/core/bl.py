@@ -1,18 +1,69 @@
+import zlib
+import struct
 from io import BytesIO
 
-import qrcode
-from qrcode.image.pure import PyPNGImage
+from carry.config import settings_store
 
-from carry.config import settings
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 
 
 def is_admin(user_id: int) -> bool:
-    return user_id in settings.admin_ids
+    return user_id in settings_store.snapshot.admin_ids
 
 
 def create_qr_code(url: str) -> BytesIO:
+    import qrcode
+    from qrcode.image.pure import PyPNGImage
+
     qr_code = qrcode.make(url, image_factory=PyPNGImage)
     buffer = BytesIO()
     qr_code.save(buffer)
     buffer.seek(0)
     return buffer
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    chunk = kind + data
+    return (
+        struct.pack(">I", len(data))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+    )
+
+
+def create_qr_code_png(url: str, box_size: int = 10, border: int = 4) -> bytes:
+    import qrcode
+
+    qr_code = qrcode.QRCode(box_size=box_size, border=border)
+    qr_code.add_data(url)
+    qr_code.make(fit=True)
+    matrix = qr_code.get_matrix()
+
+    size = len(matrix) * box_size
+    row_size = (size + 7) // 8
+    white, black = "1" * box_size, "0" * box_size
+    padding = "1" * (row_size * 8 - size)
+
+    raw = bytearray()
+    for modules in matrix:
+        bits = "".join(black if module else white for module in modules)
+        line = b"\x00" + int(bits + padding, 2).to_bytes(row_size, "big")
+        raw += line * box_size
+
+    header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(bytes(raw)))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def render_qr_code(url: str, output: str = "fast") -> bytes:
+    if output == "pypng":
+        return create_qr_code(url).getvalue()
+    return create_qr_code_png(url)
+
+
+def copy_format(filename: str) -> str:
+    return "binary" if filename.endswith(".bin") else "csv"
@@ -0,0 +1,123 @@
+import io
+import re
+import csv
+from enum import StrEnum
+from typing import BinaryIO, Iterable, Iterator
+from dataclasses import dataclass
+
+from carry.context import ctx
+
+USERNAME_PATTERN = re.compile(
+    r"^[A-Za-z0-9]+([A-Za-z0-9]*|[._-]?[A-Za-z0-9]+)*$"
+)
+REPORT_HEADER = ("line", "user", "delta", "status", "bonuses", "error")
+
+
+class BonusRowStatus(StrEnum):
+    APPLIED = "applied"
+    INVALID = "invalid"
+    NOT_FOUND = "not_found"
+    INSUFFICIENT = "insufficient_bonuses"
+
+
+@dataclass
+class BonusRow:
+    line: int
+    identifier: str
+    delta: int = 0
+    user_id: int | None = None
+    username: str | None = None
+    status: BonusRowStatus | None = None
+    bonuses: int | None = None
+    error: str | None = None
+
+    def reject(self, status: BonusRowStatus, error: str | None = None):
+        self.status, self.error = status, error
+
+
+class BonusFileError(Exception):
+    pass
+
+
+def _parse_row(line: int, fields: list[str]) -> BonusRow:
+    identifier = fields[0].strip() if fields else ""
+    row = BonusRow(line=line, identifier=identifier)
+    if len(fields) != 2:
+        row.reject(BonusRowStatus.INVALID, "expected 2 columns")
+        return row
+
+    name = identifier.removeprefix("@")
+    if name.isdigit():
+        row.user_id = int(name)
+    elif USERNAME_PATTERN.match(name):
+        row.username = name
+    else:
+        row.reject(BonusRowStatus.INVALID, "invalid user id or username")
+        return row
+
+    try:
+        row.delta = int(fields[1].strip())
+    except ValueError:
+        row.reject(BonusRowStatus.INVALID, "delta is not an integer")
+        return row
+
+    if not row.delta:
+        row.reject(BonusRowStatus.INVALID, "delta is zero")
+    return row
+
+
+def parse_bonus_rows(
+    lines: Iterable[str], max_rows: int
+) -> Iterator[BonusRow]:
+    rows = 0
+    for line, fields in enumerate(csv.reader(lines), start=1):
+        if not any(field.strip() for field in fields):
+            continue
+
+        row = _parse_row(line, fields)
+        if line == 1 and row.error == "delta is not an integer":
+            continue
+
+        rows += 1
+        if rows > max_rows:
+            raise BonusFileError(f"file has more than {max_rows} rows")
+        yield row
+
+
+def read_bonus_rows(source: BinaryIO, max_rows: int) -> Iterator[BonusRow]:
+    lines = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        yield from parse_bonus_rows(lines, max_rows)
+    finally:
+        lines.detach()
+
+
+def write_report(
+    output: BinaryIO, rows: Iterable[BonusRow], header: bool = False
+) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(REPORT_HEADER)
+    for row in rows:
+        writer.writerow(
+            (
+                row.line,
+                row.identifier,
+                row.delta,
+                row.status,
+                "" if row.bonuses is None else row.bonuses,
+                row.error or "",
+            )
+        )
+    output.write(buffer.getvalue().encode())
+
+
+@ctx.with_request_context(read_only=True)
+async def copy_users_out(output: BinaryIO, format: str) -> int:
+    return await ctx.user_repository.export_users(output, format)
+
+
+@ctx.with_request_context
+async def copy_users_in(source: BinaryIO, format: str) -> int:
+    return await ctx.user_repository.import_users(source, format)
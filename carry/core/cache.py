@@ -0,0 +1,237 @@
+import time
+import uuid
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Generic, TypeVar, Callable, Awaitable
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from carry.config import settings
+from carry.db.core import replica_router, create_connection
+from carry.db.replicas import ALL_KEYS
+from carry.core.metrics import registry
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+    from carry.core.entities import User
+
+K = TypeVar("K")
+V = TypeVar("V")
+log = logging.getLogger(__name__)
+
+CLEAR_ALL = ALL_KEYS
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _cancelling() -> bool:
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
+
+
+class AsyncLRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._items: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._loading: dict[K, asyncio.Future] = {}
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: K) -> V | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        self._epoch += 1
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        self._epoch += 1
+        self.stats.invalidations += 1
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._items.clear()
+
+    async def get_or_load(
+        self, key: K, loader: Callable[[], Awaitable[V]]
+    ) -> V:
+        value = self.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        self.stats.misses += 1
+        loading = self._loading.get(key)
+        if loading is not None:
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                if not loading.cancelled() or _cancelling():
+                    raise
+            return await self.get_or_load(key, loader)
+
+        epoch = self._epoch
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            if epoch == self._epoch:
+                self.set(key, value)
+            return value
+        finally:
+            del self._loading[key]
+
+
+class CacheInvalidationListener:
+    def __init__(
+        self,
+        cache: AsyncLRUCache,
+        channel: str,
+        reconnect_delay: float = 5.0,
+    ):
+        self.cache = cache
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.instance_id = uuid.uuid4().hex
+        self._conn: "AsyncConnection | None" = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._listeners: list[Callable[[int | str], None]] = []
+
+    def subscribe(self, listener: Callable[[int | str], None]) -> None:
+        self._listeners.append(listener)
+
+    def payload(self, key: int | str) -> str:
+        return f"{self.instance_id}:{key}"
+
+    async def start(self) -> None:
+        self._conn = await create_connection()
+        raw_conn = await self._conn.get_raw_connection()
+        driver_conn = raw_conn.driver_connection
+        await driver_conn.add_listener(self.channel, self._on_notification)
+        driver_conn.add_termination_listener(self._on_termination)
+        log.info(f"[CARRY] Listening cache invalidations on '{self.channel}'")
+
+    async def stop(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    def _on_notification(
+        self, connection, pid: int, channel: str, payload: str
+    ) -> None:
+        instance_id, _, key = payload.partition(":")
+        if instance_id == self.instance_id:
+            return
+        if key == CLEAR_ALL:
+            self.cache.clear()
+        else:
+            key = int(key)
+            self.cache.invalidate(key)
+        for listener in self._listeners:
+            listener(key)
+
+    def _on_termination(self, connection) -> None:
+        log.warning("[CARRY] Cache invalidation listener is disconnected!")
+        self.cache.clear()
+        if self._conn is not None:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start()
+            except Exception:
+                log.exception("[CARRY] Cannot reconnect cache listener!")
+            else:
+                self.cache.clear()
+                return
+
+
+user_cache: AsyncLRUCache[int, "User"] = AsyncLRUCache(
+    maxsize=settings.cache.users.maxsize,
+    ttl=settings.cache.users.ttl,
+)
+profile_cache: AsyncLRUCache[int, tuple] = AsyncLRUCache(
+    maxsize=settings.cache.profiles.maxsize,
+    ttl=settings.cache.profiles.ttl,
+)
+user_cache_listener = (
+    CacheInvalidationListener(user_cache, settings.cache.users.notify_channel)
+    if settings.cache.users.notify_channel
+    else None
+)
+
+
+def _clear_profiles(key: int | str) -> None:
+    if key == CLEAR_ALL:
+        profile_cache.clear()
+
+
+if user_cache_listener is not None:
+    user_cache_listener.subscribe(_clear_profiles)
+if user_cache_listener is not None and replica_router:
+    user_cache_listener.subscribe(lambda key: replica_router.pin([key]))
+
+registry.counter(
+    "carry_cache_requests_total",
+    "In-process cache lookups",
+    ("cache", "result"),
+).set_function(
+    lambda: {
+        (name, result): getattr(cache.stats, attribute)
+        for name, cache in (("users", user_cache), ("profiles", profile_cache))
+        for result, attribute in (("hit", "hits"), ("miss", "misses"))
+    }
+)
+registry.counter(
+    "carry_cache_evictions_total", "In-process cache evictions", ("cache",)
+).set_function(
+    lambda: {
+        ("users",): user_cache.stats.evictions,
+        ("profiles",): profile_cache.stats.evictions,
+    }
+)
@@ -1,3 +1,5 @@
+from enum import StrEnum
+from datetime import datetime
 from dataclasses import dataclass
 
 from telegram import User as TelegramUser
@@ -28,6 +30,10 @@ class User:
             bonuses=bonuses,
         )
 
+    @property
+    def profile_fingerprint(self) -> tuple:
+        return (self.chat_id, self.first_name, self.last_name, self.username)
+
     @property
     def full_name(self) -> str:
         return (
@@ -36,6 +42,12 @@ class User:
             else f"{self.first_name} {self.last_name}"
         )
 
+    @property
+    def search_text(self) -> str:
+        return (
+            f"{self.first_name} {self.last_name or ''} {self.username or ''}"
+        )
+
     @property
     def shor_info(self) -> str:
         return (
@@ -43,3 +55,45 @@ class User:
             if self.username
             else self.full_name
         )
+
+
+class BonusReason(StrEnum):
+    INCREASE = "increase"
+    DECREASE = "decrease"
+    BULK = "bulk"
+    IMPORT = "import"
+    EXPIRE = "expire"
+    OPENING = "opening"
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: int
+    chat_id: int
+    template: str
+    params: dict
+    attempts: int
+    coalesce_key: str | None = None
+
+
+@dataclass(frozen=True)
+class Broadcast:
+    id: int
+    admin_chat_id: int
+    progress_message_id: int | None
+    template: str
+    params: dict
+    total: int
+    last_user_id: int
+    sent: int
+    failed: int
+
+
+@dataclass(frozen=True)
+class BonusExpiryRun:
+    id: int
+    cutoff: datetime
+    last_user_id: int
+    expired_users: int
+    expired_bonuses: int
+    created_at: datetime
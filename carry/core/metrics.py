@@ -0,0 +1,339 @@
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import field, dataclass
+
+from carry.config import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: Labels) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+        self._function: Callable[[], dict[Labels, float]] | None = None
+
+    def _key(self, labels: dict[str, object]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(
+        self, function: Callable[[], dict[Labels, float]]
+    ) -> None:
+        self._function = function
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        values = self._function() if self._function else self._values
+        for key, value in values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(
+            f"{name}{labels} {value}" for name, labels, value in self.samples()
+        )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+@dataclass
+class _HistogramState:
+    buckets: list[int]
+    sum: float = 0.0
+    count: int = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._states: dict[Labels, _HistogramState] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _HistogramState(
+                [0] * len(self.buckets)
+            )
+
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state.buckets[index] += 1
+        state.sum += value
+        state.count += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for key, state in self._states.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state.buckets):
+                cumulative += count
+                labels = _format_labels(
+                    (*self.labelnames, "le"), (*key, str(bound))
+                )
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels((*self.labelnames, "le"), (*key, "+Inf"))
+            yield f"{self.name}_bucket", labels, state.count
+
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, state.sum
+            yield f"{self.name}_count", labels, state.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets)
+        )
+
+    def render(self) -> str:
+        return (
+            "\n".join(metric.render() for metric in self._metrics.values())
+            + "\n"
+        )
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    duration: float
+    wait: float = 0.0
+
+
+@dataclass
+class HandlerTrace:
+    handler: str
+    max_spans: int = 50
+    started_at: float = field(default_factory=time.perf_counter)
+    spans: list[Span] = field(default_factory=list)
+    dropped: int = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def report(self, duration: float) -> str:
+        lines = [f"[CARRY] Slow handler '{self.handler}': {duration:.3f}s"]
+        for kind in ("db", "api"):
+            spans = [span for span in self.spans if span.kind == kind]
+            total = sum(span.duration for span in spans)
+            lines.append(f"  {kind}: {len(spans)} calls, {total:.3f}s")
+        total = sum(span.duration + span.wait for span in self.spans)
+        lines.append(f"  other: {max(duration - total, 0):.3f}s")
+        if self.dropped:
+            lines.append(f"  {self.dropped} more spans are not recorded")
+        lines.extend(
+            f"  {span.kind:<4}{span.duration:8.4f}s"
+            + (f" (+{span.wait:.4f}s throttled)" if span.wait else "")
+            + f"  {span.name}"
+            for span in sorted(
+                self.spans, key=lambda span: span.duration, reverse=True
+            )
+        )
+        return "\n".join(lines)
+
+
+_trace: ContextVar[HandlerTrace | None] = ContextVar(
+    "handler_trace", default=None
+)
+
+
+def record_span(
+    kind: str, name: str, duration: float, wait: float = 0.0
+) -> None:
+    if trace := _trace.get():
+        trace.add(Span(kind, name, duration, wait))
+
+
+class SlowHandlerProfiler:
+    def __init__(self, threshold: float = 0.0, max_spans: int = 50):
+        self.threshold = threshold
+        self.max_spans = max_spans
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    @contextmanager
+    def profile(self, handler: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        trace = HandlerTrace(handler, self.max_spans)
+        token = _trace.set(trace)
+        try:
+            yield
+        finally:
+            _trace.reset(token)
+            duration = time.perf_counter() - trace.started_at
+            if duration >= self.threshold:
+                log.warning(trace.report(duration))
+
+
+class MetricsServer:
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        host: str = "0.0.0.0",
+        port: int = 9100,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: asyncio.Server | None = None
+
+    async def start(self, port_offset: int = 0) -> None:
+        port = self.port + port_offset
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, port
+        )
+        log.info(f"[CARRY] Metrics are served on {self.host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+            while await reader.readline() not in (b"\r\n", b""):
+                pass
+
+            _, target, _ = request_line.decode().split(" ", 2)
+            if target.split("?", 1)[0] == "/metrics":
+                status, content_type = "200 OK", CONTENT_TYPE
+                payload = self.registry.render().encode()
+            else:
+                status, content_type = "404 Not Found", "text/plain"
+                payload = b"Not Found"
+
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: close\r\n"
+                    "\r\n"
+                ).encode()
+                + payload
+            )
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+registry = MetricsRegistry()
+slow_handler_profiler = SlowHandlerProfiler(
+    threshold=settings.metrics.slow_handler_threshold,
+    max_spans=settings.metrics.slow_handler_max_spans,
+)
+metrics_server = MetricsServer(
+    registry, settings.metrics.listen, settings.metrics.port
+)
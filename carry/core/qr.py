@@ -0,0 +1,153 @@
+import asyncio
+from functools import partial
+from collections import OrderedDict
+from dataclasses import dataclass
+from concurrent.futures import (
+    Executor,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+)
+
+from telegram.helpers import create_deep_linked_url
+
+from carry.config import settings
+from carry.core.bl import render_qr_code
+from carry.core.metrics import registry
+
+
+class QRCodeRendererBusyError(Exception):
+    pass
+
+
+class QRCodeRenderer:
+    def __init__(
+        self,
+        executor: str = "process",
+        max_workers: int = 2,
+        max_queue: int = 32,
+        output: str = "fast",
+    ):
+        if executor not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown QR-code executor: {executor}")
+
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.output = output
+        self.pending = 0
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = (
+                ProcessPoolExecutor
+                if self.executor == "process"
+                else ThreadPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    async def render(self, url: str) -> bytes:
+        if self.executor == "inline":
+            return render_qr_code(url, self.output)
+
+        if self.pending >= self.max_queue:
+            raise QRCodeRendererBusyError
+
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._get_executor(),
+                    partial(render_qr_code, url, self.output),
+                )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+@dataclass
+class QRCodeCacheStats:
+    file_id_hits: int = 0
+    image_hits: int = 0
+    misses: int = 0
+
+    @property
+    def requests(self) -> int:
+        return self.file_id_hits + self.image_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.requests:
+            return 0.0
+        return (self.file_id_hits + self.image_hits) / self.requests
+
+
+class QRCodeCache:
+    def __init__(self, renderer: QRCodeRenderer, maxsize: int):
+        self.renderer = renderer
+        self.maxsize = maxsize
+        self.stats = QRCodeCacheStats()
+        self._bot_username: str | None = None
+        self._images: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def clear(self) -> None:
+        self._images.clear()
+
+    def _check_bot_username(self, bot_username: str) -> None:
+        if bot_username != self._bot_username:
+            self.clear()
+            self._bot_username = bot_username
+
+    async def get_image(self, bot_username: str, payload: str) -> bytes:
+        self._check_bot_username(bot_username)
+
+        image = self._images.get(payload)
+        if image is not None:
+            self._images.move_to_end(payload)
+            self.stats.image_hits += 1
+            return image
+
+        self.stats.misses += 1
+        url = create_deep_linked_url(bot_username, payload=payload)
+        image = await self.renderer.render(url)
+        if bot_username != self._bot_username:
+            return image
+
+        self._images[payload] = image
+        if len(self._images) > self.maxsize:
+            self._images.popitem(last=False)
+        return image
+
+    def record_file_id_hit(self) -> None:
+        self.stats.file_id_hits += 1
+
+
+qr_code_renderer = QRCodeRenderer(
+    executor=settings.qr.executor,
+    max_workers=settings.qr.max_workers,
+    max_queue=settings.qr.max_queue,
+    output=settings.qr.output,
+)
+qr_code_cache = QRCodeCache(qr_code_renderer, settings.qr.cache_size)
+
+registry.counter(
+    "carry_qr_code_requests_total",
+    "QR-code requests by the layer that served them",
+    ("result",),
+).set_function(
+    lambda: {
+        ("file_id",): qr_code_cache.stats.file_id_hits,
+        ("image",): qr_code_cache.stats.image_hits,
+        ("miss",): qr_code_cache.stats.misses,
+    }
+)
@@ -1,11 +1,63 @@
-from sqlalchemy import select, update
-from sqlalchemy.exc import IntegrityError
+from typing import TYPE_CHECKING, Any, Callable, Collection
+from datetime import date, datetime, timedelta
+from functools import partial
+
+from sqlalchemy import (
+    Date,
+    String,
+    Integer,
+    Interval,
+    or_,
+    case,
+    cast,
+    func,
+    text,
+    event,
+    table,
+    column,
+    delete,
+    select,
+    tuple_,
+    update,
+    values,
+    literal,
+    bindparam,
+    literal_column,
+)
 from sqlalchemy.engine.row import Row
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert, dialect
+
+from carry.db import (
+    users,
+    outbox,
+    qr_codes,
+    broadcasts,
+    users_bonuses,
+    bot_persistence,
+    ledger_partition,
+    bonus_expiry_runs,
+    users_search_text,
+    bonus_transactions,
+    outbox_finished_at,
+    ledger_partition_ddl,
+    bonus_transactions_default,
+)
+from carry.db.core import DBSessionScope, read_only
+from carry.core.cache import CLEAR_ALL
+from carry.db.replicas import ALL_KEYS
+from carry.core.entities import (
+    User,
+    Broadcast,
+    BonusReason,
+    OutboxMessage,
+    BonusExpiryRun,
+)
 
-from carry.db import users
-from carry.core.entities import User
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from carry.core.cache import AsyncLRUCache, CacheInvalidationListener
+    from carry.core.search import NgramIndex
 
 
 class UserRepositoryError(Exception):
@@ -16,109 +68,1090 @@ class NegativeBonusesError(UserRepositoryError):
     pass
 
 
-class UserRepository:
-    def __init__(self, db_session: AsyncSession):
-        self.db_session = db_session
+class Repository:
+    def __init__(self, db_scope: DBSessionScope):
+        self.db_scope = db_scope
+
+    @property
+    def db_session(self) -> "AsyncSession":
+        return self.db_scope.session
+
+
+USER_COLUMNS = (
+    users.c.id,
+    users.c.chat_id,
+    users.c.first_name,
+    users.c.last_name,
+    users.c.username,
+    users_bonuses.label("bonuses"),
+)
+PROFILE_COLUMNS = ("chat_id", "first_name", "last_name", "username")
+
+
+def _upsert_user_statement():
+    query = insert(users)
+    return query.on_conflict_do_update(
+        "users_pkey",
+        set_={name: query.excluded[name] for name in PROFILE_COLUMNS},
+        where=or_(
+            *(
+                users.c[name].is_distinct_from(query.excluded[name])
+                for name in PROFILE_COLUMNS
+            )
+        ),
+    )
+
+
+def _appended_users_statement(appended, with_delta: bool = False):
+    appended = appended.returning(
+        bonus_transactions.c.user_id, bonus_transactions.c.delta
+    ).cte("appended")
+    columns = [
+        *USER_COLUMNS[:-1],
+        (users_bonuses + appended.c.delta).label("bonuses"),
+    ]
+    if with_delta:
+        columns.append(appended.c.delta)
+    return select(*columns).join_from(
+        users, appended, users.c.id == appended.c.user_id
+    )
+
+
+def _append_bonuses_statement(checked: bool):
+    delta = bindparam("delta", type_=Integer)
+    source = select(
+        users.c.id, delta, bindparam("reason", type_=String)
+    ).where(users.c.id == bindparam("user_id"))
+    if checked:
+        source = source.where(users_bonuses + delta >= 0)
+    return _appended_users_statement(
+        insert(bonus_transactions).from_select(LEDGER_COLUMNS, source)
+    )
+
+
+UPSERT_USER = _upsert_user_statement()
+LEDGER_COLUMNS = ("user_id", "delta", "reason")
+FETCH_BALANCE = select(users_bonuses).where(users.c.id == bindparam("user_id"))
+FETCH_USER_BY_ID = select(*USER_COLUMNS).where(
+    users.c.id == bindparam("user_id")
+)
+FETCH_USER_BY_USERNAME = select(*USER_COLUMNS).where(
+    users.c.username == bindparam("username")
+)
+ADD_BONUSES = _append_bonuses_statement(checked=False)
+SUBTRACT_BONUSES = _append_bonuses_statement(checked=True)
+LOCK_USERS = (
+    select(users.c.id)
+    .where(users.c.id.in_(bindparam("ids", expanding=True)))
+    .order_by(users.c.id)
+    .with_for_update(key_share=True)
+)
+COUNT_USERS = select(func.count()).select_from(users)
+RESOLVE_USERS = select(users.c.id, users.c.username).where(
+    or_(
+        users.c.id.in_(bindparam("ids", expanding=True)),
+        users.c.username.in_(bindparam("usernames", expanding=True)),
+    )
+)
+BULK_CHUNK_SIZE = 5000
+FETCH_CHAT_IDS = (
+    select(users.c.id, users.c.chat_id)
+    .where(users.c.id > bindparam("after_user_id"))
+    .order_by(users.c.id)
+    .limit(bindparam("limit"))
+)
+SEARCH_USERS = (
+    select(*USER_COLUMNS)
+    .where(
+        bindparam("query", type_=String).op("<%", is_comparison=True)(
+            users_search_text.self_group()
+        )
+    )
+    .order_by(
+        func.word_similarity(bindparam("query"), users_search_text).desc(),
+        users.c.id,
+    )
+    .limit(bindparam("limit"))
+)
+FETCH_USERS_BY_IDS = select(*USER_COLUMNS).where(
+    users.c.id.in_(bindparam("ids", expanding=True))
+)
+FETCH_SEARCH_DOCUMENTS = (
+    select(users.c.id, users_search_text)
+    .where(users.c.id > bindparam("after_user_id"))
+    .order_by(users.c.id)
+    .limit(bindparam("limit"))
+)
+FETCH_FIRST_USERS_PAGE = (
+    select(*USER_COLUMNS, users.c.bonuses.label("snapshot"))
+    .order_by(users.c.bonuses.desc(), users.c.id.desc())
+    .limit(bindparam("limit"))
+)
+FETCH_USERS_PAGE = FETCH_FIRST_USERS_PAGE.where(
+    tuple_(users.c.bonuses, users.c.id)
+    < tuple_(bindparam("bonuses"), bindparam("user_id"))
+)
+ESTIMATE_USERS = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"
+)
+COPY_COLUMNS = [user_column.name for user_column in USER_COLUMNS]
+EXPORT_COLUMNS = (
+    *USER_COLUMNS[:-1],
+    cast(users_bonuses, users.c.bonuses.type).label("bonuses"),
+)
+EXPORT_USERS = str(
+    select(*EXPORT_COLUMNS).compile(
+        dialect=dialect(), compile_kwargs={"literal_binds": True}
+    )
+)
+users_import = table("users_import", *(column(name) for name in COPY_COLUMNS))
+CREATE_USERS_IMPORT = text(
+    "CREATE TEMPORARY TABLE users_import "
+    "(LIKE users INCLUDING DEFAULTS INCLUDING CONSTRAINTS) ON COMMIT DROP"
+)
+LATEST_IMPORTED_USERS = (
+    select(*users_import.c)
+    .distinct(users_import.c.id)
+    .order_by(users_import.c.id, literal_column("ctid").desc())
+)
+
+
+def _merge_users_import_statement():
+    latest = LATEST_IMPORTED_USERS.subquery("latest")
+    query = insert(users).from_select(
+        COPY_COLUMNS,
+        select(*latest.c[:-1], literal(0, Integer).label("bonuses")),
+    )
+    return query.on_conflict_do_update(
+        "users_pkey",
+        set_={name: query.excluded[name] for name in PROFILE_COLUMNS},
+    )
+
+
+def _adjust_imported_bonuses_statement():
+    latest = LATEST_IMPORTED_USERS.subquery("latest")
+    source = (
+        select(
+            users.c.id,
+            latest.c.bonuses - users_bonuses,
+            literal(BonusReason.IMPORT, String),
+        )
+        .join_from(users, latest, users.c.id == latest.c.id)
+        .where(users_bonuses != latest.c.bonuses)
+    )
+    return insert(bonus_transactions).from_select(LEDGER_COLUMNS, source)
+
+
+LOCK_IMPORTED_USERS = select(func.count()).select_from(
+    select(users.c.id)
+    .where(users.c.id.in_(select(users_import.c.id)))
+    .order_by(users.c.id)
+    .with_for_update(key_share=True)
+    .subquery("locked")
+)
+MERGE_USERS_IMPORT = _merge_users_import_statement()
+ADJUST_IMPORTED_BONUSES = _adjust_imported_bonuses_statement()
+UNOPENED_BONUSES = case((users.c.bonuses_txid == 0, users.c.bonuses), else_=0)
+EXPIRING_BONUSES = (
+    users_bonuses
+    - UNOPENED_BONUSES
+    - (
+        select(func.coalesce(func.sum(bonus_transactions.c.delta), 0))
+        .where(
+            bonus_transactions.c.user_id == users.c.id,
+            bonus_transactions.c.delta > 0,
+            bonus_transactions.c.created_at >= bindparam("cutoff"),
+        )
+        .scalar_subquery()
+    )
+)
+FETCH_EXPIRY_CHUNK = (
+    select(users.c.id, EXPIRING_BONUSES > 0)
+    .where(users.c.id > bindparam("after_user_id"))
+    .order_by(users.c.id)
+    .limit(bindparam("limit"))
+)
+EXPIRE_BONUSES = _appended_users_statement(
+    insert(bonus_transactions).from_select(
+        LEDGER_COLUMNS,
+        select(
+            users.c.id,
+            -EXPIRING_BONUSES,
+            literal(BonusReason.EXPIRE, String),
+        ).where(
+            users.c.id.in_(bindparam("ids", expanding=True)),
+            EXPIRING_BONUSES > 0,
+        ),
+    ),
+    with_delta=True,
+)
+
+
+def _open_balances_statement():
+    unopened = (
+        select(users.c.id, users.c.bonuses)
+        .where(
+            users.c.bonuses_txid == literal_column("0"),
+            users.c.bonuses > literal_column("0"),
+        )
+        .order_by(users.c.id)
+        .limit(bindparam("limit"))
+        .with_for_update(key_share=True)
+        .cte("unopened")
+    )
+    opened = (
+        update(users)
+        .where(users.c.id == unopened.c.id)
+        .values(bonuses=0)
+        .returning(users.c.id)
+        .cte("opened")
+    )
+    return insert(bonus_transactions).from_select(
+        LEDGER_COLUMNS,
+        select(
+            unopened.c.id,
+            unopened.c.bonuses,
+            literal(BonusReason.OPENING, String),
+        ).join_from(unopened, opened, unopened.c.id == opened.c.id),
+    )
 
+
+def _move_ledger_rows_statement():
+    default = bonus_transactions_default
+    moved = (
+        delete(default)
+        .where(
+            default.c.created_at >= bindparam("start", type_=Date),
+            default.c.created_at < bindparam("end", type_=Date),
+        )
+        .returning(*default.c)
+        .cte("moved")
+    )
+    return insert(bonus_transactions).from_select(
+        [ledger_column.name for ledger_column in default.c],
+        select(*moved.c),
+    )
+
+
+def _add_coalesced_messages_statement():
+    chat_id = bindparam("chat_id", type_=Integer)
+    coalesce_key = bindparam("coalesce_key", type_=String)
+    delay = bindparam("delay", type_=Interval)
+    siblings = select(outbox.c.id).where(
+        outbox.c.chat_id == chat_id,
+        outbox.c.coalesce_key == coalesce_key,
+    )
+    pending = siblings.where(
+        outbox.c.sent_at.is_(None), outbox.c.failed_at.is_(None)
+    ).exists()
+    recent = siblings.where(outbox.c.sent_at > func.now() - delay).exists()
+    return insert(outbox).from_select(
+        ("chat_id", "template", "params", "coalesce_key", "available_at"),
+        select(
+            chat_id,
+            bindparam("template", type_=String),
+            bindparam("params", type_=JSONB),
+            coalesce_key,
+            func.now()
+            + case((or_(pending, recent), delay), else_=literal(timedelta())),
+        ),
+    )
+
+
+ADD_COALESCED_MESSAGES = _add_coalesced_messages_statement()
+LEDGER_HORIZON = func.txid_snapshot_xmin(func.txid_current_snapshot())
+FETCH_LEDGER_BOUNDS = text(
+    "SELECT txid_snapshot_xmin(txid_current_snapshot()), min(xact_start) "
+    "FROM pg_stat_activity WHERE datname = current_database()"
+)
+OPEN_BALANCES = _open_balances_statement()
+FIND_LEDGER_PARTITION = select(
+    func.to_regclass(bindparam("name", type_=String)).is_not(None),
+    select(bonus_transactions_default.c.id)
+    .where(
+        bonus_transactions_default.c.created_at
+        >= bindparam("start", type_=Date),
+        bonus_transactions_default.c.created_at < bindparam("end", type_=Date),
+    )
+    .exists(),
+)
+MOVE_LEDGER_ROWS = _move_ledger_rows_statement()
+DETACH_LEDGER_DEFAULT = text(
+    "ALTER TABLE bonus_transactions "
+    "DETACH PARTITION bonus_transactions_default"
+)
+ATTACH_LEDGER_DEFAULT = text(
+    "ALTER TABLE bonus_transactions "
+    "ATTACH PARTITION bonus_transactions_default DEFAULT"
+)
+FETCH_LEDGER_TAIL_USERS = (
+    select(bonus_transactions.c.user_id)
+    .where(
+        bonus_transactions.c.txid >= bindparam("after_txid"),
+        bonus_transactions.c.user_id > bindparam("after_user_id"),
+    )
+    .group_by(bonus_transactions.c.user_id)
+    .order_by(bonus_transactions.c.user_id)
+    .limit(bindparam("limit"))
+)
+
+
+def _compact_ledger_statement():
+    folded = (
+        select(
+            users.c.id,
+            users.c.bonuses_txid,
+            func.sum(bonus_transactions.c.delta).label("delta"),
+        )
+        .join_from(
+            users,
+            bonus_transactions,
+            bonus_transactions.c.user_id == users.c.id,
+        )
+        .where(
+            users.c.id.in_(bindparam("ids", expanding=True)),
+            bonus_transactions.c.txid >= users.c.bonuses_txid,
+            bonus_transactions.c.txid < LEDGER_HORIZON,
+            bonus_transactions.c.created_at >= users.c.bonuses_since,
+        )
+        .group_by(users.c.id)
+        .cte("folded")
+    )
+    return (
+        update(users)
+        .where(
+            users.c.id == folded.c.id,
+            users.c.bonuses_txid == folded.c.bonuses_txid,
+            users.c.bonuses + folded.c.delta >= 0,
+        )
+        .values(
+            bonuses=users.c.bonuses + folded.c.delta,
+            bonuses_txid=LEDGER_HORIZON,
+            bonuses_since=bindparam("since"),
+        )
+    )
+
+
+COMPACT_LEDGER = _compact_ledger_statement()
+
+
+def _copied_rows(status: str) -> int:
+    return int(status.rsplit(" ", 1)[-1])
+
+
+class UserRepository(Repository):
     @staticmethod
     def _map_user(row: Row | None) -> User | None:
-        return (
-            User(
-                id=row[0],
-                chat_id=row[1],
-                first_name=row[2],
-                last_name=row[3],
-                username=row[4],
-                bonuses=row[5],
+        return User(*row) if row else None
+
+    async def upsert_user(self, user: User) -> bool:
+        result = await self.db_session.execute(
+            UPSERT_USER,
+            {
+                "id": user.id,
+                "chat_id": user.chat_id,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "username": user.username,
+            },
+        )
+        if result.rowcount > 0:
+            self.db_scope.pin_reads([user.id])
+        return result.rowcount > 0
+
+    @read_only(key="user_id")
+    async def fetch_balance(self, user_id: int) -> int:
+        result = await self.db_session.execute(
+            FETCH_BALANCE, {"user_id": user_id}
+        )
+        return result.scalar_one()
+
+    @read_only
+    async def fetch_user_by_username(self, username: str) -> User | None:
+        result = await self.db_session.execute(
+            FETCH_USER_BY_USERNAME, {"username": username}
+        )
+        return self._map_user(result.one_or_none())
+
+    @read_only(key="user_id")
+    async def fetch_user_by_id(self, user_id: int) -> User:
+        result = await self.db_session.execute(
+            FETCH_USER_BY_ID, {"user_id": user_id}
+        )
+        return self._map_user(result.one())
+
+    @read_only
+    async def search_users(self, query: str, limit: int) -> list[User]:
+        result = await self.db_session.execute(
+            SEARCH_USERS, {"query": query, "limit": limit}
+        )
+        return list(map(self._map_user, result.all()))
+
+    @read_only(key="ids")
+    async def fetch_users_by_ids(self, ids: list[int]) -> list[User]:
+        result = await self.db_session.execute(
+            FETCH_USERS_BY_IDS, {"ids": ids}
+        )
+        found = {user.id: user for user in map(self._map_user, result.all())}
+        return [found[user_id] for user_id in ids if user_id in found]
+
+    @read_only
+    async def fetch_search_documents(
+        self, after_user_id: int, limit: int
+    ) -> list[tuple[int, str]]:
+        result = await self.db_session.execute(
+            FETCH_SEARCH_DOCUMENTS,
+            {"after_user_id": after_user_id, "limit": limit},
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def increase_user_balance(self, user_id: int, bonuses: int) -> User:
+        result = await self.db_session.execute(
+            ADD_BONUSES,
+            {
+                "user_id": user_id,
+                "delta": bonuses,
+                "reason": BonusReason.INCREASE,
+            },
+        )
+        self.db_scope.pin_reads([user_id])
+        return self._map_user(result.one_or_none())
+
+    async def decrease_user_balance(self, user_id: int, bonuses: int) -> User:
+        locked = await self.db_session.execute(LOCK_USERS, {"ids": [user_id]})
+        if locked.one_or_none() is None:
+            return None
+
+        result = await self.db_session.execute(
+            SUBTRACT_BONUSES,
+            {
+                "user_id": user_id,
+                "delta": -bonuses,
+                "reason": BonusReason.DECREASE,
+            },
+        )
+        user = self._map_user(result.one_or_none())
+        if user is None:
+            raise NegativeBonusesError
+        self.db_scope.pin_reads([user_id])
+        return user
+
+    async def resolve_users(
+        self, ids: Collection[int], usernames: Collection[str]
+    ) -> list[tuple[int, str | None]]:
+        result = await self.db_session.execute(
+            RESOLVE_USERS, {"ids": list(ids), "usernames": list(usernames)}
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def add_bonuses_bulk(self, deltas: dict[int, int]) -> list[User]:
+        changes = sorted(deltas.items())
+        updated = []
+        for i in range(0, len(changes), BULK_CHUNK_SIZE):
+            chunk = changes[i : i + BULK_CHUNK_SIZE]
+            debited = [user_id for user_id, delta in chunk if delta < 0]
+            if debited:
+                await self.db_session.execute(LOCK_USERS, {"ids": debited})
+
+            data = values(
+                column("id", Integer), column("delta", Integer), name="changes"
+            ).data(chunk)
+            source = select(
+                users.c.id, data.c.delta, literal(BonusReason.BULK, String)
+            ).where(
+                users.c.id == data.c.id,
+                users_bonuses + data.c.delta >= 0,
+            )
+            query = _appended_users_statement(
+                insert(bonus_transactions).from_select(LEDGER_COLUMNS, source)
             )
-            if row
-            else None
+            result = await self.db_session.execute(query)
+            updated.extend(map(self._map_user, result.all()))
+        self.db_scope.pin_reads(user.id for user in updated)
+        return updated
+
+    async def fetch_expiry_chunk(
+        self, after_user_id: int, limit: int, cutoff: datetime
+    ) -> list[tuple[int, bool]]:
+        result = await self.db_session.execute(
+            FETCH_EXPIRY_CHUNK,
+            {"after_user_id": after_user_id, "limit": limit, "cutoff": cutoff},
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def expire_bonuses(
+        self, user_ids: list[int], cutoff: datetime
+    ) -> list[tuple[User, int]]:
+        await self.db_session.execute(LOCK_USERS, {"ids": user_ids})
+        result = await self.db_session.execute(
+            EXPIRE_BONUSES, {"ids": user_ids, "cutoff": cutoff}
+        )
+        self.db_scope.pin_reads(user_ids)
+        return [(self._map_user(row[:-1]), -row.delta) for row in result.all()]
+
+    async def _driver_connection(self):
+        connection = await self.db_session.connection()
+        raw_connection = await connection.get_raw_connection()
+        return raw_connection.driver_connection
+
+    @read_only
+    async def export_users(self, output: Any, format: str = "csv") -> int:
+        driver_connection = await self._driver_connection()
+        status = await driver_connection.copy_from_query(
+            EXPORT_USERS,
+            output=output,
+            format=format,
+            header=format == "csv" or None,
+        )
+        return _copied_rows(status)
+
+    async def import_users(self, source: Any, format: str = "csv") -> int:
+        await self.db_session.execute(CREATE_USERS_IMPORT)
+        driver_connection = await self._driver_connection()
+        await driver_connection.copy_to_table(
+            users_import.name,
+            source=source,
+            columns=COPY_COLUMNS,
+            format=format,
+            header=format == "csv" or None,
+        )
+        await self.db_session.execute(LOCK_IMPORTED_USERS)
+        result = await self.db_session.execute(MERGE_USERS_IMPORT)
+        await self.db_session.execute(ADJUST_IMPORTED_BONUSES)
+        self.db_scope.pin_reads([ALL_KEYS])
+        return result.rowcount
+
+    @read_only
+    async def count_users(self) -> int:
+        result = await self.db_session.execute(COUNT_USERS)
+        return result.scalar_one()
+
+    @read_only
+    async def estimate_users_count(self) -> int:
+        result = await self.db_session.execute(ESTIMATE_USERS)
+        estimate = result.scalar_one()
+        if estimate < 0:
+            return await self.count_users()
+        return estimate
+
+    @read_only
+    async def fetch_users_page(
+        self, after: tuple[int, int] | None, limit: int
+    ) -> list[tuple[User, tuple[int, int]]]:
+        if after is None:
+            query, params = FETCH_FIRST_USERS_PAGE, {"limit": limit}
+        else:
+            bonuses, user_id = after
+            query, params = FETCH_USERS_PAGE, {
+                "bonuses": bonuses,
+                "user_id": user_id,
+                "limit": limit,
+            }
+        result = await self.db_session.execute(query, params)
+        return [
+            (self._map_user(row[:-1]), (row.snapshot, row.id))
+            for row in result.all()
+        ]
+
+    @read_only
+    async def fetch_chat_ids(
+        self, after_user_id: int, limit: int
+    ) -> list[tuple[int, int]]:
+        result = await self.db_session.execute(
+            FETCH_CHAT_IDS, {"after_user_id": after_user_id, "limit": limit}
+        )
+        return [tuple(row) for row in result.all()]
+
+
+class CachedUserRepository(UserRepository):
+    def __init__(
+        self,
+        db_scope: DBSessionScope,
+        cache: "AsyncLRUCache[int, User]",
+        profiles: "AsyncLRUCache[int, tuple]",
+        listener: "CacheInvalidationListener | None" = None,
+        search_index: "NgramIndex | None" = None,
+    ):
+        super().__init__(db_scope)
+        self.cache = cache
+        self.profiles = profiles
+        self.listener = listener
+        self.search_index = search_index
+
+    def _after_commit(self, callback: Callable[[], None]) -> None:
+        event.listen(
+            self.db_session.sync_session,
+            "after_commit",
+            lambda session: callback(),
+            once=True,
+        )
+
+    async def _invalidate(self, user_id: int, user: User | None = None):
+        self.cache.invalidate(user_id)
+        if user is None:
+            self._after_commit(partial(self.cache.invalidate, user_id))
+        else:
+            self._after_commit(partial(self.cache.set, user_id, user))
+
+        await self._notify([user_id])
+
+    async def _notify(self, keys: list[int | str]) -> None:
+        if self.listener is None or not keys:
+            return
+
+        payloads = [self.listener.payload(key) for key in keys]
+        query = select(
+            func.pg_notify(
+                self.listener.channel,
+                func.unnest(bindparam("payloads", type_=ARRAY(String))),
+            )
+        )
+        await self.db_session.execute(query, {"payloads": payloads})
+
+    async def upsert_user(self, user: User) -> bool:
+        fingerprint = user.profile_fingerprint
+        if self.profiles.get(user.id) == fingerprint:
+            return False
+
+        self.profiles.invalidate(user.id)
+        changed = await super().upsert_user(user)
+        if changed:
+            await self._invalidate(user.id)
+            if self.search_index is not None:
+                self._after_commit(
+                    partial(self.search_index.add, user.id, user.search_text)
+                )
+        self._after_commit(partial(self.profiles.set, user.id, fingerprint))
+        return changed
+
+    async def fetch_balance(self, user_id: int) -> int:
+        user = await self.fetch_user_by_id(user_id)
+        return user.bonuses
+
+    async def fetch_user_by_id(self, user_id: int) -> User:
+        return await self.cache.get_or_load(
+            user_id,
+            partial(UserRepository.fetch_user_by_id, self, user_id),
         )
 
-    async def upsert_user(self, user: User) -> None:
+    async def increase_user_balance(self, user_id: int, bonuses: int) -> User:
+        user = await super().increase_user_balance(user_id, bonuses)
+        await self._invalidate(user_id, user)
+        return user
+
+    async def decrease_user_balance(self, user_id: int, bonuses: int) -> User:
+        user = await super().decrease_user_balance(user_id, bonuses)
+        await self._invalidate(user_id, user)
+        return user
+
+    async def add_bonuses_bulk(self, deltas: dict[int, int]) -> list[User]:
+        updated = await super().add_bonuses_bulk(deltas)
+        for user in updated:
+            self.cache.invalidate(user.id)
+            self._after_commit(partial(self.cache.set, user.id, user))
+        await self._notify([user.id for user in updated])
+        return updated
+
+    async def expire_bonuses(
+        self, user_ids: list[int], cutoff: datetime
+    ) -> list[tuple[User, int]]:
+        expired = await super().expire_bonuses(user_ids, cutoff)
+        for user, _ in expired:
+            self.cache.invalidate(user.id)
+            self._after_commit(partial(self.cache.set, user.id, user))
+        await self._notify([user.id for user, _ in expired])
+        return expired
+
+    async def import_users(self, source: Any, format: str = "csv") -> int:
+        imported = await super().import_users(source, format)
+        self.cache.clear()
+        self.profiles.clear()
+        self._after_commit(self.cache.clear)
+        self._after_commit(self.profiles.clear)
+        if self.search_index is not None:
+            self._after_commit(self.search_index.clear)
+        await self._notify([CLEAR_ALL])
+        return imported
+
+
+class BonusLedgerRepository(Repository):
+    async def create_partition(self, month: date) -> int:
+        name, start, end = ledger_partition(month)
+        params = {"name": name, "start": start, "end": end}
+        result = await self.db_session.execute(FIND_LEDGER_PARTITION, params)
+        exists, misplaced = result.one()
+        if exists:
+            return 0
+
+        create = text(ledger_partition_ddl(month))
+        if not misplaced:
+            await self.db_session.execute(create)
+            return 0
+
+        await self.db_session.execute(DETACH_LEDGER_DEFAULT)
+        await self.db_session.execute(create)
+        moved = await self.db_session.execute(MOVE_LEDGER_ROWS, params)
+        await self.db_session.execute(ATTACH_LEDGER_DEFAULT)
+        return moved.rowcount
+
+    async def open_balances(self, limit: int) -> int:
+        result = await self.db_session.execute(OPEN_BALANCES, {"limit": limit})
+        return result.rowcount
+
+    async def fetch_bounds(self) -> tuple[int, datetime]:
+        result = await self.db_session.execute(FETCH_LEDGER_BOUNDS)
+        return tuple(result.one())
+
+    async def fetch_tail_user_ids(
+        self, after_txid: int, after_user_id: int, limit: int
+    ) -> list[int]:
+        result = await self.db_session.execute(
+            FETCH_LEDGER_TAIL_USERS,
+            {
+                "after_txid": after_txid,
+                "after_user_id": after_user_id,
+                "limit": limit,
+            },
+        )
+        return list(result.scalars())
+
+    async def compact(self, user_ids: list[int], since: datetime) -> int:
+        result = await self.db_session.execute(
+            COMPACT_LEDGER, {"ids": user_ids, "since": since}
+        )
+        return result.rowcount
+
+
+class QRCodeRepository(Repository):
+    @read_only
+    async def fetch_file_id(
+        self, user_id: int, bot_username: str
+    ) -> str | None:
+        query = select(qr_codes.c.file_id).where(
+            qr_codes.c.user_id == user_id,
+            qr_codes.c.bot_username == bot_username,
+        )
+        result = await self.db_session.execute(query)
+        return result.scalar_one_or_none()
+
+    async def save_file_id(
+        self, user_id: int, bot_username: str, file_id: str
+    ) -> None:
         set_values = {
-            "chat_id": user.chat_id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "username": user.username,
+            "bot_username": bot_username,
+            "file_id": file_id,
         }
         query = (
-            insert(users)
+            insert(qr_codes)
             .values(
-                id=user.id,
+                user_id=user_id,
                 **set_values,
             )
             .on_conflict_do_update(
-                "users_pkey",
+                "qr_codes_pkey",
                 set_=set_values,
             )
         )
         await self.db_session.execute(query)
 
-    async def fetch_balance(self, user_id: int) -> int:
-        query = select(users.c.bonuses).where(users.c.id == user_id)
+
+class OutboxRepository(Repository):
+    _columns = (
+        outbox.c.id,
+        outbox.c.chat_id,
+        outbox.c.template,
+        outbox.c.params,
+        outbox.c.attempts,
+        outbox.c.coalesce_key,
+    )
+
+    async def add_message(
+        self, chat_id: int, template: str, params: dict
+    ) -> None:
+        query = insert(outbox).values(
+            chat_id=chat_id,
+            template=template,
+            params=params,
+        )
+        await self.db_session.execute(query)
+
+    async def add_messages(
+        self, messages: list[dict], delay: timedelta | None = None
+    ) -> None:
+        if not messages:
+            return
+
+        if delay is None:
+            await self.db_session.execute(insert(outbox), messages)
+            return
+
+        await self.db_session.execute(
+            ADD_COALESCED_MESSAGES,
+            [
+                {"coalesce_key": None, **message, "delay": delay}
+                for message in messages
+            ],
+        )
+
+    async def _claim(self, pending, lease: timedelta) -> list[OutboxMessage]:
+        query = (
+            update(outbox)
+            .where(outbox.c.id.in_(pending.scalar_subquery()))
+            .values(
+                attempts=outbox.c.attempts + 1,
+                available_at=func.now() + lease,
+            )
+            .returning(*self._columns)
+        )
         result = await self.db_session.execute(query)
-        return result.scalar_one()
+        return [OutboxMessage(*row) for row in result.all()]
 
-    async def fetch_user_by_username(self, username: str) -> User | None:
-        query = select(
-            users.c.id,
-            users.c.chat_id,
-            users.c.first_name,
-            users.c.last_name,
-            users.c.username,
-            users.c.bonuses,
-        ).where(users.c.username == username)
+    async def claim_messages(
+        self,
+        limit: int,
+        lease: timedelta,
+        max_attempts: int,
+        flush: bool = False,
+    ) -> list[OutboxMessage]:
+        unsent = (
+            outbox.c.sent_at.is_(None),
+            outbox.c.failed_at.is_(None),
+            outbox.c.attempts < max_attempts,
+        )
+        due = outbox.c.available_at <= func.now()
+        if flush:
+            due = or_(due, outbox.c.coalesce_key.is_not(None))
+        pending = (
+            select(outbox.c.id)
+            .where(*unsent, due)
+            .order_by(outbox.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        messages = await self._claim(pending, lease)
+
+        groups = {
+            (message.chat_id, message.coalesce_key)
+            for message in messages
+            if message.coalesce_key is not None
+        }
+        if groups:
+            siblings = (
+                select(outbox.c.id)
+                .where(
+                    *unsent,
+                    tuple_(outbox.c.chat_id, outbox.c.coalesce_key).in_(
+                        list(groups)
+                    ),
+                    outbox.c.id.not_in([message.id for message in messages]),
+                )
+                .with_for_update(skip_locked=True)
+            )
+            messages.extend(await self._claim(siblings, lease))
+        return sorted(messages, key=lambda message: message.id)
+
+    async def mark_sent(self, message_ids: list[int]) -> None:
+        query = (
+            update(outbox)
+            .where(outbox.c.id.in_(message_ids))
+            .values(sent_at=func.now())
+        )
+        await self.db_session.execute(query)
+
+    async def mark_failed(self, message_ids: list[int]) -> None:
+        query = (
+            update(outbox)
+            .where(outbox.c.id.in_(message_ids))
+            .values(failed_at=func.now())
+        )
+        await self.db_session.execute(query)
+
+    async def retry_message(self, message_id: int, delay: timedelta) -> None:
+        query = (
+            update(outbox)
+            .where(outbox.c.id == message_id)
+            .values(available_at=func.now() + delay)
+        )
+        await self.db_session.execute(query)
+
+    async def fail_exhausted(self, max_attempts: int) -> list[int]:
+        query = (
+            update(outbox)
+            .where(
+                outbox.c.sent_at.is_(None),
+                outbox.c.failed_at.is_(None),
+                outbox.c.attempts >= max_attempts,
+                outbox.c.available_at <= func.now(),
+            )
+            .values(failed_at=func.now())
+            .returning(outbox.c.id)
+        )
         result = await self.db_session.execute(query)
-        return self._map_user(result.one_or_none())
+        return list(result.scalars())
 
-    async def fetch_user_by_id(self, user_id: int) -> User:
-        query = select(
-            users.c.id,
-            users.c.chat_id,
-            users.c.first_name,
-            users.c.last_name,
-            users.c.username,
-            users.c.bonuses,
-        ).where(users.c.id == user_id)
+    async def delete_finished(self, older_than: timedelta, limit: int) -> int:
+        finished = (
+            select(outbox.c.id)
+            .where(
+                or_(
+                    outbox.c.sent_at.is_not(None),
+                    outbox.c.failed_at.is_not(None),
+                ),
+                outbox_finished_at < func.now() - older_than,
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = delete(outbox).where(
+            outbox.c.id.in_(finished.scalar_subquery())
+        )
         result = await self.db_session.execute(query)
-        return self._map_user(result.one())
+        return result.rowcount
 
-    async def increase_user_balance(self, user_id: int, bonuses: int) -> User:
+
+class BroadcastRepository(Repository):
+    _columns = (
+        broadcasts.c.id,
+        broadcasts.c.admin_chat_id,
+        broadcasts.c.progress_message_id,
+        broadcasts.c.template,
+        broadcasts.c.params,
+        broadcasts.c.total,
+        broadcasts.c.last_user_id,
+        broadcasts.c.sent,
+        broadcasts.c.failed,
+    )
+
+    async def create_broadcast(
+        self,
+        admin_chat_id: int,
+        progress_message_id: int,
+        template: str,
+        params: dict,
+        total: int,
+    ) -> Broadcast:
         query = (
-            update(users)
-            .where(users.c.id == user_id)
-            .values(bonuses=users.c.bonuses + bonuses)
-            .returning(
-                users.c.id,
-                users.c.chat_id,
-                users.c.first_name,
-                users.c.last_name,
-                users.c.username,
-                users.c.bonuses,
+            insert(broadcasts)
+            .values(
+                admin_chat_id=admin_chat_id,
+                progress_message_id=progress_message_id,
+                template=template,
+                params=params,
+                total=total,
             )
+            .returning(*self._columns)
         )
         result = await self.db_session.execute(query)
-        return self._map_user(result.one_or_none())
+        return Broadcast(*result.one())
 
-    async def decrease_user_balance(self, user_id: int, bonuses: int) -> User:
+    @read_only
+    async def fetch_unfinished(self) -> list[Broadcast]:
+        query = (
+            select(*self._columns)
+            .where(broadcasts.c.finished_at.is_(None))
+            .order_by(broadcasts.c.id)
+        )
+        result = await self.db_session.execute(query)
+        return [Broadcast(*row) for row in result.all()]
+
+    async def save_checkpoint(
+        self, broadcast_id: int, last_user_id: int, sent: int, failed: int
+    ) -> None:
         query = (
-            update(users)
-            .where(users.c.id == user_id)
-            .values(bonuses=users.c.bonuses - bonuses)
-            .returning(
-                users.c.id,
-                users.c.chat_id,
-                users.c.first_name,
-                users.c.last_name,
-                users.c.username,
-                users.c.bonuses,
+            update(broadcasts)
+            .where(broadcasts.c.id == broadcast_id)
+            .values(last_user_id=last_user_id, sent=sent, failed=failed)
+        )
+        await self.db_session.execute(query)
+
+    async def finish(self, broadcast_id: int) -> None:
+        query = (
+            update(broadcasts)
+            .where(broadcasts.c.id == broadcast_id)
+            .values(finished_at=func.now())
+        )
+        await self.db_session.execute(query)
+
+
+class BonusExpiryRepository(Repository):
+    _columns = (
+        bonus_expiry_runs.c.id,
+        bonus_expiry_runs.c.cutoff,
+        bonus_expiry_runs.c.last_user_id,
+        bonus_expiry_runs.c.expired_users,
+        bonus_expiry_runs.c.expired_bonuses,
+        bonus_expiry_runs.c.created_at,
+    )
+
+    async def create_run(self, cutoff: datetime) -> BonusExpiryRun:
+        query = (
+            insert(bonus_expiry_runs)
+            .values(cutoff=cutoff)
+            .returning(*self._columns)
+        )
+        result = await self.db_session.execute(query)
+        return BonusExpiryRun(*result.one())
+
+    @read_only
+    async def fetch_latest(self) -> tuple[BonusExpiryRun | None, bool]:
+        query = (
+            select(*self._columns, bonus_expiry_runs.c.finished_at)
+            .order_by(bonus_expiry_runs.c.id.desc())
+            .limit(1)
+        )
+        row = (await self.db_session.execute(query)).one_or_none()
+        if row is None:
+            return None, True
+        return BonusExpiryRun(*row[:-1]), row.finished_at is not None
+
+    async def save_checkpoint(
+        self,
+        run_id: int,
+        last_user_id: int,
+        expired_users: int,
+        expired_bonuses: int,
+    ) -> None:
+        query = (
+            update(bonus_expiry_runs)
+            .where(bonus_expiry_runs.c.id == run_id)
+            .values(
+                last_user_id=last_user_id,
+                expired_users=bonus_expiry_runs.c.expired_users
+                + expired_users,
+                expired_bonuses=bonus_expiry_runs.c.expired_bonuses
+                + expired_bonuses,
             )
         )
+        await self.db_session.execute(query)
 
-        try:
-            result = await self.db_session.execute(query)
-        except IntegrityError:
-            raise NegativeBonusesError
+    async def finish(self, run_id: int) -> None:
+        query = (
+            update(bonus_expiry_runs)
+            .where(bonus_expiry_runs.c.id == run_id)
+            .values(finished_at=func.now())
+        )
+        await self.db_session.execute(query)
 
-        return self._map_user(result.one_or_none())
+
+class PersistenceRepository(Repository):
+    @read_only
+    async def fetch_data(self, kind: str) -> dict[str, Any]:
+        query = select(bot_persistence.c.key, bot_persistence.c.data).where(
+            bot_persistence.c.kind == kind
+        )
+        result = await self.db_session.execute(query)
+        return dict(result.all())
+
+    async def save_data(self, rows: list[dict]) -> None:
+        query = insert(bot_persistence).values(rows)
+        query = query.on_conflict_do_update(
+            "bot_persistence_pkey",
+            set_={"data": query.excluded.data},
+        )
+        await self.db_session.execute(query)
+
+    async def delete_data(self, keys: list[tuple[str, str]]) -> None:
+        query = delete(bot_persistence).where(
+            tuple_(bot_persistence.c.kind, bot_persistence.c.key).in_(keys)
+        )
+        await self.db_session.execute(query)
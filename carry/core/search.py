@@ -0,0 +1,69 @@
+import re
+from typing import Iterable
+from collections import Counter, defaultdict
+
+from carry.config import settings
+
+WORD_PATTERN = re.compile(r"\w+")
+SIMILARITY_THRESHOLD = 0.6
+
+
+def trigrams(text: str) -> set[str]:
+    grams = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.ready = False
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._documents: dict[int, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, key: int, text: str) -> None:
+        self.remove(key)
+        grams = self._documents[key] = trigrams(text)
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def remove(self, key: int) -> None:
+        for gram in self._documents.pop(key, ()):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def load(self, documents: Iterable[tuple[int, str]]) -> None:
+        for key, text in documents:
+            self.add(key, text)
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._documents.clear()
+        self.ready = False
+
+    def search(self, query: str, limit: int) -> list[int]:
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        min_shared = self.threshold * len(query_grams)
+        ranked = sorted(
+            (-count, len(self._documents[key]), key)
+            for key, count in shared.items()
+            if count >= min_shared
+        )
+        return [key for _, _, key in ranked[:limit]]
+
+
+user_search_index = NgramIndex() if settings.search.in_memory else None
@@ -1,24 +1,80 @@
 import jinja2
+from jinja2 import meta
+from jinja2.ext import Extension
 
 from carry.config import settings
 
-_template_loader = jinja2.FileSystemLoader(searchpath=settings.templates_dir)
-_env = jinja2.Environment(
-    loader=_template_loader,
-    trim_blocks=True,
-    lstrip_blocks=True,
-    autoescape=True,
+
+class LineBreakExtension(Extension):
+    def preprocess(
+        self, source: str, name: str | None, filename: str | None = None
+    ) -> str:
+        return source.replace("<br/>", '{{ "\\n" }}')
+
+
+class TemplateEngine:
+    def __init__(self, searchpath: str, bytecode_cache_dir: str | None = None):
+        self.searchpath = searchpath
+        self.bytecode_cache_dir = bytecode_cache_dir
+        self._environment: jinja2.Environment | None = None
+        self._templates: dict[str, jinja2.Template] = {}
+        self._prerendered: dict[str, str] = {}
+
+    @property
+    def _env(self) -> jinja2.Environment:
+        if self._environment is None:
+            self._environment = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(searchpath=self.searchpath),
+                bytecode_cache=(
+                    jinja2.FileSystemBytecodeCache(self.bytecode_cache_dir)
+                    if self.bytecode_cache_dir
+                    else None
+                ),
+                extensions=[LineBreakExtension],
+                trim_blocks=True,
+                lstrip_blocks=True,
+                autoescape=True,
+                auto_reload=False,
+            )
+        return self._environment
+
+    def preload(self) -> None:
+        for template_name in self._env.list_templates(extensions=["jinja2"]):
+            self._load(template_name)
+
+    def _is_static(self, template_name: str) -> bool:
+        source, _, _ = self._env.loader.get_source(self._env, template_name)
+        ast = self._env.parse(source, template_name)
+        return not (
+            meta.find_undeclared_variables(ast)
+            or any(meta.find_referenced_templates(ast))
+        )
+
+    def _load(self, template_name: str) -> jinja2.Template:
+        template = self._env.get_template(template_name)
+        if self._is_static(template_name):
+            self._prerendered[template_name] = template.render()
+        self._templates[template_name] = template
+        return template
+
+    def render(self, template_name: str, data: dict | None = None) -> str:
+        if not data and template_name in self._prerendered:
+            return self._prerendered[template_name]
+
+        template = self._templates.get(template_name)
+        if template is None:
+            template = self._load(template_name)
+            if not data and template_name in self._prerendered:
+                return self._prerendered[template_name]
+
+        return template.render(data or {})
+
+
+template_engine = TemplateEngine(
+    settings.templates_dir,
+    settings.templates_bytecode_cache_dir,
 )
 
 
 def render_template(template_name: str, data: dict | None = None) -> str:
-    if data is None:
-        data = {}
-
-    template = _env.get_template(template_name)
-    rendered = template.render(**data).replace("<br/>", "\n")
-    # rendered = rendered.replace("<br>", "\n")
-    # rendered = re.sub(" +", " ", rendered).replace(" .", ".").replace(" ,", ",")
-    # rendered = "\n".join(line.strip() for line in rendered.split("\n"))
-    # rendered = rendered.replace("{FOURPACES}", "    ")
-    return rendered
+    return template_engine.render(template_name, data)
@@ -1 +1,15 @@
-from carry.db.tables import users
+from carry.db.tables import (
+    users,
+    outbox,
+    qr_codes,
+    broadcasts,
+    users_bonuses,
+    bot_persistence,
+    ledger_partition,
+    bonus_expiry_runs,
+    users_search_text,
+    bonus_transactions,
+    outbox_finished_at,
+    ledger_partition_ddl,
+    bonus_transactions_default,
+)
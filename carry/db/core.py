@@ -1,53 +1,363 @@
-from typing import TYPE_CHECKING, AsyncIterator
+import time
+import inspect
+import logging
+from uuid import uuid4
+from typing import TYPE_CHECKING, Any, TypeVar, Callable, Awaitable, ParamSpec
+from functools import wraps, partial
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from collections.abc import Iterable, AsyncIterator
 
-from sqlalchemy.orm import registry, sessionmaker
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm.decl_api import DeclarativeMeta
+from sqlalchemy import MetaData, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url
 
-from carry.config import settings
+from carry.core import metrics
+from carry.config import settings, settings_store
+from carry.db.replicas import CURRENT_LSN, ReplicaRouter
 
 if TYPE_CHECKING:
-    from sqlalchemy.ext.asyncio import AsyncConnection
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.ext.asyncio import (
+        AsyncEngine,
+        AsyncSession,
+        AsyncConnection,
+    )
 
     from carry.context import Context
 
-mapper_registry = registry()
-metadata = mapper_registry.metadata
-engine = create_async_engine(
-    settings.db.uri,
-    pool_pre_ping=True,
+P = ParamSpec("P")
+RT = TypeVar("RT")
+log = logging.getLogger(__name__)
+
+POOL_PRE_PING = True
+
+statement_duration = metrics.registry.histogram(
+    "carry_db_statement_duration_seconds",
+    "SQL statement execution time",
+    ("operation",),
+)
+statement_errors = metrics.registry.counter(
+    "carry_db_statement_errors_total", "Failed SQL statements", ("operation",)
 )
-session_factory = sessionmaker(
-    bind=engine,
-    expire_on_commit=False,
-    class_=AsyncSession,
+pool_checkout_wait = metrics.registry.histogram(
+    "carry_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
 )
 
 
-class Base(metaclass=DeclarativeMeta):
-    __abstract__ = True
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+metadata = MetaData()
 
-    registry = mapper_registry
-    metadata = metadata
 
-    __init__ = mapper_registry.constructor
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
 
 
-async def create_connection() -> "AsyncConnection":
-    conn = await engine.connect()
-    return conn
+def engine_options(
+    uri: str, prepared_statements: bool | None = None
+) -> dict[str, Any]:
+    db_options = settings_store.snapshot.db
+    if prepared_statements is None:
+        prepared_statements = db_options.prepared_statements
 
+    options = {"query_cache_size": db_options.query_cache_size}
+    if make_url(uri).get_driver_name() != "asyncpg":
+        return options
 
-@asynccontextmanager
-async def db_session_ctx(ctx: "Context") -> AsyncIterator[AsyncSession]:
-    async with session_factory() as session:
-        token = ctx.ctx_db.set(session)
+    if prepared_statements:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": (
+                db_options.prepared_statement_cache_size
+            ),
+        }
+    else:
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": _unique_statement_name,
+        }
+    return options
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    round_trips: int = 0
+    checkouts: int = 0
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "query_stats", default=None
+)
+_read_only: ContextVar[bool] = ContextVar("db_read_only", default=False)
+_read_keys: ContextVar[tuple] = ContextVar("db_read_keys", default=())
+
+
+def _is_autocommit(conn) -> bool:
+    return conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+
+
+def _count_round_trip(*args) -> None:
+    if stats := _query_stats.get():
+        stats.round_trips += 1
+
+
+def _count_transaction_round_trip(conn) -> None:
+    if not _is_autocommit(conn):
+        _count_round_trip()
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement else ""
+
+
+def _count_statement(conn, cursor, statement, *args) -> None:
+    conn.info.setdefault("statement_started_at", []).append(
+        time.perf_counter()
+    )
+    if stats := _query_stats.get():
+        stats.statements += 1
+        stats.round_trips += 1
+
+
+def _time_statement(conn, cursor, statement, *args) -> None:
+    started_at = conn.info["statement_started_at"].pop()
+    duration = time.perf_counter() - started_at
+    statement_duration.observe(duration, operation=_operation(statement))
+    metrics.record_span("db", " ".join(statement.split())[:200], duration)
+
+
+def _count_statement_error(context) -> None:
+    if context.connection is not None:
+        started_at = context.connection.info.get("statement_started_at")
+        if started_at:
+            started_at.pop()
+    statement_errors.inc(operation=_operation(context.statement or ""))
+
+
+def _count_checkout(*args) -> None:
+    if stats := _query_stats.get():
+        stats.checkouts += 1
+        if POOL_PRE_PING:
+            stats.round_trips += 1
+
+
+def _instrument(engine: "AsyncEngine") -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _count_statement)
+    event.listen(sync_engine, "after_cursor_execute", _time_statement)
+    event.listen(sync_engine, "handle_error", _count_statement_error)
+    event.listen(sync_engine.pool, "checkout", _count_checkout)
+    for event_name in ("begin", "commit", "rollback"):
+        event.listen(sync_engine, event_name, _count_transaction_round_trip)
+
+
+class Database:
+    def __init__(self, uri: str):
+        self.uri = uri
+        self._engine: "AsyncEngine | None" = None
+        self._session_factory: "sessionmaker | None" = None
+        self._read_only_session_factory: "sessionmaker | None" = None
+
+    @property
+    def engine(self) -> "AsyncEngine":
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+
+            self._engine = create_async_engine(
+                self.uri,
+                pool_pre_ping=POOL_PRE_PING,
+                poolclass=InstrumentedPool,
+                **engine_options(self.uri),
+            )
+            _instrument(self._engine)
+        return self._engine
+
+    def _create_session_factory(self, engine: "AsyncEngine") -> "sessionmaker":
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.ext.asyncio import AsyncSession
+
+        return sessionmaker(
+            bind=engine, expire_on_commit=False, class_=AsyncSession
+        )
+
+    @property
+    def session_factory(self) -> "sessionmaker":
+        if self._session_factory is None:
+            self._session_factory = self._create_session_factory(self.engine)
+        return self._session_factory
+
+    @property
+    def read_only_session_factory(self) -> "sessionmaker":
+        if self._read_only_session_factory is None:
+            self._read_only_session_factory = self._create_session_factory(
+                self.engine.execution_options(isolation_level="AUTOCOMMIT")
+            )
+        return self._read_only_session_factory
+
+    def checked_out(self) -> int:
+        if self._engine is None:
+            return 0
+        return self._engine.sync_engine.pool.checkedout()
+
+    async def dispose(self) -> None:
+        if self._engine is not None:
+            await self._engine.dispose()
+
+
+database = Database(settings_store.snapshot.db.uri)
+
+replica_router = ReplicaRouter(
+    [Database(uri) for uri in settings_store.snapshot.db.replicas],
+    max_lag=settings.db_replicas.max_lag,
+    pin_window=settings.db_replicas.pin_window,
+    check_interval=settings.db_replicas.check_interval,
+)
+
+metrics.registry.gauge(
+    "carry_db_pool_checked_out", "Connections currently checked out"
+).set_function(lambda: {(): database.checked_out()})
+metrics.registry.gauge(
+    "carry_db_replica_lag_seconds",
+    "Replay lag of healthy replicas",
+    ("replica",),
+).set_function(
+    lambda: {
+        (replica.name,): replica.lag
+        for replica in replica_router.replicas
+        if replica.healthy
+    }
+)
+
+
+def _read_keys_of(
+    signature: inspect.Signature, key: str, args, kwargs
+) -> tuple:
+    value = signature.bind(*args, **kwargs).arguments[key]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(value)
+    return (value,)
+
+
+def read_only(
+    func: Callable[P, Awaitable[RT]] | None = None, *, key: str | None = None
+) -> Callable[P, Awaitable[RT]]:
+    if func is None:
+        return partial(read_only, key=key)
+
+    signature = inspect.signature(func) if key is not None else None
+
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> RT:
+        keys = ()
+        if signature is not None:
+            keys = _read_keys_of(signature, key, args, kwargs)
+        token = _read_only.set(True)
+        keys_token = _read_keys.set(keys)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _read_keys.reset(keys_token)
+            _read_only.reset(token)
+
+    return wrapper
+
+
+class DBSessionScope:
+    def __init__(self, read_only: bool = False, use_replicas: bool = True):
+        self.read_only = read_only
+        self.use_replicas = use_replicas
+        self.stats = QueryStats()
+        self.repositories: dict[Callable, Any] = {}
+        self._session: "AsyncSession | None" = None
+        self._read_only_sessions: dict[Database, "AsyncSession"] = {}
+        self._pinned_keys: set[int | str] = set()
+
+    @property
+    def session(self) -> "AsyncSession":
+        if self.read_only or _read_only.get():
+            return self.read_only_session
+
+        if self._session is None:
+            self._session = database.session_factory()
+        return self._session
+
+    @property
+    def read_only_session(self) -> "AsyncSession":
+        if self._session is not None:
+            return self._session
+
+        target = database
+        if self.use_replicas:
+            target = replica_router.choose(_read_keys.get()) or database
+
+        session = self._read_only_sessions.get(target)
+        if session is None:
+            session = target.read_only_session_factory()
+            self._read_only_sessions[target] = session
+        return session
+
+    def pin_reads(self, keys: Iterable[int | str]) -> None:
+        if replica_router:
+            self._pinned_keys.update(keys)
+
+    async def _pin_committed(self) -> None:
+        lsn = None
         try:
-            yield session
-            await session.commit()
+            connection = await self._session.connection(
+                execution_options={"isolation_level": "AUTOCOMMIT"}
+            )
+            result = await connection.execute(CURRENT_LSN)
+            lsn = result.scalar_one()
         except Exception:
-            await session.rollback()
-            raise
+            log.exception("[CARRY] Cannot read the primary WAL position!")
+        replica_router.pin(self._pinned_keys, lsn)
+
+    async def close(self, commit: bool) -> None:
+        try:
+            if self._session is not None:
+                if commit:
+                    await self._session.commit()
+                    if self._pinned_keys and replica_router:
+                        await self._pin_committed()
+                else:
+                    await self._session.rollback()
         finally:
-            ctx.ctx_db.reset(token)
+            sessions = [self._session, *self._read_only_sessions.values()]
+            for session in sessions:
+                if session is not None:
+                    await session.close()
+
+
+async def create_connection() -> "AsyncConnection":
+    conn = await database.engine.connect()
+    return conn
+
+
+@asynccontextmanager
+async def db_session_ctx(
+    ctx: "Context", read_only: bool = False, use_replicas: bool = True
+) -> AsyncIterator[DBSessionScope]:
+    scope = DBSessionScope(read_only=read_only, use_replicas=use_replicas)
+    token = ctx.ctx_db.set(scope)
+    stats_token = _query_stats.set(scope.stats)
+    try:
+        yield scope
+    except BaseException:
+        await scope.close(commit=False)
+        raise
+    else:
+        await scope.close(commit=True)
+    finally:
+        _query_stats.reset(stats_token)
+        ctx.ctx_db.reset(token)
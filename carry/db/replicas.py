@@ -0,0 +1,165 @@
+import time
+import random
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from carry.core import metrics
+
+if TYPE_CHECKING:
+    from carry.db.core import Database
+
+log = logging.getLogger(__name__)
+
+ALL_KEYS = "*"
+NOT_REPLAYED = float("inf")
+
+REPLICA_STATUS = text(
+    "SELECT pg_last_wal_replay_lsn()::text AS replay_lsn, "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - "
+    "pg_last_xact_replay_timestamp()), 0) END AS lag"
+)
+CURRENT_LSN = text("SELECT pg_current_wal_lsn()::text")
+
+routed_reads = metrics.registry.counter(
+    "carry_db_routed_reads_total",
+    "Read-only queries routed per database",
+    ("target",),
+)
+
+
+def parse_lsn(lsn: str) -> int:
+    high, _, low = lsn.partition("/")
+    return int(high, 16) << 32 | int(low, 16)
+
+
+@dataclass
+class Replica:
+    name: str
+    database: "Database"
+    healthy: bool | None = None
+    replay_lsn: int = 0
+    lag: float = NOT_REPLAYED
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        databases: list["Database"],
+        max_lag: float = 1.0,
+        pin_window: float = 5.0,
+        check_interval: float = 1.0,
+    ):
+        self.replicas = [
+            Replica(f"replica{i}", database)
+            for i, database in enumerate(databases)
+        ]
+        self.max_lag = max_lag
+        self.pin_window = pin_window
+        self.check_interval = check_interval
+        self._pins: dict[int | str, tuple[float, float]] = {}
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def pin(self, keys: Iterable[int | str], lsn: str | None = None) -> None:
+        required = NOT_REPLAYED if lsn is None else parse_lsn(lsn)
+        deadline = time.monotonic() + self.pin_window
+        for key in keys:
+            pinned, _ = self._pins.get(key, (0, 0.0))
+            self._pins[key] = (max(pinned, required), deadline)
+
+    def _required_lsn(self, keys: Iterable[int | str]) -> float:
+        now, required = time.monotonic(), 0
+        for key in (ALL_KEYS, *keys):
+            pin = self._pins.get(key)
+            if pin is None:
+                continue
+            if pin[1] <= now:
+                del self._pins[key]
+            else:
+                required = max(required, pin[0])
+        return required
+
+    def choose(self, keys: Iterable[int | str] = ()) -> "Database | None":
+        if not self.replicas:
+            return None
+
+        required = self._required_lsn(keys)
+        candidates = [
+            replica
+            for replica in self.replicas
+            if replica.healthy
+            and replica.lag <= self.max_lag
+            and replica.replay_lsn >= required
+        ]
+        if not candidates:
+            routed_reads.inc(target="primary")
+            return None
+
+        replica = min(candidates, key=lambda r: (r.lag, random.random()))
+        routed_reads.inc(target=replica.name)
+        return replica.database
+
+    async def start(self) -> None:
+        if not self.replicas:
+            return
+
+        self._stopping.clear()
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+        for replica in self.replicas:
+            replica.healthy = None
+            await replica.database.dispose()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(), self.check_interval
+                )
+            except asyncio.TimeoutError:
+                await self.check()
+
+    async def check(self) -> None:
+        await asyncio.gather(*map(self._check, self.replicas))
+        now = time.monotonic()
+        self._pins = {
+            key: pin for key, pin in self._pins.items() if pin[1] > now
+        }
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with replica.database.engine.connect() as connection:
+                result = await connection.execute(REPLICA_STATUS)
+                replay_lsn, lag = result.one()
+        except Exception:
+            if replica.healthy is not False:
+                log.exception(f"[CARRY] {replica.name} is unavailable!")
+            replica.healthy = False
+            return
+
+        if replay_lsn is None:
+            if replica.healthy is not False:
+                log.warning(f"[CARRY] {replica.name} is not in recovery!")
+            replica.healthy = False
+            return
+
+        if not replica.healthy:
+            log.info(f"[CARRY] Routing reads to {replica.name}")
+        replica.healthy = True
+        replica.replay_lsn = parse_lsn(replay_lsn)
+        replica.lag = float(lag)
@@ -1,4 +1,26 @@
-from sqlalchemy import Table, Column, String, Integer, CheckConstraint
+from datetime import date, timedelta
+
+from sqlalchemy import (
+    DDL,
+    Date,
+    Index,
+    Table,
+    Column,
+    String,
+    Integer,
+    DateTime,
+    BigInteger,
+    CheckConstraint,
+    func,
+    text,
+    event,
+    table,
+    column,
+    select,
+    literal,
+    literal_column,
+)
+from sqlalchemy.dialects.postgresql import JSONB, dialect
 
 from carry.db.core import metadata
 
@@ -11,5 +33,225 @@ users = Table(
     Column("last_name", String(120), nullable=True),
     Column("username", String(120), nullable=True),
     Column("bonuses", Integer, default=0, nullable=False),
+    Column("bonuses_txid", BigInteger, server_default="0", nullable=False),
+    Column(
+        "bonuses_since",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
     CheckConstraint("bonuses >= 0"),
+    Index("users_username_idx", "username"),
+    Index("users_bonuses_id_idx", "bonuses", "id"),
+    Index(
+        "users_unopened_idx",
+        "id",
+        postgresql_where=text("bonuses_txid = 0 AND bonuses > 0"),
+    ),
+)
+users_search_text = (
+    users.c.first_name
+    + literal_column("' '")
+    + func.coalesce(users.c.last_name, literal_column("''"))
+    + literal_column("' '")
+    + func.coalesce(users.c.username, literal_column("''"))
+)
+Index(
+    "users_search_trgm_idx",
+    users_search_text.label("search_text"),
+    postgresql_using="gin",
+    postgresql_ops={"search_text": "gin_trgm_ops"},
+)
+event.listen(
+    users,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+bonus_transactions = Table(
+    "bonus_transactions",
+    metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column(
+        "created_at",
+        DateTime(timezone=True),
+        server_default=func.clock_timestamp(),
+        primary_key=True,
+    ),
+    Column("user_id", Integer, nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("reason", String(32), nullable=False),
+    Column(
+        "txid",
+        BigInteger,
+        server_default=func.txid_current(),
+        nullable=False,
+    ),
+    Index(
+        "bonus_transactions_user_idx",
+        "user_id",
+        "txid",
+        postgresql_include=["delta"],
+    ),
+    Index("bonus_transactions_txid_idx", "txid", postgresql_using="brin"),
+    postgresql_partition_by="RANGE (created_at)",
+)
+bonus_transactions_default = table(
+    "bonus_transactions_default",
+    *(column(ledger_column.name) for ledger_column in bonus_transactions.c),
+)
+LEDGER_INITIAL_PARTITIONS = 2
+
+
+def ledger_partition(month: date) -> tuple[str, date, date]:
+    start = date(month.year, month.month, 1)
+    end = (start + timedelta(days=31)).replace(day=1)
+    return f"{bonus_transactions.name}_{start:%Y_%m}", start, end
+
+
+def ledger_partition_ddl(month: date) -> str:
+    name, start, end = ledger_partition(month)
+    preparer = dialect().identifier_preparer
+    start, end = (
+        literal(bound, Date).compile(
+            dialect=dialect(), compile_kwargs={"literal_binds": True}
+        )
+        for bound in (start, end)
+    )
+    return (
+        f"CREATE TABLE IF NOT EXISTS {preparer.quote(name)} "
+        f"PARTITION OF {bonus_transactions.name} "
+        f"FOR VALUES FROM ({start}) TO ({end})"
+    )
+
+
+def _create_ledger_partitions(target, connection, **kw) -> None:
+    if connection.dialect.name != "postgresql":
+        return
+
+    month = date.today()
+    for _ in range(LEDGER_INITIAL_PARTITIONS):
+        connection.execute(text(ledger_partition_ddl(month)))
+        month = ledger_partition(month)[2]
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {bonus_transactions_default.name} "
+            f"PARTITION OF {bonus_transactions.name} DEFAULT"
+        )
+    )
+
+
+event.listen(bonus_transactions, "after_create", _create_ledger_partitions)
+users_bonuses = users.c.bonuses + (
+    select(func.coalesce(func.sum(bonus_transactions.c.delta), 0))
+    .where(
+        bonus_transactions.c.user_id == users.c.id,
+        bonus_transactions.c.txid >= users.c.bonuses_txid,
+        bonus_transactions.c.created_at >= users.c.bonuses_since,
+    )
+    .scalar_subquery()
+)
+
+qr_codes = Table(
+    "qr_codes",
+    metadata,
+    Column("user_id", Integer, primary_key=True),
+    Column("bot_username", String(120), nullable=False),
+    Column("file_id", String(255), nullable=False),
+)
+
+outbox = Table(
+    "outbox",
+    metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("chat_id", Integer, nullable=False),
+    Column("template", String(255), nullable=False),
+    Column("params", JSONB, nullable=False),
+    Column("attempts", Integer, default=0, nullable=False),
+    Column(
+        "available_at",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
+    Column("sent_at", DateTime(timezone=True), nullable=True),
+    Column("failed_at", DateTime(timezone=True), nullable=True),
+    Column("coalesce_key", String(64), nullable=True),
+    Index(
+        "outbox_pending_idx",
+        "available_at",
+        postgresql_where=text("sent_at IS NULL AND failed_at IS NULL"),
+    ),
+    Index(
+        "outbox_coalesce_idx",
+        "chat_id",
+        "coalesce_key",
+        postgresql_where=text(
+            "sent_at IS NULL AND failed_at IS NULL "
+            "AND coalesce_key IS NOT NULL"
+        ),
+    ),
+    Index(
+        "outbox_coalesce_sent_idx",
+        "chat_id",
+        "coalesce_key",
+        "sent_at",
+        postgresql_where=text(
+            "sent_at IS NOT NULL AND coalesce_key IS NOT NULL"
+        ),
+    ),
+)
+outbox_finished_at = func.coalesce(outbox.c.sent_at, outbox.c.failed_at)
+Index(
+    "outbox_finished_idx",
+    outbox_finished_at,
+    postgresql_where=text("sent_at IS NOT NULL OR failed_at IS NOT NULL"),
+)
+
+broadcasts = Table(
+    "broadcasts",
+    metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("admin_chat_id", Integer, nullable=False),
+    Column("progress_message_id", Integer, nullable=True),
+    Column("template", String(255), nullable=False),
+    Column("params", JSONB, nullable=False),
+    Column("total", Integer, default=0, nullable=False),
+    Column("last_user_id", Integer, default=0, nullable=False),
+    Column("sent", Integer, default=0, nullable=False),
+    Column("failed", Integer, default=0, nullable=False),
+    Column(
+        "created_at",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
+    Column("finished_at", DateTime(timezone=True), nullable=True),
+)
+
+bonus_expiry_runs = Table(
+    "bonus_expiry_runs",
+    metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("cutoff", DateTime(timezone=True), nullable=False),
+    Column("last_user_id", Integer, default=0, nullable=False),
+    Column("expired_users", Integer, default=0, nullable=False),
+    Column("expired_bonuses", BigInteger, default=0, nullable=False),
+    Column(
+        "created_at",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
+    Column("finished_at", DateTime(timezone=True), nullable=True),
+)
+
+bot_persistence = Table(
+    "bot_persistence",
+    metadata,
+    Column("kind", String(64), primary_key=True),
+    Column("key", String(255), primary_key=True),
+    Column("data", JSONB, nullable=False),
 )
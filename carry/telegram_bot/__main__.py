@@ -1,10 +1,22 @@
-import logging
+from carry.config import settings
+from carry.telegram_bot.logging import setup_logging
+from carry.telegram_bot.startup import startup_timer
 
-from carry.telegram_bot.factories import create_bot
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
-bot = create_bot()
-bot.run_polling()
+def main() -> None:
+    setup_logging()
+    if settings.workers.count > 1:
+        from carry.telegram_bot.workers import run_sharded
+
+        run_sharded()
+    else:
+        from carry.telegram_bot.factories import run_bot, create_bot
+
+        startup_timer.mark("imports")
+        bot = create_bot()
+        startup_timer.mark("build")
+        run_bot(bot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Hashable
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import Application
+
+from carry.telegram_bot.startup import startup_timer
+
+PROCESS_UPDATE_WRAPPER = "_Application__process_update_wrapper"
+if not hasattr(Application, PROCESS_UPDATE_WRAPPER):
+    raise ImportError(
+        f"Application.{PROCESS_UPDATE_WRAPPER} is missing, "
+        "ChatOrderedApplication cannot order updates per chat with this "
+        "python-telegram-bot version"
+    )
+
+
+class ChatOrderedApplication(Application):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._chat_locks: dict[Hashable, asyncio.Lock] = defaultdict(
+            asyncio.Lock
+        )
+        self._chat_waiters: dict[Hashable, int] = defaultdict(int)
+
+    @staticmethod
+    def _ordering_key(update: object) -> Hashable | None:
+        if not isinstance(update, Update):
+            return None
+
+        chat, user = update.effective_chat, update.effective_user
+        if chat is None and user is None:
+            return None
+        return (chat and chat.id, user and user.id)
+
+    async def process_update(self, update: object) -> None:
+        await super().process_update(update)
+        startup_timer.update_handled()
+
+    # PTB takes the concurrent_updates slot inside this wrapper, so updates
+    # wait for their chat before they occupy a slot. PTB is pinned to 20.1.x
+    # because later releases moved this code into BaseUpdateProcessor.
+    async def _Application__process_update_wrapper(
+        self, update: object
+    ) -> None:
+        process = super()._Application__process_update_wrapper
+        key = self._ordering_key(update)
+        if key is None or not self.concurrent_updates:
+            return await process(update)
+
+        self._chat_waiters[key] += 1
+        try:
+            async with self._chat_locks[key]:
+                await process(update)
+        finally:
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from functools import partial
+from dataclasses import dataclass
+
+from telegram.error import TelegramError
+from telegram.constants import ParseMode
+
+from carry.config import settings
+from carry.context import ctx
+from carry.core.entities import Broadcast
+from carry.core.templates import render_template
+from carry.telegram_bot.rate_limiter import Priority
+
+if TYPE_CHECKING:
+    from telegram import Bot
+    from telegram.ext import Application
+
+    from carry.telegram_bot.sharding import Shard
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastProgress:
+    total: int
+    sent: int
+    failed: int
+    finished: bool = False
+
+    @property
+    def text(self) -> str:
+        status = "завершено ✅" if self.finished else "триває ⏳"
+        return (
+            f"Розсилка {status}\n"
+            f"Надіслано: {self.sent} / ~{self.total}\n"
+            f"Помилок: {self.failed}"
+        )
+
+
+class BroadcastRunner:
+    def __init__(
+        self,
+        workers: int = 8,
+        page_size: int = 500,
+        report_interval: float = 10.0,
+    ):
+        self.workers = workers
+        self.page_size = page_size
+        self.report_interval = report_interval
+        self._bot: "Bot | None" = None
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(
+        self, application: "Application", shard: "Shard | None" = None
+    ) -> None:
+        self._bot = application.bot
+        for broadcast in await self._fetch_unfinished():
+            if shard is not None and not shard.owns(broadcast.admin_chat_id):
+                continue
+            log.info(f"[CARRY] Resuming broadcast {broadcast.id}")
+            self.launch(broadcast)
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    def launch(self, broadcast: Broadcast) -> None:
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(partial(self._on_done, broadcast.id))
+
+    def _on_done(self, broadcast_id: int, task: asyncio.Task) -> None:
+        self._tasks.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.error(
+                f"[CARRY] Broadcast {broadcast_id} is interrupted!",
+                exc_info=task.exception(),
+            )
+
+    @ctx.with_request_context(read_only=True, use_replicas=False)
+    async def _fetch_unfinished(self) -> list[Broadcast]:
+        return await ctx.broadcast_repository.fetch_unfinished()
+
+    @ctx.with_request_context(read_only=True)
+    async def _fetch_page(self, after_user_id: int) -> list[tuple[int, int]]:
+        return await ctx.user_repository.fetch_chat_ids(
+            after_user_id, self.page_size
+        )
+
+    @ctx.with_request_context
+    async def _save_checkpoint(
+        self,
+        broadcast: Broadcast,
+        last_user_id: int,
+        progress: BroadcastProgress,
+    ) -> None:
+        await ctx.broadcast_repository.save_checkpoint(
+            broadcast.id, last_user_id, progress.sent, progress.failed
+        )
+
+    @ctx.with_request_context
+    async def _finish(self, broadcast: Broadcast) -> None:
+        await ctx.broadcast_repository.finish(broadcast.id)
+
+    async def _report(
+        self, broadcast: Broadcast, progress: BroadcastProgress
+    ) -> None:
+        if broadcast.progress_message_id is None:
+            return
+
+        try:
+            await self._bot.edit_message_text(
+                progress.text,
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.progress_message_id,
+            )
+        except TelegramError:
+            log.warning(
+                f"[CARRY] Cannot report broadcast {broadcast.id} progress!"
+            )
+
+    async def _worker(
+        self,
+        queue: asyncio.Queue[int],
+        text: str,
+        progress: BroadcastProgress,
+    ) -> None:
+        while True:
+            chat_id = await queue.get()
+            try:
+                await self._bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode=ParseMode.HTML,
+                    rate_limit_args=Priority.BROADCAST,
+                )
+            except TelegramError as e:
+                log.info(f"[CARRY] Broadcast to {chat_id} is failed: {e}")
+                progress.failed += 1
+            else:
+                progress.sent += 1
+            finally:
+                queue.task_done()
+
+    async def _run(self, broadcast: Broadcast) -> None:
+        text = render_template(broadcast.template, broadcast.params)
+        progress = BroadcastProgress(
+            total=broadcast.total, sent=broadcast.sent, failed=broadcast.failed
+        )
+        queue: asyncio.Queue[int] = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue, text, progress))
+            for _ in range(self.workers)
+        ]
+
+        last_user_id, reported_at = broadcast.last_user_id, time.monotonic()
+        try:
+            while page := await self._fetch_page(last_user_id):
+                for _, chat_id in page:
+                    await queue.put(chat_id)
+                await queue.join()
+
+                last_user_id = page[-1][0]
+                await self._save_checkpoint(broadcast, last_user_id, progress)
+                if time.monotonic() - reported_at >= self.report_interval:
+                    await self._report(broadcast, progress)
+                    reported_at = time.monotonic()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        await self._finish(broadcast)
+        progress.finished = True
+        await self._report(broadcast, progress)
+        log.info(
+            f"[CARRY] Broadcast {broadcast.id} is finished: "
+            f"{progress.sent} sent, {progress.failed} failed"
+        )
+
+
+broadcast_runner = BroadcastRunner(
+    workers=settings.broadcast.workers,
+    page_size=settings.broadcast.page_size,
+    report_interval=settings.broadcast.report_interval,
+)
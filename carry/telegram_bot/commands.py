@@ -1,10 +1,16 @@
-import asyncio
 import logging
+import tempfile
 from enum import IntEnum, StrEnum
-from typing import TYPE_CHECKING, Final
+from typing import TYPE_CHECKING, Final, BinaryIO
+from warnings import filterwarnings
+from functools import lru_cache
+from itertools import islice
+from collections import defaultdict
 
+from asyncpg import PostgresError
 from telegram import (
     Update,
+    Message,
     KeyboardButton,
     ReplyKeyboardMarkup,
     InlineKeyboardButton,
@@ -15,18 +21,41 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     ConversationHandler,
+    CallbackQueryHandler,
     filters,
 )
-from telegram.helpers import create_deep_linked_url
+from sqlalchemy.exc import DBAPIError
+from telegram.error import BadRequest
+from telegram.helpers import escape_markdown
+from telegram.warnings import PTBUserWarning
 from telegram.constants import ParseMode
+from telegram_bot_pagination import InlineKeyboardPaginator
 
-from carry.config import settings
+from carry.config import (
+    LinksSnapshot,
+    SettingsSnapshot,
+    settings,
+    settings_store,
+)
 from carry.context import ctx
-from carry.core.bl import is_admin, create_qr_code
-from carry.core.entities import User
+from carry.core.bl import is_admin, copy_format
+from carry.core.qr import QRCodeRendererBusyError, qr_code_cache
+from carry.core.bulk import (
+    BonusRow,
+    BonusFileError,
+    BonusRowStatus,
+    write_report,
+    copy_users_in,
+    copy_users_out,
+    read_bonus_rows,
+)
+from carry.core.search import NgramIndex, user_search_index
+from carry.core.entities import User, Broadcast
 from carry.core.templates import render_template
 from carry.core.repositories import NegativeBonusesError
+from carry.telegram_bot.outbox import balance_message, outbox_dispatcher
 from carry.telegram_bot.logging import log_handler
+from carry.telegram_bot.broadcast import broadcast_runner
 
 if TYPE_CHECKING:
     from telegram.ext import BaseHandler
@@ -53,11 +82,13 @@ class AdminConversationChoices(IntEnum):
     FIND_USER = 5
     INCREASE_USER_BALANCE = 6
     DECREASE_USER_BALANCE = 7
+    PICK_USER = 8
 
 
 class AdminConversationText(StrEnum):
     CANCEL_COMMAND = "Зупинити команду ❌"
     FIND_USER = "Знайти користувача 🔍"
+    SHOW_USERS = "Клієнти 📋"
     INCREASE_USER_BALANCE = "Додати бонуси ⬆️"
     DECREASE_USER_BALANCE = "Зняти бонуси ⬇️"
 
@@ -78,6 +109,9 @@ ADMIN_KEYBOARD = ReplyKeyboardMarkup(
             KeyboardButton(
                 AdminConversationText.FIND_USER,
             ),
+            KeyboardButton(
+                AdminConversationText.SHOW_USERS,
+            ),
         ],
     ],
     resize_keyboard=True,
@@ -112,20 +146,30 @@ CANCEL_COMMAND_KEYBOARD = ReplyKeyboardMarkup(
     resize_keyboard=True,
 )
 
-LINKS_KEYBOARD = InlineKeyboardMarkup(
-    [
+admin_filter = filters.User(settings_store.snapshot.admin_ids)
+
+
+@lru_cache(maxsize=1)
+def _create_links_keyboard(links: LinksSnapshot) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
         [
-            InlineKeyboardButton(
-                "Instagram 📷",
-                url=settings.usefull_links.instagram,
-            ),
-            InlineKeyboardButton(
-                "Записатися 💅",
-                url=settings.usefull_links.easyweek,
-            ),
+            [
+                InlineKeyboardButton("Instagram 📷", url=links.instagram),
+                InlineKeyboardButton("Записатися 💅", url=links.easyweek),
+            ],
         ],
-    ],
-)
+    )
+
+
+def _links_keyboard() -> InlineKeyboardMarkup:
+    return _create_links_keyboard(settings_store.snapshot.links)
+
+
+def _on_settings_reload(snapshot: SettingsSnapshot) -> None:
+    admin_filter.user_ids = snapshot.admin_ids
+
+
+settings_store.subscribe(_on_settings_reload)
 
 
 def _choose_keyboard(user_id: int) -> ReplyKeyboardMarkup:
@@ -156,7 +200,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     await update.message.reply_text(
         "*Корисні посилання* 📎",
-        reply_markup=LINKS_KEYBOARD,
+        reply_markup=_links_keyboard(),
         parse_mode=ParseMode.MARKDOWN,
         reply_to_message_id=first_message.id,
     )
@@ -167,7 +211,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def help_(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text(
         render_template("telegram/help.jinja2"),
-        reply_markup=LINKS_KEYBOARD,
+        reply_markup=_links_keyboard(),
     )
     return UserConversationChoices.AFTER_START
 
@@ -184,7 +228,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 @log_handler
-@ctx.with_request_context
+@ctx.with_request_context(read_only=True)
 async def show_balance(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
@@ -199,16 +243,51 @@ async def show_balance(
     return UserConversationChoices.AFTER_START
 
 
+@ctx.with_request_context(read_only=True)
+async def _fetch_qr_file_id(user_id: int, bot_username: str) -> str | None:
+    return await ctx.qr_code_repository.fetch_file_id(user_id, bot_username)
+
+
+@ctx.with_request_context
+async def _save_qr_file_id(
+    user_id: int, bot_username: str, file_id: str
+) -> None:
+    await ctx.qr_code_repository.save_file_id(user_id, bot_username, file_id)
+
+
 @log_handler
 async def generate_qr_code(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
-    url = create_deep_linked_url(
-        context.bot.username, payload=str(update.message.from_user.id)
-    )
-    qr_code = create_qr_code(url)
-    await update.message.reply_photo(
-        qr_code, caption="Це QR-код, який Ви маєте показати @kerry_queen 🤝"
+    user_id = update.message.from_user.id
+    bot_username = context.bot.username
+    caption = "Це QR-код, який Ви маєте показати @kerry_queen 🤝"
+
+    file_id = await _fetch_qr_file_id(user_id, bot_username)
+    if file_id:
+        try:
+            await update.message.reply_photo(file_id, caption=caption)
+        except BadRequest:
+            log.warning(f"[CARRY] Cached QR-code file is rejected: {file_id}")
+        else:
+            qr_code_cache.record_file_id_hit()
+            return UserConversationChoices.AFTER_START
+
+    try:
+        qr_code = await qr_code_cache.get_image(
+            bot_username, payload=str(user_id)
+        )
+    except QRCodeRendererBusyError:
+        await update.message.reply_text(
+            "Забагато запитів, спробуйте трохи пізніше 🙏",
+            reply_to_message_id=update.message.id,
+        )
+        return UserConversationChoices.AFTER_START
+
+    message = await update.message.reply_photo(qr_code, caption=caption)
+    await _save_qr_file_id(user_id, bot_username, message.photo[-1].file_id)
+    log.info(
+        f"[CARRY] QR-code cache hit rate: {qr_code_cache.stats.hit_rate:.2%}"
     )
     return UserConversationChoices.AFTER_START
 
@@ -218,51 +297,241 @@ async def ask_user_nickname(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     await update.message.reply_text(
-        f"Напишіть нікнейм користувача ✍️",
+        f"Напишіть нікнейм або ім'я користувача ✍️",
         reply_markup=CANCEL_COMMAND_KEYBOARD,
     )
     return AdminConversationChoices.ASK_USER_NICKNAME
 
 
+async def _load_search_index(index: NgramIndex) -> None:
+    after_user_id = 0
+    while documents := await ctx.user_repository.fetch_search_documents(
+        after_user_id, settings.search.warm_up_batch
+    ):
+        index.load(documents)
+        after_user_id = documents[-1][0]
+    index.ready = True
+    log.info(f"[CARRY] User search index is loaded with {len(index)} users")
+
+
+@ctx.with_request_context(read_only=True)
+async def warm_up_search_index() -> None:
+    if user_search_index is not None:
+        await _load_search_index(user_search_index)
+
+
+@ctx.with_request_context(read_only=True)
+async def _search_users(query: str) -> list[User]:
+    limit = settings.search.max_results
+    if user_search_index is None:
+        return await ctx.user_repository.search_users(query, limit)
+
+    if not user_search_index.ready:
+        await _load_search_index(user_search_index)
+    ids = user_search_index.search(query, limit)
+    return await ctx.user_repository.fetch_users_by_ids(ids)
+
+
+def _create_search_keyboard(
+    users: list[User], page: int
+) -> InlineKeyboardMarkup:
+    page_size = settings.search.page_size
+    paginator = InlineKeyboardPaginator(
+        page_count=max(1, -(-len(users) // page_size)),
+        current_page=page,
+        data_pattern="search#{page}",
+    )
+    start = (paginator.current_page - 1) * page_size
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"{user.shor_info} · {user.bonuses} 💰",
+                callback_data=f"pick#{user.id}",
+            )
+        ]
+        for user in users[start : start + page_size]
+    ]
+    if paginator.keyboard:
+        keyboard.append(
+            [
+                InlineKeyboardButton(
+                    button["text"], callback_data=button["callback_data"]
+                )
+                for button in paginator.keyboard
+            ]
+        )
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def _select_user(
+    message: Message, context: ContextTypes.DEFAULT_TYPE, user: User
+) -> int:
+    context.user_data.pop("search", None)
+    context.user_data["user_id"] = user.id
+    await message.reply_text(
+        f"У користувача *{user.shor_info}* на рахунку *{user.bonuses}* бонусів ☺️",
+        reply_markup=BALANCE_OPERATIONS_KEYBOARD,
+        parse_mode=ParseMode.MARKDOWN,
+    )
+    return AdminConversationChoices.FIND_USER
+
+
 @log_handler
-@ctx.with_request_context
 async def find_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    username = update.message.text
-    user = await ctx.user_repository.fetch_user_by_username(username)
+    query = update.message.text.strip().removeprefix("@")
+    users = await _search_users(query)
 
-    if not user:
+    if not users:
         await update.message.reply_text(
-            f"Користувача з нікнеймом *{username}* не знайдено! 😖",
+            f"Користувача *{escape_markdown(query)}* не знайдено! 😖",
             reply_markup=_choose_keyboard(update.message.from_user.id),
             parse_mode=ParseMode.MARKDOWN,
         )
         return AdminConversationChoices.AFTER_START
 
-    context.user_data["user_id"] = user.id
+    if len(users) == 1:
+        return await _select_user(update.message, context, users[0])
+
+    context.user_data["search"] = query
     await update.message.reply_text(
-        f"У користувача *{user.shor_info}* на рахунку *{user.bonuses}* бонусів ☺️",
-        reply_markup=BALANCE_OPERATIONS_KEYBOARD,
-        parse_mode=ParseMode.MARKDOWN,
+        f"Знайдено користувачів: {len(users)}. Оберіть потрібного 👇",
+        reply_markup=_create_search_keyboard(users, page=1),
     )
-    return AdminConversationChoices.FIND_USER
+    return AdminConversationChoices.PICK_USER
 
 
 @log_handler
-@ctx.with_request_context
+async def show_search_page(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    callback_query = update.callback_query
+    await callback_query.answer()
+
+    page = int(callback_query.data.removeprefix("search#"))
+    users = await _search_users(context.user_data.get("search", ""))
+    try:
+        await callback_query.edit_message_reply_markup(
+            _create_search_keyboard(users, page)
+        )
+    except BadRequest:
+        pass
+    return AdminConversationChoices.PICK_USER
+
+
+@log_handler
+@ctx.with_request_context(read_only=True)
+async def pick_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    callback_query = update.callback_query
+    await callback_query.answer()
+
+    user_id = int(callback_query.data.removeprefix("pick#"))
+    user = await ctx.user_repository.fetch_user_by_id(user_id)
+    await callback_query.edit_message_reply_markup(None)
+    return await _select_user(callback_query.message, context, user)
+
+
+@log_handler
+@ctx.with_request_context(read_only=True)
 async def deep_link_start(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     user_id = int(context.args[0])
 
     user = await ctx.user_repository.fetch_user_by_id(user_id)
-    context.user_data["user_id"] = user_id
+    return await _select_user(update.message, context, user)
 
-    await update.message.reply_text(
-        f"У користувача *{user.shor_info}* на рахунку *{user.bonuses}* бонусів ☺️",
-        reply_markup=BALANCE_OPERATIONS_KEYBOARD,
-        parse_mode=ParseMode.MARKDOWN,
+
+@ctx.with_request_context(read_only=True)
+async def _fetch_users_page(
+    after: tuple[int, int] | None, with_total: bool
+) -> tuple[list[tuple[User, tuple[int, int]]], int | None]:
+    rows = await ctx.user_repository.fetch_users_page(
+        after, settings.users_list.page_size + 1
     )
-    return AdminConversationChoices.FIND_USER
+    total = None
+    if with_total:
+        total = await ctx.user_repository.estimate_users_count()
+    return rows, total
+
+
+async def _render_users_page(
+    context: ContextTypes.DEFAULT_TYPE, page: int
+) -> tuple[str, InlineKeyboardMarkup]:
+    page_size = settings.users_list.page_size
+    cursors = context.user_data.setdefault("users_cursors", [None])
+    if page > len(cursors):
+        page = len(cursors)
+
+    rows, total = await _fetch_users_page(
+        cursors[page - 1], with_total=page == 1
+    )
+    if total is not None:
+        context.user_data["users_total"] = total
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    del cursors[page:]
+    if has_next:
+        cursors.append(rows[-1][1])
+    users = [user for user, _ in rows]
+
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                f"{user.shor_info} · {user.bonuses} 💰",
+                callback_data=f"pick#{user.id}",
+            )
+        ]
+        for user in users
+    ]
+    navigation = []
+    if page > 2:
+        navigation.append(InlineKeyboardButton("« 1", callback_data="users#1"))
+    if page > 1:
+        navigation.append(
+            InlineKeyboardButton(
+                f"‹ {page - 1}", callback_data=f"users#{page - 1}"
+            )
+        )
+    if has_next:
+        navigation.append(
+            InlineKeyboardButton(
+                f"{page + 1} ›", callback_data=f"users#{page + 1}"
+            )
+        )
+    if navigation:
+        keyboard.append(navigation)
+
+    total = context.user_data.get("users_total", 0)
+    pages = max(1, -(-total // page_size))
+    text = f"Клієнти: сторінка {page} з ~{pages} (~{total}) 📋"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+@log_handler
+async def show_users(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    context.user_data["users_cursors"] = [None]
+    text, keyboard = await _render_users_page(context, page=1)
+    await update.message.reply_text(text, reply_markup=keyboard)
+    return AdminConversationChoices.SHOW_USERS
+
+
+@log_handler
+async def show_users_page(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    callback_query = update.callback_query
+    await callback_query.answer()
+
+    page = int(callback_query.data.removeprefix("users#"))
+    text, keyboard = await _render_users_page(context, page)
+    try:
+        await callback_query.edit_message_text(text, reply_markup=keyboard)
+    except BadRequest:
+        pass
+    return AdminConversationChoices.SHOW_USERS
 
 
 @log_handler
@@ -287,53 +556,60 @@ async def before_decrease_user_balance(
     return AdminConversationChoices.DECREASE_USER_BALANCE
 
 
-@log_handler
 @ctx.with_request_context
+async def _change_user_balance(
+    user_id: int, bonuses: int, increase: bool
+) -> User:
+    if increase:
+        user = await ctx.user_repository.increase_user_balance(
+            user_id=user_id,
+            bonuses=bonuses,
+        )
+        template = "telegram/increase_bonuses/user.jinja2"
+    else:
+        user = await ctx.user_repository.decrease_user_balance(
+            user_id=user_id,
+            bonuses=bonuses,
+        )
+        template = "telegram/decrease_bonuses/user.jinja2"
+
+    delta = bonuses if increase else -bonuses
+    await ctx.outbox_repository.add_messages(
+        [balance_message(user, delta, template)],
+        delay=outbox_dispatcher.coalesce_window,
+    )
+    return user
+
+
+@log_handler
 async def increase_user_balance(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     user_id = context.user_data["user_id"]
     bonuses = int(update.message.text)
-    bot = update.get_bot()
 
-    user = await ctx.user_repository.increase_user_balance(
-        user_id=user_id,
-        bonuses=bonuses,
-    )
+    user = await _change_user_balance(user_id, bonuses, increase=True)
+    outbox_dispatcher.notify()
     context.user_data.clear()
 
     params = _create_params(user, bonuses)
-    await asyncio.gather(
-        update.message.reply_text(
-            render_template("telegram/increase_bonuses/admin.jinja2", params),
-            reply_markup=ADMIN_KEYBOARD,
-            parse_mode=ParseMode.HTML,
-        ),
-        bot.send_message(
-            chat_id=user.chat_id,
-            text=render_template(
-                "telegram/increase_bonuses/user.jinja2", params
-            ),
-            parse_mode=ParseMode.HTML,
-        ),
+    await update.message.reply_text(
+        render_template("telegram/increase_bonuses/admin.jinja2", params),
+        reply_markup=ADMIN_KEYBOARD,
+        parse_mode=ParseMode.HTML,
     )
     return AdminConversationChoices.AFTER_START
 
 
 @log_handler
-@ctx.with_request_context
 async def decrease_user_balance(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> int:
     user_id = context.user_data["user_id"]
     bonuses = int(update.message.text)
-    bot = update.get_bot()
 
     try:
-        user = await ctx.user_repository.decrease_user_balance(
-            user_id=user_id,
-            bonuses=bonuses,
-        )
+        user = await _change_user_balance(user_id, bonuses, increase=False)
     except NegativeBonusesError:
         await update.message.reply_text(
             text="Не можна зняти більше бонусів, ніж є у користувача 🤬",
@@ -341,37 +617,235 @@ async def decrease_user_balance(
             reply_to_message_id=update.message.id,
         )
     else:
+        outbox_dispatcher.notify()
         params = _create_params(user, bonuses)
-        await asyncio.gather(
-            update.message.reply_text(
-                render_template(
-                    "telegram/decrease_bonuses/admin.jinja2", params
-                ),
-                reply_markup=ADMIN_KEYBOARD,
-                parse_mode=ParseMode.HTML,
-            ),
-            bot.send_message(
-                chat_id=user.chat_id,
-                text=render_template(
-                    "telegram/decrease_bonuses/user.jinja2", params
-                ),
-                parse_mode=ParseMode.HTML,
-            ),
+        await update.message.reply_text(
+            render_template("telegram/decrease_bonuses/admin.jinja2", params),
+            reply_markup=ADMIN_KEYBOARD,
+            parse_mode=ParseMode.HTML,
         )
 
     context.user_data.clear()
     return AdminConversationChoices.AFTER_START
 
 
+@ctx.with_request_context
+async def _create_broadcast(
+    admin_chat_id: int, progress_message_id: int, text: str
+) -> Broadcast:
+    total = await ctx.user_repository.count_users()
+    return await ctx.broadcast_repository.create_broadcast(
+        admin_chat_id=admin_chat_id,
+        progress_message_id=progress_message_id,
+        template="telegram/broadcast.jinja2",
+        params={"text": text},
+        total=total,
+    )
+
+
+@log_handler
+async def broadcast(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    _, *text = update.message.text.split(maxsplit=1)
+    if not text:
+        await update.message.reply_text(
+            "Напишіть текст розсилки після команди: /broadcast <текст> ✍️",
+            reply_to_message_id=update.message.id,
+        )
+        return
+
+    progress_message = await update.message.reply_text(
+        "Розсилка готується ⏳",
+        reply_to_message_id=update.message.id,
+    )
+    broadcast_ = await _create_broadcast(
+        admin_chat_id=update.message.chat_id,
+        progress_message_id=progress_message.id,
+        text=text[0],
+    )
+    broadcast_runner.launch(broadcast_)
+
+
+async def _apply_bonus_rows(rows: list[BonusRow]) -> None:
+    valid = [row for row in rows if row.status is None]
+    found = await ctx.user_repository.resolve_users(
+        ids={row.user_id for row in valid if row.user_id is not None},
+        usernames={row.username for row in valid if row.username},
+    )
+    ids = {user_id for user_id, _ in found}
+    usernames = {username: user_id for user_id, username in found}
+
+    deltas = defaultdict(int)
+    for row in valid:
+        if row.user_id is None:
+            row.user_id = usernames.get(row.username)
+        if row.user_id not in ids:
+            row.reject(BonusRowStatus.NOT_FOUND, "user is not registered")
+            continue
+        deltas[row.user_id] += row.delta
+
+    users = {
+        user.id: user
+        for user in await ctx.user_repository.add_bonuses_bulk(deltas)
+    }
+    messages = []
+    for row in valid:
+        if row.status is not None:
+            continue
+        user = users.get(row.user_id)
+        if user is None:
+            row.reject(
+                BonusRowStatus.INSUFFICIENT,
+                "total delta makes balance negative",
+            )
+            continue
+        row.status, row.bonuses = BonusRowStatus.APPLIED, user.bonuses
+
+    for user_id, user in users.items():
+        delta = deltas[user_id]
+        if delta > 0:
+            template = "telegram/increase_bonuses/user.jinja2"
+        elif delta < 0:
+            template = "telegram/decrease_bonuses/user.jinja2"
+        else:
+            continue
+        messages.append(balance_message(user, delta, template))
+    await ctx.outbox_repository.add_messages(
+        messages, delay=outbox_dispatcher.coalesce_window
+    )
+
+
+@ctx.with_request_context
+async def _apply_bonus_file(
+    source: BinaryIO, report: BinaryIO
+) -> tuple[int, int]:
+    rows = read_bonus_rows(source, settings.bulk.max_rows)
+    write_report(report, (), header=True)
+    applied = total = 0
+    while chunk := list(islice(rows, settings.bulk.chunk_size)):
+        await _apply_bonus_rows(chunk)
+        write_report(report, chunk)
+        applied += sum(row.status == BonusRowStatus.APPLIED for row in chunk)
+        total += len(chunk)
+    return applied, total
+
+
+@log_handler
+async def bulk_change_bonuses(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    document = update.message.document
+    if document.file_size and document.file_size > settings.bulk.max_file_size:
+        await update.message.reply_text(
+            "Файл завеликий 🤯",
+            reply_to_message_id=update.message.id,
+        )
+        return
+
+    file = await document.get_file()
+    spool_size = settings.transfer.spool_size
+    with (
+        tempfile.SpooledTemporaryFile(spool_size) as source,
+        tempfile.SpooledTemporaryFile(spool_size) as report,
+    ):
+        await file.download_to_memory(source)
+        source.seek(0)
+        try:
+            applied, total = await _apply_bonus_file(source, report)
+        except (UnicodeDecodeError, BonusFileError) as e:
+            await update.message.reply_text(
+                f"Не вдалося прочитати файл: {e} 🤬",
+                reply_to_message_id=update.message.id,
+            )
+            return
+
+        outbox_dispatcher.notify()
+        report.seek(0)
+        await update.message.reply_document(
+            document=report,
+            filename="bulk_bonuses_report.csv",
+            caption=f"Застосовано {applied} з {total} рядків ✅",
+            reply_to_message_id=update.message.id,
+        )
+
+
+@log_handler
+async def export_users(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    format = "binary" if context.args == ["binary"] else "csv"
+    extension = "bin" if format == "binary" else "csv"
+    with tempfile.SpooledTemporaryFile(settings.transfer.spool_size) as f:
+        rows = await copy_users_out(f, format)
+        f.seek(0)
+        await update.message.reply_document(
+            document=f,
+            filename=f"users.{extension}",
+            caption=f"Експортовано {rows} користувачів 📦",
+            reply_to_message_id=update.message.id,
+        )
+
+
+def _database_error(error: Exception) -> str:
+    if isinstance(error, DBAPIError):
+        error = error.orig.__cause__ or error.orig
+    return str(error).strip()
+
+
+@log_handler
+async def import_users(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    document = update.message.document
+    file = await document.get_file()
+    with tempfile.NamedTemporaryFile() as f:
+        await file.download_to_drive(f.name)
+        try:
+            rows = await copy_users_in(f, copy_format(document.file_name))
+        except (DBAPIError, PostgresError) as e:
+            await update.message.reply_text(
+                f"Не вдалося імпортувати файл: {_database_error(e)} 🤬",
+                reply_to_message_id=update.message.id,
+            )
+            return
+
+    await update.message.reply_text(
+        f"Імпортовано {rows} користувачів ✅",
+        reply_to_message_id=update.message.id,
+    )
+
+
+# Search pick lists belong to the admin conversation, not to a message.
+filterwarnings(
+    "ignore", message="If 'per_message=False'", category=PTBUserWarning
+)
+
 COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
     CommandHandler("help", help_),
+    CommandHandler("broadcast", broadcast, admin_filter),
+    MessageHandler(
+        admin_filter
+        & filters.Document.FileExtension("csv")
+        & filters.CaptionRegex(r"^/bulk_bonuses"),
+        bulk_change_bonuses,
+    ),
+    CommandHandler("export_users", export_users, admin_filter),
+    MessageHandler(
+        admin_filter
+        & (
+            filters.Document.FileExtension("csv")
+            | filters.Document.FileExtension("bin")
+        )
+        & filters.CaptionRegex(r"^/import_users"),
+        import_users,
+    ),
     ConversationHandler(
         entry_points=[
             CommandHandler(
                 "start",
                 deep_link_start,
-                filters.User(settings.admin_ids)
-                and filters.Regex(r"^/start \d+$"),
+                admin_filter & filters.Regex(r"^/start \d+$"),
             ),
             CommandHandler("start", start),
         ],
@@ -386,15 +860,34 @@ COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
                     generate_qr_code,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Text([AdminConversationText.FIND_USER]),
+                    admin_filter
+                    & filters.Text([AdminConversationText.FIND_USER]),
                     ask_user_nickname,
                 ),
+                MessageHandler(
+                    admin_filter
+                    & filters.Text([AdminConversationText.SHOW_USERS]),
+                    show_users,
+                ),
                 CommandHandler(
                     "start",
                     deep_link_start,
-                    filters.User(settings.admin_ids)
-                    and filters.Regex(r"^/start \d+$"),
+                    admin_filter & filters.Regex(r"^/start \d+$"),
+                ),
+                CommandHandler("start", start),
+            ],
+            AdminConversationChoices.SHOW_USERS: [
+                CallbackQueryHandler(show_users_page, pattern=r"^users#\d+$"),
+                CallbackQueryHandler(pick_user, pattern=r"^pick#\d+$"),
+                MessageHandler(
+                    admin_filter
+                    & filters.Text([AdminConversationText.FIND_USER]),
+                    ask_user_nickname,
+                ),
+                MessageHandler(
+                    admin_filter
+                    & filters.Text([AdminConversationText.SHOW_USERS]),
+                    show_users,
                 ),
                 CommandHandler("start", start),
             ],
@@ -404,10 +897,21 @@ COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
                     cancel,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Regex(
-                        r"^[A-Za-z0-9]+([A-Za-z0-9]*|[._-]?[A-Za-z0-9]+)*$"
-                    ),
+                    admin_filter & filters.TEXT & ~filters.COMMAND,
+                    find_user,
+                ),
+            ],
+            AdminConversationChoices.PICK_USER: [
+                MessageHandler(
+                    filters.Text([AdminConversationText.CANCEL_COMMAND]),
+                    cancel,
+                ),
+                CallbackQueryHandler(
+                    show_search_page, pattern=r"^search#\d+$"
+                ),
+                CallbackQueryHandler(pick_user, pattern=r"^pick#\d+$"),
+                MessageHandler(
+                    admin_filter & filters.TEXT & ~filters.COMMAND,
                     find_user,
                 ),
             ],
@@ -417,15 +921,15 @@ COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
                     cancel,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Text(
+                    admin_filter
+                    & filters.Text(
                         [AdminConversationText.INCREASE_USER_BALANCE]
                     ),
                     before_increase_user_balance,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Text(
+                    admin_filter
+                    & filters.Text(
                         [AdminConversationText.DECREASE_USER_BALANCE]
                     ),
                     before_decrease_user_balance,
@@ -437,8 +941,7 @@ COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
                     cancel,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Regex(r"^\d+$"),
+                    admin_filter & filters.Regex(r"^\d+$"),
                     increase_user_balance,
                 ),
             ],
@@ -448,12 +951,13 @@ COMMAND_HANDLERS: Final[list["BaseHandler"]] = [
                     cancel,
                 ),
                 MessageHandler(
-                    filters.User(settings.admin_ids)
-                    and filters.Regex(r"^\d+$"),
+                    admin_filter & filters.Regex(r"^\d+$"),
                     decrease_user_balance,
                 ),
             ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="carry",
+        persistent=True,
     ),
 ]
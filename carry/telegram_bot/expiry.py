@@ -0,0 +1,170 @@
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from datetime import datetime, timezone, timedelta
+
+from carry.config import settings
+from carry.context import ctx
+from carry.core.entities import BonusExpiryRun
+from carry.telegram_bot.outbox import balance_message, outbox_dispatcher
+
+if TYPE_CHECKING:
+    from carry.telegram_bot.sharding import Shard
+
+log = logging.getLogger(__name__)
+
+RETRY_DELAY = 60.0
+
+
+class BonusExpiryJob:
+    def __init__(
+        self,
+        period_days: float = 365.0,
+        interval: float = 86400.0,
+        chunk_size: int = 200,
+        min_chunk_size: int = 20,
+        max_chunk_size: int = 2000,
+        target_latency: float = 0.05,
+    ):
+        self.period = timedelta(days=period_days)
+        self.interval = timedelta(seconds=interval)
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_latency = target_latency
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    async def start(self, shard: "Shard | None" = None) -> None:
+        if shard is not None and shard.index != 0:
+            return
+
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                delay = await self.run_due()
+            except Exception:
+                log.exception("[CARRY] Get exception during bonus expiry!")
+                delay = RETRY_DELAY
+
+            await self._sleep(delay)
+
+    async def _sleep(self, delay: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run_due(self) -> float:
+        run, finished = await self._fetch_latest()
+        now = datetime.now(timezone.utc)
+        if finished:
+            if run is not None and run.created_at + self.interval > now:
+                return (run.created_at + self.interval - now).total_seconds()
+            run = await self._create_run(now - self.period)
+            log.info(f"[CARRY] Expiring bonuses received before {run.cutoff}")
+
+        await self.expire(run)
+        return self.interval.total_seconds()
+
+    async def expire(self, run: BonusExpiryRun) -> None:
+        last_user_id, expired_users, expired_bonuses = run.last_user_id, 0, 0
+        while True:
+            if self._stopping.is_set():
+                return
+
+            started = time.perf_counter()
+            last_user_id, users, bonuses = await self._expire_chunk(
+                run, last_user_id
+            )
+            elapsed = time.perf_counter() - started
+            if last_user_id is None:
+                break
+
+            expired_users += users
+            expired_bonuses += bonuses
+            if users:
+                outbox_dispatcher.notify()
+            self._adapt(elapsed)
+            await self._sleep(elapsed)
+
+        await self._finish(run)
+        log.info(
+            f"[CARRY] Bonus expiry {run.id} is finished: {expired_bonuses} "
+            f"bonuses of {expired_users} users expired"
+        )
+
+    def _adapt(self, elapsed: float) -> None:
+        if elapsed > self.target_latency:
+            self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+        elif elapsed < self.target_latency / 2:
+            self.chunk_size = min(
+                self.max_chunk_size, self.chunk_size + self.min_chunk_size
+            )
+
+    @ctx.with_request_context(read_only=True, use_replicas=False)
+    async def _fetch_latest(self) -> tuple[BonusExpiryRun | None, bool]:
+        return await ctx.expiry_repository.fetch_latest()
+
+    @ctx.with_request_context
+    async def _create_run(self, cutoff: datetime) -> BonusExpiryRun:
+        return await ctx.expiry_repository.create_run(cutoff)
+
+    @ctx.with_request_context
+    async def _finish(self, run: BonusExpiryRun) -> None:
+        await ctx.expiry_repository.finish(run.id)
+
+    @ctx.with_request_context
+    async def _expire_chunk(
+        self, run: BonusExpiryRun, after_user_id: int
+    ) -> tuple[int | None, int, int]:
+        chunk = await ctx.user_repository.fetch_expiry_chunk(
+            after_user_id, self.chunk_size, run.cutoff
+        )
+        if not chunk:
+            return None, 0, 0
+
+        expiring = [user_id for user_id, expires in chunk if expires]
+        expired = []
+        if expiring:
+            expired = await ctx.user_repository.expire_bonuses(
+                expiring, run.cutoff
+            )
+        await ctx.outbox_repository.add_messages(
+            [
+                balance_message(
+                    user, -bonuses, "telegram/expire_bonuses/user.jinja2"
+                )
+                for user, bonuses in expired
+            ],
+            delay=outbox_dispatcher.coalesce_window,
+        )
+
+        last_user_id = chunk[-1][0]
+        expired_bonuses = sum(bonuses for _, bonuses in expired)
+        await ctx.expiry_repository.save_checkpoint(
+            run.id, last_user_id, len(expired), expired_bonuses
+        )
+        return last_user_id, len(expired), expired_bonuses
+
+
+bonus_expiry_job = BonusExpiryJob(
+    period_days=settings.expiry.period_days,
+    interval=settings.expiry.interval,
+    chunk_size=settings.expiry.chunk_size,
+    min_chunk_size=settings.expiry.min_chunk_size,
+    max_chunk_size=settings.expiry.max_chunk_size,
+    target_latency=settings.expiry.target_latency,
+)
@@ -1,15 +1,129 @@
+import signal
+import asyncio
 from typing import TYPE_CHECKING
+from functools import partial
 
 from telegram.ext import ApplicationBuilder
 
-from carry.config import settings
-from carry.telegram_bot.commands import COMMAND_HANDLERS
+from carry.config import settings, settings_store
+from carry.core.qr import qr_code_renderer
+from carry.db.core import replica_router
+from carry.core.cache import user_cache_listener
+from carry.core.search import user_search_index
+from carry.core.metrics import metrics_server
+from carry.core.templates import template_engine
+from carry.telegram_bot.expiry import bonus_expiry_job
+from carry.telegram_bot.ledger import ledger_compactor
+from carry.telegram_bot.outbox import outbox_dispatcher
+from carry.telegram_bot.startup import startup_timer
+from carry.telegram_bot.commands import COMMAND_HANDLERS, warm_up_search_index
+from carry.telegram_bot.broadcast import broadcast_runner
+from carry.telegram_bot.application import ChatOrderedApplication
+from carry.telegram_bot.persistence import create_persistence
+from carry.telegram_bot.rate_limiter import PriorityRateLimiter
 
 if TYPE_CHECKING:
     from telegram.ext import Application
 
+    from carry.telegram_bot.sharding import Shard
 
-def create_bot() -> "Application":
-    bot = ApplicationBuilder().token(settings.telegram.token).build()
+
+async def _post_init(
+    application: "Application", shard: "Shard | None" = None
+) -> None:
+    startup_timer.mark("initialize")
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGHUP, settings_store.reload)
+    template_engine.preload()
+    startup_timer.mark("templates")
+    if replica_router:
+        await replica_router.start()
+        startup_timer.mark("replicas")
+    if user_search_index is not None:
+        await warm_up_search_index()
+        startup_timer.mark("search_index")
+    if settings.metrics.enabled:
+        await metrics_server.start(0 if shard is None else shard.index + 1)
+    if user_cache_listener is not None:
+        await user_cache_listener.start()
+        startup_timer.mark("cache_listener")
+    await outbox_dispatcher.start(application)
+    await broadcast_runner.start(application, shard)
+    await ledger_compactor.start(shard)
+    if settings.expiry.enabled:
+        await bonus_expiry_job.start(shard)
+    startup_timer.mark("background_tasks")
+    startup_timer.ready()
+
+
+async def _post_stop(application: "Application") -> None:
+    asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    await bonus_expiry_job.stop()
+    await ledger_compactor.stop()
+    await broadcast_runner.stop()
+    await outbox_dispatcher.stop()
+    if user_cache_listener is not None:
+        await user_cache_listener.stop()
+    await replica_router.stop()
+    await metrics_server.stop()
+
+
+async def _post_shutdown(application: "Application") -> None:
+    qr_code_renderer.shutdown()
+
+
+def _create_builder() -> ApplicationBuilder:
+    builder = ApplicationBuilder().token(settings.telegram.token)
+    if settings.bot.base_url:
+        builder = (
+            builder.base_url(settings.bot.base_url)
+            .base_file_url(settings.bot.base_file_url)
+            .http_version("1.1")
+            .get_updates_http_version("1.1")
+        )
+    return builder
+
+
+def create_receiver() -> "Application":
+    return _create_builder().build()
+
+
+def create_bot(shard: "Shard | None" = None) -> "Application":
+    builder = (
+        _create_builder()
+        .application_class(ChatOrderedApplication)
+        .concurrent_updates(settings.bot.concurrent_updates)
+        .persistence(create_persistence())
+        .rate_limiter(
+            PriorityRateLimiter(
+                global_rate=settings.rate_limiter.global_rate,
+                chat_rate=settings.rate_limiter.chat_rate,
+                chat_burst=settings.rate_limiter.chat_burst,
+                group_rate=settings.rate_limiter.group_rate,
+                max_retries=settings.rate_limiter.max_retries,
+            )
+        )
+        .post_init(partial(_post_init, shard=shard))
+        .post_stop(_post_stop)
+        .post_shutdown(_post_shutdown)
+    )
+    if shard is not None:
+        builder = builder.updater(None)
+
+    bot = builder.build()
     bot.add_handlers(COMMAND_HANDLERS)
     return bot
+
+
+def run_bot(bot: "Application") -> None:
+    if settings.bot.mode == "webhook":
+        webhook = settings.bot.webhook
+        bot.run_webhook(
+            listen=webhook.listen,
+            port=webhook.port,
+            url_path=webhook.url_path,
+            webhook_url=webhook.url,
+            secret_token=webhook.secret_token or None,
+        )
+    else:
+        bot.run_polling()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from datetime import date, datetime, timedelta
+
+from carry.config import settings
+from carry.context import ctx
+
+if TYPE_CHECKING:
+    from carry.telegram_bot.sharding import Shard
+
+log = logging.getLogger(__name__)
+
+
+class LedgerCompactor:
+    def __init__(
+        self,
+        interval: float = 60.0,
+        batch_size: int = 1000,
+        partitions_ahead: int = 1,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.partitions_ahead = partitions_ahead
+        self._after_txid = 0
+        self._opened = False
+        self._partitions: set[date] = set()
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    async def start(self, shard: "Shard | None" = None) -> None:
+        if shard is not None and shard.index != 0:
+            return
+
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.create_partitions()
+                await self.open_balances()
+                compacted = await self.compact()
+                if compacted:
+                    log.info(
+                        f"[CARRY] Rolled {compacted} bonus balances forward"
+                    )
+            except Exception:
+                log.exception(
+                    "[CARRY] Get exception during ledger compaction!"
+                )
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def create_partitions(self) -> None:
+        month = date.today().replace(day=1)
+        for _ in range(self.partitions_ahead + 1):
+            if month not in self._partitions:
+                try:
+                    moved = await self._create_partition(month)
+                except Exception:
+                    log.exception(
+                        f"[CARRY] Cannot create ledger partition for {month}"
+                    )
+                else:
+                    self._partitions.add(month)
+                    if moved:
+                        log.info(
+                            f"[CARRY] Moved {moved} ledger rows "
+                            f"into the {month:%Y-%m} partition"
+                        )
+            month = (month + timedelta(days=31)).replace(day=1)
+
+    @ctx.with_request_context
+    async def _create_partition(self, month: date) -> int:
+        return await ctx.ledger_repository.create_partition(month)
+
+    async def open_balances(self) -> None:
+        if self._opened:
+            return
+
+        opened = 0
+        while True:
+            count = await self._open_batch()
+            opened += count
+            if count < self.batch_size:
+                break
+
+        self._opened = True
+        if opened:
+            log.info(f"[CARRY] Opened the ledger for {opened} bonus balances")
+
+    @ctx.with_request_context
+    async def _open_batch(self) -> int:
+        return await ctx.ledger_repository.open_balances(self.batch_size)
+
+    async def compact(self) -> int:
+        horizon, after_user_id, compacted = None, 0, 0
+        while True:
+            bounds, user_ids, count = await self._compact_batch(after_user_id)
+            if horizon is None:
+                horizon = bounds[0]
+            compacted += count
+            if len(user_ids) < self.batch_size:
+                break
+            after_user_id = user_ids[-1]
+
+        self._after_txid = horizon
+        return compacted
+
+    @ctx.with_request_context
+    async def _compact_batch(
+        self, after_user_id: int
+    ) -> tuple[tuple[int, datetime], list[int], int]:
+        repository = ctx.ledger_repository
+        bounds = await repository.fetch_bounds()
+        user_ids = await repository.fetch_tail_user_ids(
+            self._after_txid, after_user_id, self.batch_size
+        )
+        if not user_ids:
+            return bounds, user_ids, 0
+        return bounds, user_ids, await repository.compact(user_ids, bounds[1])
+
+
+ledger_compactor = LedgerCompactor(
+    interval=settings.ledger.interval,
+    batch_size=settings.ledger.batch_size,
+    partitions_ahead=settings.ledger.partitions_ahead,
+)
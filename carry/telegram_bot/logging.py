@@ -1,25 +1,49 @@
+import time
 import logging
 from typing import TypeVar, Callable, Awaitable, ParamSpec
 from functools import wraps
 
+from carry.core.metrics import registry, slow_handler_profiler
+
 P = ParamSpec("P")
 RT = TypeVar("RT")
 Func = Callable[P, Awaitable[RT]]
 log = logging.getLogger(__name__)
 
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+handler_duration = registry.histogram(
+    "carry_handler_duration_seconds", "Telegram handler latency", ("handler",)
+)
+handler_errors = registry.counter(
+    "carry_handler_errors_total", "Failed Telegram handlers", ("handler",)
+)
+
+
+def setup_logging() -> None:
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+
 
 def log_handler(func: Func) -> Func:
     @wraps(func)
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> Awaitable[RT]:
         func_name = func.__name__
+        started = time.perf_counter()
         try:
-            result = await func(*args, **kwargs)
+            with slow_handler_profiler.profile(func_name):
+                result = await func(*args, **kwargs)
             log.info(f"[CARRY] Handler '{func_name}' processed message!")
             return result
         except Exception:
+            handler_errors.inc(handler=func_name)
             log.exception(
                 f"[CARRY] Get exception during '{func_name}' handler work!"
             )
             raise
+        finally:
+            handler_duration.observe(
+                time.perf_counter() - started, handler=func_name
+            )
 
     return wrapper
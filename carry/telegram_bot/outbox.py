@@ -0,0 +1,257 @@
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+from datetime import timedelta
+from dataclasses import replace
+
+from telegram.error import Forbidden, BadRequest, RetryAfter
+from telegram.constants import ParseMode
+
+from carry.config import settings
+from carry.context import ctx
+from carry.core.metrics import registry
+from carry.core.entities import User, OutboxMessage
+from carry.core.templates import render_template
+from carry.telegram_bot.rate_limiter import Priority
+
+if TYPE_CHECKING:
+    from telegram import Bot
+    from telegram.ext import Application
+
+log = logging.getLogger(__name__)
+
+BALANCE_KEY = "balance"
+PRUNE_BATCH_SIZE = 1000
+coalesced_messages = registry.counter(
+    "carry_outbox_coalesced_total",
+    "Outbox messages merged into another message instead of sent separately",
+    ("key",),
+)
+
+
+def balance_message(user: User, delta: int, template: str) -> dict:
+    return {
+        "chat_id": user.chat_id,
+        "template": template,
+        "params": {
+            "user_info": user.shor_info,
+            "bonuses": abs(delta),
+            "total_bonuses": user.bonuses,
+            "delta": delta,
+        },
+        "coalesce_key": BALANCE_KEY,
+    }
+
+
+def _merge_balance(messages: list[OutboxMessage]) -> tuple[str, dict]:
+    changes = [message.params["delta"] for message in messages]
+    return "telegram/balance_summary/user.jinja2", {
+        "changes": changes,
+        "delta": sum(changes),
+        "total_bonuses": messages[-1].params["total_bonuses"],
+    }
+
+
+MERGERS = {BALANCE_KEY: _merge_balance}
+
+
+def _group(messages: list[OutboxMessage]) -> list[list[OutboxMessage]]:
+    groups: dict[object, list[OutboxMessage]] = {}
+    for message in messages:
+        key = message.id
+        if message.coalesce_key in MERGERS:
+            key = (message.chat_id, message.coalesce_key)
+        groups.setdefault(key, []).append(message)
+    return list(groups.values())
+
+
+def _merge(group: list[OutboxMessage]) -> OutboxMessage:
+    message = group[-1]
+    if len(group) == 1:
+        return message
+
+    template, params = MERGERS[message.coalesce_key](group)
+    return replace(message, template=template, params=params)
+
+
+class OutboxDispatcher:
+    def __init__(
+        self,
+        batch_size: int = 50,
+        interval: float = 5.0,
+        max_attempts: int = 5,
+        retry_delay: float = 10.0,
+        lease: float = 60.0,
+        coalesce_window: float = 10.0,
+        retention: float = 604800.0,
+        prune_interval: float = 3600.0,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = timedelta(seconds=lease)
+        self.coalesce_window = timedelta(seconds=coalesce_window)
+        self.retention = timedelta(seconds=retention)
+        self.prune_interval = prune_interval
+        self._pruned_at = 0.0
+        self._bot: "Bot | None" = None
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def start(self, application: "Application") -> None:
+        self._bot = application.bot
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        try:
+            while await self.dispatch(flush=True) >= self.batch_size:
+                pass
+        except Exception:
+            log.exception("[CARRY] Cannot flush outbox on shutdown!")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                claimed = await self.dispatch()
+            except Exception:
+                log.exception("[CARRY] Get exception during outbox dispatch!")
+                claimed = 0
+
+            if claimed >= self.batch_size:
+                continue
+
+            if time.monotonic() - self._pruned_at >= self.prune_interval:
+                await self.prune()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def prune(self) -> None:
+        self._pruned_at = time.monotonic()
+        try:
+            while await self._delete_finished() >= PRUNE_BATCH_SIZE:
+                pass
+        except Exception:
+            log.exception("[CARRY] Cannot prune finished outbox messages!")
+
+    @ctx.with_request_context
+    async def _delete_finished(self) -> int:
+        return await ctx.outbox_repository.delete_finished(
+            self.retention, PRUNE_BATCH_SIZE
+        )
+
+    @ctx.with_request_context
+    async def _claim(self, flush: bool = False) -> list[OutboxMessage]:
+        exhausted = await ctx.outbox_repository.fail_exhausted(
+            self.max_attempts
+        )
+        if exhausted:
+            log.error(
+                f"[CARRY] Outbox messages {exhausted} are failed, their last "
+                f"attempt was never completed"
+            )
+        return await ctx.outbox_repository.claim_messages(
+            limit=self.batch_size,
+            lease=self.lease,
+            max_attempts=self.max_attempts,
+            flush=flush,
+        )
+
+    @ctx.with_request_context
+    async def _complete(
+        self,
+        sent: list[int],
+        failed: list[int],
+        retries: dict[int, timedelta],
+    ) -> None:
+        if sent:
+            await ctx.outbox_repository.mark_sent(sent)
+        if failed:
+            await ctx.outbox_repository.mark_failed(failed)
+        for message_id, delay in retries.items():
+            await ctx.outbox_repository.retry_message(message_id, delay)
+
+    async def _send(self, message: OutboxMessage) -> None:
+        await self._bot.send_message(
+            chat_id=message.chat_id,
+            text=render_template(message.template, message.params),
+            parse_mode=ParseMode.HTML,
+            rate_limit_args=Priority.NOTIFICATION,
+        )
+
+    async def dispatch(self, flush: bool = False) -> int:
+        messages = await self._claim(flush)
+        if not messages:
+            return 0
+
+        groups = _group(messages)
+        results = await asyncio.gather(
+            *(self._send(_merge(group)) for group in groups),
+            return_exceptions=True,
+        )
+
+        sent, failed, retries = [], [], {}
+        for group, result in zip(groups, results):
+            message = group[-1]
+            message_ids = [message.id for message in group]
+            attempts = max(message.attempts for message in group)
+            if result is None:
+                sent.extend(message_ids)
+                if len(group) > 1:
+                    coalesced_messages.inc(
+                        len(group) - 1, key=message.coalesce_key
+                    )
+            elif isinstance(result, (Forbidden, BadRequest)):
+                log.warning(
+                    f"[CARRY] Outbox messages {message_ids} are rejected: "
+                    f"{result}"
+                )
+                failed.extend(message_ids)
+            elif attempts >= self.max_attempts:
+                log.error(
+                    f"[CARRY] Outbox messages {message_ids} are failed after "
+                    f"{attempts} attempts: {result!r}"
+                )
+                failed.extend(message_ids)
+            else:
+                delay = timedelta(
+                    seconds=self.retry_delay * 2 ** (attempts - 1)
+                )
+                if isinstance(result, RetryAfter):
+                    delay = timedelta(seconds=result.retry_after)
+                retries.update(dict.fromkeys(message_ids, delay))
+
+        await self._complete(sent, failed, retries)
+        return len(messages)
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.outbox.batch_size,
+    interval=settings.outbox.interval,
+    max_attempts=settings.outbox.max_attempts,
+    retry_delay=settings.outbox.retry_delay,
+    lease=settings.outbox.lease,
+    coalesce_window=settings.outbox.coalesce_window,
+    retention=settings.outbox.retention,
+    prune_interval=settings.outbox.prune_interval,
+)
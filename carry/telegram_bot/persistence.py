@@ -0,0 +1,148 @@
+import json
+import asyncio
+import logging
+from copy import deepcopy
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from carry.config import settings
+from carry.context import ctx
+
+log = logging.getLogger(__name__)
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+BOT_DATA = "bot_data"
+CONVERSATION = "conversation:{name}"
+
+
+class PostgresPersistence(BasePersistence[dict, dict, dict]):
+    def __init__(
+        self,
+        update_interval: float = 60,
+        flush_delay: float = 1.0,
+        batch_size: int = 1000,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.flush_delay = flush_delay
+        self.batch_size = batch_size
+        self._pending: dict[tuple[str, str], Any] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @ctx.with_request_context(read_only=True, use_replicas=False)
+    async def _fetch(self, kind: str) -> dict[str, Any]:
+        return await ctx.persistence_repository.fetch_data(kind)
+
+    @ctx.with_request_context
+    async def _write(self, pending: dict[tuple[str, str], Any]) -> None:
+        rows = [
+            {"kind": kind, "key": key, "data": data}
+            for (kind, key), data in pending.items()
+            if data is not None
+        ]
+        for i in range(0, len(rows), self.batch_size):
+            await ctx.persistence_repository.save_data(
+                rows[i : i + self.batch_size]
+            )
+
+        deleted = [key for key, data in pending.items() if data is None]
+        if deleted:
+            await ctx.persistence_repository.delete_data(deleted)
+
+    def _stage(self, kind: str, key: str, data: Any) -> None:
+        self._pending[(kind, key)] = deepcopy(data)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        self._flush_task = None
+        await self._flush_pending()
+        if self._pending and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _flush_pending(self) -> None:
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            try:
+                await self._write(pending)
+            except Exception:
+                log.exception("[CARRY] Cannot flush bot persistence!")
+                self._pending = pending | self._pending
+
+    async def get_user_data(self) -> dict[int, dict]:
+        rows = await self._fetch(USER_DATA)
+        return {int(key): data for key, data in rows.items()}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        rows = await self._fetch(CHAT_DATA)
+        return {int(key): data for key, data in rows.items()}
+
+    async def get_bot_data(self) -> dict:
+        rows = await self._fetch(BOT_DATA)
+        return rows.get("", {})
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        rows = await self._fetch(CONVERSATION.format(name=name))
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage(USER_DATA, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage(CHAT_DATA, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._stage(BOT_DATA, "", data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(
+        self, name: str, key: tuple, new_state: object | None
+    ) -> None:
+        self._stage(CONVERSATION.format(name=name), json.dumps(key), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(USER_DATA, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage(CHAT_DATA, str(chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._flush_pending()
+
+
+def create_persistence() -> PostgresPersistence:
+    return PostgresPersistence(
+        update_interval=settings.persistence.update_interval,
+        flush_delay=settings.persistence.flush_delay,
+        batch_size=settings.persistence.batch_size,
+    )
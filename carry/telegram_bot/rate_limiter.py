@@ -0,0 +1,277 @@
+import time
+import asyncio
+import logging
+import itertools
+from enum import IntEnum
+from typing import Any, Callable, Coroutine
+from dataclasses import field, dataclass
+
+from telegram.ext import BaseRateLimiter
+from telegram.error import RetryAfter, TelegramError
+
+from carry.core.metrics import registry, record_span
+
+log = logging.getLogger(__name__)
+
+bot_api_duration = registry.histogram(
+    "carry_bot_api_duration_seconds", "Bot API request time", ("endpoint",)
+)
+bot_api_errors = registry.counter(
+    "carry_bot_api_errors_total",
+    "Failed Bot API requests",
+    ("endpoint", "error"),
+)
+throttle_wait = registry.histogram(
+    "carry_rate_limiter_wait_seconds",
+    "Time spent waiting for Bot API rate limit tokens",
+    ("priority",),
+)
+queue_depth = registry.gauge(
+    "carry_rate_limiter_queue_depth",
+    "Requests waiting for rate limit tokens",
+    ("priority",),
+)
+
+
+class Priority(IntEnum):
+    REPLY = 0
+    NOTIFICATION = 1
+    BROADCAST = 2
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float) -> None:
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass
+class _Waiter:
+    chat_id: int | str
+    future: asyncio.Future
+
+
+@dataclass
+class RateLimiterStats:
+    requests: int = 0
+    throttled: int = 0
+    retry_after: int = 0
+    max_queue_depth: dict[str, int] = field(
+        default_factory=lambda: {priority.name: 0 for priority in Priority}
+    )
+
+
+class PriorityRateLimiter(BaseRateLimiter[Priority]):
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+        max_chat_buckets: int = 10000,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self.stats = RateLimiterStats()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._lanes: dict[Priority, list[_Waiter]] = {
+            priority: [] for priority in Priority
+        }
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> dict[str, int]:
+        return {
+            priority.name: len(waiters)
+            for priority, waiters in self._lanes.items()
+        }
+
+    async def initialize(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        queue_depth.set_function(
+            lambda: {
+                (name,): depth for name, depth in self.queue_depth.items()
+            }
+        )
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        for waiters in self._lanes.values():
+            for waiter in waiters:
+                waiter.future.cancel()
+            waiters.clear()
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is not None:
+            return bucket
+
+        if len(self._chats) >= self.max_chat_buckets:
+            now = time.monotonic()
+            self._chats = {
+                key: bucket
+                for key, bucket in self._chats.items()
+                if not bucket.is_idle(now)
+            }
+
+        is_group = isinstance(chat_id, str) or chat_id < 0
+        bucket = (
+            TokenBucket(self.group_rate, 1)
+            if is_group
+            else TokenBucket(self.chat_rate, self.chat_burst)
+        )
+        self._chats[chat_id] = bucket
+        return bucket
+
+    def _grant(self) -> float | None:
+        now = time.monotonic()
+        next_delay = None
+        for waiters in self._lanes.values():
+            for waiter in list(waiters):
+                if waiter.future.done():
+                    waiters.remove(waiter)
+                    continue
+
+                global_delay = self._global.delay(now)
+                if global_delay:
+                    return global_delay
+
+                chat_delay = self._chat_bucket(waiter.chat_id).delay(now)
+                if chat_delay:
+                    next_delay = min(next_delay or chat_delay, chat_delay)
+                    continue
+
+                self._global.consume()
+                self._chat_bucket(waiter.chat_id).consume()
+                waiters.remove(waiter)
+                waiter.future.set_result(None)
+        return next_delay
+
+    async def _run(self) -> None:
+        while True:
+            delay = self._grant()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _try_acquire(self, chat_id: int | str) -> bool:
+        if any(self._lanes.values()):
+            return False
+
+        now = time.monotonic()
+        bucket = self._chat_bucket(chat_id)
+        if self._global.delay(now) or bucket.delay(now):
+            return False
+
+        self._global.consume()
+        bucket.consume()
+        return True
+
+    async def _acquire(self, chat_id: int | str, priority: Priority) -> None:
+        if self._try_acquire(chat_id):
+            return
+
+        self.stats.throttled += 1
+        waiter = _Waiter(chat_id, asyncio.get_running_loop().create_future())
+        lane = self._lanes[priority]
+        lane.append(waiter)
+        self.stats.max_queue_depth[priority.name] = max(
+            self.stats.max_queue_depth[priority.name], len(lane)
+        )
+        self._wakeup.set()
+        await waiter.future
+
+    @staticmethod
+    async def _call(
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        wait: float = 0.0,
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except TelegramError as e:
+            bot_api_errors.inc(endpoint=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            bot_api_duration.observe(duration, endpoint=endpoint)
+            record_span("api", endpoint, duration, wait)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Priority | None,
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._call(callback, args, kwargs, endpoint)
+
+        self.stats.requests += 1
+        priority = (
+            Priority.REPLY if rate_limit_args is None else rate_limit_args
+        )
+        for attempt in itertools.count():
+            started = time.perf_counter()
+            await self._acquire(chat_id, priority)
+            wait = time.perf_counter() - started
+            throttle_wait.observe(wait, priority=priority.name)
+            try:
+                return await self._call(callback, args, kwargs, endpoint, wait)
+            except RetryAfter as e:
+                self.stats.retry_after += 1
+                if attempt >= self.max_retries:
+                    raise
+
+                log.warning(
+                    f"[CARRY] Flood limit on '{endpoint}' for chat {chat_id}, "
+                    f"retry after {e.retry_after}s"
+                )
+                self._chat_bucket(chat_id).block(
+                    e.retry_after, time.monotonic()
+                )
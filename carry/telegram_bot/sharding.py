@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+from telegram import Update
+
+
+def shard_key(update: Update) -> int:
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return 0
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    count: int
+
+    @staticmethod
+    def index_for(key: int, count: int) -> int:
+        return key % count
+
+    def owns(self, key: int) -> bool:
+        return self.index_for(key, self.count) == self.index
@@ -0,0 +1,54 @@
+import time
+import logging
+
+from carry.core.metrics import registry
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.first_update: float | None = None
+        self._last_mark = self.started_at
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last_mark
+        self._last_mark = now
+
+    def ready(self) -> None:
+        phases = ", ".join(
+            f"{phase} {duration:.3f}s"
+            for phase, duration in self.phases.items()
+        )
+        log.info(
+            f"[CARRY] Started in {self._last_mark - self.started_at:.3f}s "
+            f"({phases})"
+        )
+
+    def update_handled(self) -> None:
+        if self.first_update is None:
+            self.first_update = time.perf_counter() - self.started_at
+            log.info(
+                f"[CARRY] First update is handled {self.first_update:.3f}s "
+                "after start"
+            )
+
+    def _values(self) -> dict[tuple[str], float]:
+        values = {
+            (phase,): duration for phase, duration in self.phases.items()
+        }
+        if self.first_update is not None:
+            values[("first_update",)] = self.first_update
+        return values
+
+
+startup_timer = StartupTimer()
+
+registry.gauge(
+    "carry_startup_seconds",
+    "Duration of startup phases and time to the first handled update",
+    ("phase",),
+).set_function(startup_timer._values)
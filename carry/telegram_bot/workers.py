@@ -0,0 +1,390 @@
+import os
+import time
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing
+from typing import TYPE_CHECKING
+from functools import partial
+from dataclasses import field, dataclass
+
+from telegram import Update
+
+from carry.config import settings, settings_store
+from carry.core.metrics import registry, metrics_server
+from carry.telegram_bot.logging import setup_logging
+from carry.telegram_bot.startup import startup_timer
+from carry.telegram_bot.sharding import Shard, shard_key
+from carry.telegram_bot.factories import create_bot, create_receiver
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+    from multiprocessing.process import BaseProcess
+
+    from telegram.ext import Application
+
+log = logging.getLogger(__name__)
+
+shard_queued = registry.gauge(
+    "carry_shard_queued_updates",
+    "Updates waiting in the shard queue",
+    ("shard",),
+)
+shard_pending = registry.gauge(
+    "carry_shard_pending_updates",
+    "Updates accepted by the shard but not processed yet",
+    ("shard",),
+)
+shard_received = registry.counter(
+    "carry_shard_received_updates_total",
+    "Updates received by the current shard process",
+    ("shard",),
+)
+shard_restarts = registry.counter(
+    "carry_shard_restarts_total", "Shard process restarts", ("shard",)
+)
+shard_up = registry.gauge(
+    "carry_shard_up", "Whether the shard process is alive", ("shard",)
+)
+
+
+@dataclass
+class WorkerStatus:
+    index: int
+    pid: int
+    received: int
+    pending: int
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class WorkerHealth:
+    index: int
+    pid: int | None = None
+    alive: bool = False
+    restarts: int = 0
+    received: int = 0
+    pending: int = 0
+    queued: int = 0
+    heartbeat_at: float = 0.0
+
+
+class ShardWorker:
+    def __init__(
+        self,
+        shard: Shard,
+        updates: "Queue",
+        status: "Queue",
+        heartbeat_interval: float = 5.0,
+    ):
+        self.shard = shard
+        self.updates = updates
+        self.status = status
+        self.heartbeat_interval = heartbeat_interval
+        self.received = 0
+        self._stopping = asyncio.Event()
+
+    def _send_status(self, application: "Application") -> None:
+        self.status.put(
+            WorkerStatus(
+                index=self.shard.index,
+                pid=multiprocessing.current_process().pid,
+                received=self.received,
+                pending=application.update_queue.qsize(),
+            )
+        )
+
+    async def _heartbeat(self, application: "Application") -> None:
+        while True:
+            self._send_status(application)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _next_update(self) -> dict | None:
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            try:
+                return await loop.run_in_executor(
+                    None, partial(self.updates.get, timeout=0.5)
+                )
+            except queue.Empty:
+                continue
+        return None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self._stopping.set)
+
+        application = create_bot(self.shard)
+        startup_timer.mark("build")
+        async with application:
+            await application.post_init(application)
+            await application.start()
+            heartbeat = asyncio.create_task(self._heartbeat(application))
+            log.info(f"[CARRY] Shard {self.shard.index} is started")
+
+            while (data := await self._next_update()) is not None:
+                update = Update.de_json(data, application.bot)
+                await application.update_queue.put(update)
+                self.received += 1
+
+            log.info(f"[CARRY] Shard {self.shard.index} is stopping")
+            await application.stop()
+            heartbeat.cancel()
+            self._send_status(application)
+            await application.post_stop(application)
+        await application.post_shutdown(application)
+
+
+def _run_worker(
+    shard: Shard,
+    updates: "Queue",
+    status: "Queue",
+    heartbeat_interval: float,
+) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    setup_logging()
+    worker = ShardWorker(shard, updates, status, heartbeat_interval)
+    asyncio.run(worker.run())
+
+
+class ShardSupervisor:
+    def __init__(
+        self,
+        workers: int,
+        heartbeat_interval: float = 5.0,
+        heartbeat_timeout: float = 30.0,
+        max_queue: int = 10000,
+        stop_timeout: float = 30.0,
+    ):
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_queue = max_queue
+        self.stop_timeout = stop_timeout
+        self.health = [WorkerHealth(index) for index in range(workers)]
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: list["Queue"] = [
+            self._context.Queue(max_queue) for _ in range(workers)
+        ]
+        self._status: "Queue" = self._context.Queue()
+        self._processes: list["BaseProcess | None"] = [None] * workers
+        self._task: asyncio.Task | None = None
+
+        for metric, attribute in (
+            (shard_queued, "queued"),
+            (shard_pending, "pending"),
+            (shard_received, "received"),
+            (shard_restarts, "restarts"),
+            (shard_up, "alive"),
+        ):
+            metric.set_function(partial(self._health_values, attribute))
+
+    def _health_values(self, attribute: str) -> dict[tuple[str], float]:
+        return {
+            (str(health.index),): float(getattr(health, attribute))
+            for health in self.health
+        }
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=_run_worker,
+            args=(
+                Shard(index, self.workers),
+                self._queues[index],
+                self._status,
+                self.heartbeat_interval,
+            ),
+            name=f"carry-shard-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+
+        health = self.health[index]
+        health.pid, health.alive = process.pid, True
+        health.heartbeat_at = time.time()
+
+    def _reset_queue(self, index: int) -> None:
+        log.warning(
+            f"[CARRY] Shard {index} was killed, its queue is recreated and "
+            f"~{self.health[index].queued} updates are dropped"
+        )
+        self._queues[index] = self._context.Queue(self.max_queue)
+
+    async def _join(self, process: "BaseProcess") -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, process.join, self.stop_timeout)
+        if process.is_alive():
+            log.warning(f"[CARRY] Killing unresponsive {process.name}")
+            process.kill()
+            await loop.run_in_executor(None, process.join)
+
+    async def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+        self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        loop = asyncio.get_running_loop()
+        for updates in self._queues:
+            await loop.run_in_executor(None, updates.put, None)
+        for process in self._processes:
+            if process is not None:
+                await self._join(process)
+        self._collect()
+        for health in self.health:
+            health.alive = False
+
+    async def restart(self, index: int) -> None:
+        process = self._processes[index]
+        if process is not None and process.is_alive():
+            process.terminate()
+            await self._join(process)
+        if process is not None and process.exitcode == -signal.SIGKILL:
+            self._reset_queue(index)
+
+        self.health[index].restarts += 1
+        self._spawn(index)
+
+    def reload(self) -> None:
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+
+    async def route(self, update: Update) -> None:
+        index = Shard.index_for(shard_key(update), self.workers)
+        updates, data = self._queues[index], update.to_dict()
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            log.warning(f"[CARRY] Shard {index} queue is full")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, updates.put, data)
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                status: WorkerStatus = self._status.get_nowait()
+            except queue.Empty:
+                break
+
+            health = self.health[status.index]
+            if status.pid != health.pid:
+                continue
+            health.received, health.pending = status.received, status.pending
+            health.heartbeat_at = status.timestamp
+
+        for index, updates in enumerate(self._queues):
+            self.health[index].queued = updates.qsize()
+
+    async def _check(self, index: int) -> None:
+        process, health = self._processes[index], self.health[index]
+        if not process.is_alive():
+            health.alive = False
+            log.warning(
+                f"[CARRY] Shard {index} exited with code {process.exitcode}, "
+                "restarting"
+            )
+            await self.restart(index)
+        elif time.time() - health.heartbeat_at > self.heartbeat_timeout:
+            log.warning(f"[CARRY] Shard {index} missed heartbeats, restarting")
+            await self.restart(index)
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self._collect()
+            for index in range(self.workers):
+                await self._check(index)
+            log.info(
+                "[CARRY] Shards: "
+                + ", ".join(
+                    f"#{health.index} queued={health.queued} "
+                    f"pending={health.pending} received={health.received}"
+                    for health in self.health
+                )
+            )
+
+
+async def _route_updates(
+    receiver: "Application", supervisor: ShardSupervisor
+) -> None:
+    while True:
+        update = await receiver.update_queue.get()
+        try:
+            await supervisor.route(update)
+        finally:
+            receiver.update_queue.task_done()
+
+
+async def serve_sharded(
+    supervisor: ShardSupervisor, stopping: asyncio.Event
+) -> None:
+    await supervisor.start()
+    if settings.metrics.enabled:
+        await metrics_server.start()
+    receiver = create_receiver()
+    async with receiver:
+        if settings.bot.mode == "webhook":
+            webhook = settings.bot.webhook
+            await receiver.updater.start_webhook(
+                listen=webhook.listen,
+                port=webhook.port,
+                url_path=webhook.url_path,
+                webhook_url=webhook.url,
+                secret_token=webhook.secret_token or None,
+            )
+        else:
+            await receiver.updater.start_polling()
+
+        router = asyncio.create_task(_route_updates(receiver, supervisor))
+        await stopping.wait()
+        await receiver.updater.stop()
+        await receiver.update_queue.join()
+        router.cancel()
+        await asyncio.gather(router, return_exceptions=True)
+    await supervisor.stop()
+    await metrics_server.stop()
+
+
+def create_supervisor() -> ShardSupervisor:
+    if not settings.cache.users.notify_channel:
+        raise ValueError(
+            "cache.users.notify_channel must be set when workers.count > 1, "
+            "otherwise shards serve stale balances from their user caches"
+        )
+    if settings.search.in_memory:
+        log.warning(
+            "[CARRY] search.in_memory is enabled, users registered in other "
+            "shards appear in search results only after a restart"
+        )
+    return ShardSupervisor(
+        workers=settings.workers.count,
+        heartbeat_interval=settings.workers.heartbeat_interval,
+        heartbeat_timeout=settings.workers.heartbeat_timeout,
+        max_queue=settings.workers.max_queue,
+        stop_timeout=settings.workers.stop_timeout,
+    )
+
+
+def run_sharded() -> None:
+    def reload(supervisor: ShardSupervisor) -> None:
+        settings_store.reload()
+        supervisor.reload()
+
+    async def main() -> None:
+        stopping = asyncio.Event()
+        supervisor = create_supervisor()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        loop.add_signal_handler(signal.SIGHUP, reload, supervisor)
+        await serve_sharded(supervisor, stopping)
+
+    asyncio.run(main())
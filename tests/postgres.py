@@ -0,0 +1,44 @@
+import os
+import unittest
+from typing import AsyncIterator
+from unittest import IsolatedAsyncioTestCase, mock
+from contextlib import asynccontextmanager
+
+from sqlalchemy import Table
+
+from carry.db.core import Database, metadata
+
+TEST_DB_URI = os.environ.get("CARRY_TEST_DB_URI")
+
+
+class Scope:
+    def __init__(self, session):
+        self.session = session
+
+    def pin_reads(self, keys) -> None:
+        pass
+
+
+@unittest.skipUnless(TEST_DB_URI, "CARRY_TEST_DB_URI is not set")
+class PostgresTestCase(IsolatedAsyncioTestCase):
+    tables: tuple[Table, ...] = ()
+
+    async def asyncSetUp(self):
+        self.database = Database(TEST_DB_URI)
+        patcher = mock.patch("carry.db.core.database", self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        async with self.database.engine.begin() as connection:
+            await connection.run_sync(metadata.drop_all, tables=self.tables)
+            await connection.run_sync(metadata.create_all, tables=self.tables)
+
+    async def asyncTearDown(self):
+        async with self.database.engine.begin() as connection:
+            await connection.run_sync(metadata.drop_all, tables=self.tables)
+        await self.database.dispose()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[Scope]:
+        async with self.database.session_factory() as session:
+            async with session.begin():
+                yield Scope(session)
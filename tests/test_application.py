@@ -0,0 +1,67 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from telegram.ext import MessageHandler, ApplicationBuilder, filters
+
+from benchmarks.fake_api import FakeTelegramAPI
+from carry.telegram_bot.application import ChatOrderedApplication
+
+BURST_CHAT_ID, OTHER_CHAT_ID = 1, 2
+BURST = 5
+
+
+class ChatOrderTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.handled: list[tuple[int, int]] = []
+        self.api = FakeTelegramAPI(port=0)
+        await self.api.start()
+        self.application = (
+            ApplicationBuilder()
+            .token("1:fake")
+            .base_url(self.api.base_url)
+            .base_file_url(self.api.base_file_url)
+            .http_version("1.1")
+            .get_updates_http_version("1.1")
+            .application_class(ChatOrderedApplication)
+            .concurrent_updates(2)
+            .build()
+        )
+        self.application.add_handler(
+            MessageHandler(filters.TEXT, self._handle)
+        )
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.updater.start_polling(poll_interval=0.0)
+
+    async def asyncTearDown(self):
+        await self.application.updater.stop()
+        await self.application.stop()
+        await self.application.shutdown()
+        await self.api.stop()
+
+    async def _handle(self, update, context) -> None:
+        number = int(update.message.text)
+        await asyncio.sleep(0.01 * (BURST - number))
+        self.handled.append((update.effective_chat.id, number))
+
+    async def _wait_handled(self, count: int) -> None:
+        async with asyncio.timeout(5):
+            while len(self.handled) < count:
+                await asyncio.sleep(0.005)
+
+    async def test_updates_of_one_chat_are_handled_in_order(self):
+        for number in range(BURST):
+            await self.api.push_update(
+                self.api.make_message_update(BURST_CHAT_ID, str(number))
+            )
+        await self.api.push_update(
+            self.api.make_message_update(OTHER_CHAT_ID, str(BURST))
+        )
+        await self._wait_handled(BURST + 1)
+
+        burst = [n for chat_id, n in self.handled if chat_id == BURST_CHAT_ID]
+        self.assertEqual(burst, list(range(BURST)))
+        self.assertLess(
+            self.handled.index((OTHER_CHAT_ID, BURST)),
+            self.handled.index((BURST_CHAT_ID, BURST - 1)),
+        )
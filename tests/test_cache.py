@@ -0,0 +1,99 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from carry.core.cache import AsyncLRUCache
+
+
+class Loader:
+    def __init__(self, value: object = "value"):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> object:
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class AsyncLRUCacheTest(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = AsyncLRUCache(maxsize=10, ttl=60.0)
+
+    async def _start(self, *loaders: Loader) -> list[asyncio.Task]:
+        tasks = []
+        for loader in loaders:
+            tasks.append(
+                asyncio.create_task(self.cache.get_or_load(1, loader))
+            )
+            await asyncio.sleep(0)
+        return tasks
+
+    async def test_concurrent_misses_share_one_load(self):
+        loader = Loader()
+        tasks = await self._start(loader, loader, loader)
+        loader.release.set()
+
+        self.assertEqual(await asyncio.gather(*tasks), ["value"] * 3)
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(self.cache.get(1), "value")
+        self.assertEqual(self.cache.stats.misses, 3)
+
+    async def test_load_error_reaches_every_waiter_and_is_not_cached(self):
+        loader = Loader(ValueError("boom"))
+        tasks = await self._start(loader, loader)
+        loader.release.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(loader.calls, 1)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache._loading, {})
+
+    async def test_cancelled_load_hands_over_to_waiters(self):
+        loader = Loader()
+        owner, waiter = await self._start(loader, loader)
+
+        owner.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        self.assertEqual(await asyncio.wait_for(waiter, 1), "value")
+        self.assertTrue(owner.cancelled())
+        self.assertEqual(loader.calls, 2)
+        self.assertEqual(self.cache._loading, {})
+
+    async def test_cancelled_waiter_does_not_cancel_load(self):
+        loader = Loader()
+        owner, waiter = await self._start(loader, loader)
+
+        waiter.cancel()
+        await asyncio.sleep(0)
+        loader.release.set()
+
+        self.assertEqual(await owner, "value")
+        self.assertTrue(waiter.cancelled())
+        self.assertEqual(self.cache.get(1), "value")
+
+    async def test_invalidation_during_load_skips_caching(self):
+        loader = Loader()
+        (task,) = await self._start(loader)
+
+        self.cache.invalidate(1)
+        loader.release.set()
+
+        self.assertEqual(await task, "value")
+        self.assertIsNone(self.cache.get(1))
+
+    def test_evicts_least_recently_used(self):
+        cache = AsyncLRUCache(maxsize=2, ttl=60.0)
+        cache.set(1, "one")
+        cache.set(2, "two")
+        cache.get(1)
+        cache.set(3, "three")
+
+        self.assertEqual(cache.get(1), "one")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.stats.evictions, 1)
@@ -0,0 +1,35 @@
+from unittest import IsolatedAsyncioTestCase, mock
+
+from carry.db import core
+from carry.db.replicas import ReplicaRouter
+
+
+class PinCommittedTest(IsolatedAsyncioTestCase):
+    async def _close(self, router: ReplicaRouter) -> mock.AsyncMock:
+        scope = core.DBSessionScope()
+        scope._session = mock.AsyncMock()
+        connection = scope._session.connection.return_value
+        connection.execute.return_value = mock.Mock(
+            **{"scalar_one.return_value": "0/16B3748"}
+        )
+        scope._pinned_keys = {1}
+        with mock.patch.object(core, "replica_router", router):
+            await scope.close(commit=True)
+        return scope._session
+
+    async def test_no_lsn_is_read_without_replicas(self):
+        session = await self._close(ReplicaRouter([]))
+
+        session.commit.assert_awaited_once()
+        session.connection.assert_not_awaited()
+        session.execute.assert_not_awaited()
+
+    async def test_lsn_is_read_outside_a_transaction(self):
+        router = ReplicaRouter([mock.Mock()])
+        session = await self._close(router)
+
+        session.connection.assert_awaited_once_with(
+            execution_options={"isolation_level": "AUTOCOMMIT"}
+        )
+        session.execute.assert_not_awaited()
+        self.assertEqual(router._pins[1][0], 0x16B3748)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import select
+
+from carry.db import users, bonus_transactions
+from tests.postgres import PostgresTestCase
+from carry.core.repositories import UserRepository, BonusLedgerRepository
+
+USER_ID = 1
+LEGACY_BONUSES = 100
+
+
+class PreLedgerBalanceExpiryTest(PostgresTestCase):
+    tables = (users, bonus_transactions)
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.transaction() as scope:
+            await scope.session.execute(
+                users.insert().values(
+                    id=USER_ID,
+                    chat_id=USER_ID,
+                    first_name="User",
+                    bonuses=LEGACY_BONUSES,
+                )
+            )
+
+    async def _expire(self, cutoff: datetime) -> list[int]:
+        async with self.transaction() as scope:
+            repository = UserRepository(scope)
+            chunk = await repository.fetch_expiry_chunk(0, 10, cutoff)
+            expiring = [user_id for user_id, expires in chunk if expires]
+            if not expiring:
+                return []
+            expired = await repository.expire_bonuses(expiring, cutoff)
+            return [bonuses for _, bonuses in expired]
+
+    async def _open(self) -> int:
+        async with self.transaction() as scope:
+            return await BonusLedgerRepository(scope).open_balances(10)
+
+    async def _balance(self) -> int:
+        async with self.transaction() as scope:
+            return await UserRepository(scope).fetch_balance(USER_ID)
+
+    async def test_unopened_balance_survives_an_expiry_run(self):
+        self.assertEqual(await self._expire(datetime.now(timezone.utc)), [])
+        self.assertEqual(await self._balance(), LEGACY_BONUSES)
+
+    async def test_opened_balance_expires_a_period_after_opening(self):
+        self.assertEqual(await self._open(), 1)
+        self.assertEqual(await self._open(), 0)
+        async with self.transaction() as scope:
+            result = await scope.session.execute(
+                select(users.c.bonuses).where(users.c.id == USER_ID)
+            )
+            self.assertEqual(result.scalar_one(), 0)
+        self.assertEqual(await self._balance(), LEGACY_BONUSES)
+
+        opened_at = datetime.now(timezone.utc)
+        self.assertEqual(await self._expire(opened_at - timedelta(days=1)), [])
+        self.assertEqual(await self._balance(), LEGACY_BONUSES)
+
+        self.assertEqual(
+            await self._expire(opened_at + timedelta(minutes=1)),
+            [LEGACY_BONUSES],
+        )
+        self.assertEqual(await self._balance(), 0)
+
+    async def test_opened_balance_survives_compaction(self):
+        await self._open()
+        async with self.transaction() as scope:
+            repository = BonusLedgerRepository(scope)
+            _, since = await repository.fetch_bounds()
+            self.assertEqual(await repository.compact([USER_ID], since), 1)
+
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        self.assertEqual(await self._expire(yesterday), [])
+        self.assertEqual(await self._balance(), LEGACY_BONUSES)
@@ -0,0 +1,56 @@
+import io
+import asyncio
+
+from sqlalchemy import select
+
+from carry.db import users, bonus_transactions
+from tests.postgres import Scope, PostgresTestCase
+from carry.core.repositories import UserRepository
+
+IMPORT = (
+    b"id,chat_id,first_name,last_name,username,bonuses\n"
+    b"1,1,User,,,50\n"
+    b"2,2,New,,,7\n"
+)
+
+
+class ImportUsersTest(PostgresTestCase):
+    tables = (users, bonus_transactions)
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.transaction() as scope:
+            await scope.session.execute(
+                users.insert().values(
+                    id=1, chat_id=1, first_name="User", bonuses=0
+                )
+            )
+            await UserRepository(scope).increase_user_balance(1, 10)
+
+    async def _import(self) -> int:
+        async with self.transaction() as scope:
+            return await UserRepository(scope).import_users(
+                io.BytesIO(IMPORT), "csv"
+            )
+
+    async def _fetch(self, user_id: int) -> tuple[int, int]:
+        async with self.transaction() as scope:
+            balance = await UserRepository(scope).fetch_balance(user_id)
+            result = await scope.session.execute(
+                select(users.c.bonuses).where(users.c.id == user_id)
+            )
+            return balance, result.scalar_one()
+
+    async def test_import_waits_for_concurrent_decrements(self):
+        async with self.database.session_factory() as session:
+            async with session.begin():
+                await UserRepository(Scope(session)).decrease_user_balance(
+                    1, 4
+                )
+                importing = asyncio.create_task(self._import())
+                await asyncio.sleep(0.2)
+                self.assertFalse(importing.done())
+
+        self.assertEqual(await importing, 2)
+        self.assertEqual(await self._fetch(1), (50, 0))
+        self.assertEqual(await self._fetch(2), (7, 0))
@@ -0,0 +1,147 @@
+from datetime import date, datetime, timezone
+from unittest import IsolatedAsyncioTestCase
+
+from sqlalchemy import func, select, literal_column
+
+from carry.db import users, ledger_partition, bonus_transactions
+from tests.postgres import Scope, PostgresTestCase
+from carry.core.repositories import UserRepository, BonusLedgerRepository
+from carry.telegram_bot.ledger import LedgerCompactor
+
+USER_ID = 1
+
+
+class LedgerCompactionTest(PostgresTestCase):
+    tables = (users, bonus_transactions)
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.transaction() as scope:
+            await scope.session.execute(
+                users.insert().values(
+                    id=USER_ID, chat_id=USER_ID, first_name="User", bonuses=0
+                )
+            )
+
+    async def _increase(self, bonuses: int) -> None:
+        async with self.transaction() as scope:
+            await UserRepository(scope).increase_user_balance(USER_ID, bonuses)
+
+    async def _compact(self) -> int:
+        async with self.transaction() as scope:
+            repository = BonusLedgerRepository(scope)
+            _, since = await repository.fetch_bounds()
+            return await repository.compact([USER_ID], since)
+
+    async def _fetch(self) -> tuple[int, int]:
+        async with self.transaction() as scope:
+            balance = await UserRepository(scope).fetch_balance(USER_ID)
+            result = await scope.session.execute(
+                select(users.c.bonuses).where(users.c.id == USER_ID)
+            )
+            return balance, result.scalar_one()
+
+    async def test_compaction_rolls_the_ledger_into_the_snapshot(self):
+        for bonuses in (5, 7, 11):
+            await self._increase(bonuses)
+
+        self.assertEqual(await self._compact(), 1)
+        self.assertEqual(await self._fetch(), (23, 23))
+
+        await self._increase(2)
+        self.assertEqual(await self._fetch(), (25, 23))
+
+    async def test_compaction_keeps_uncommitted_increments(self):
+        await self._increase(5)
+
+        async with self.database.session_factory() as session:
+            async with session.begin():
+                await UserRepository(Scope(session)).increase_user_balance(
+                    USER_ID, 7
+                )
+                self.assertEqual(await self._compact(), 1)
+                self.assertEqual(await self._fetch(), (5, 5))
+
+        self.assertEqual(await self._fetch(), (12, 5))
+        self.assertEqual(await self._compact(), 1)
+        self.assertEqual(await self._fetch(), (12, 12))
+
+
+class LedgerPartitionTest(PostgresTestCase):
+    tables = (bonus_transactions,)
+
+    async def _partition_of(self, created_at: datetime) -> str:
+        async with self.transaction() as scope:
+            result = await scope.session.execute(
+                bonus_transactions.insert()
+                .values(user_id=USER_ID, delta=1, reason="increase")
+                .values(created_at=created_at)
+                .returning(literal_column("tableoid::regclass::text"))
+            )
+            return result.scalar_one()
+
+    async def test_current_and_next_months_are_created_with_the_table(self):
+        month = date.today()
+        for _ in range(2):
+            name, start, month = ledger_partition(month)
+            partition = await self._partition_of(
+                datetime(start.year, start.month, 15, tzinfo=timezone.utc)
+            )
+            self.assertEqual(partition, name)
+
+    async def test_rows_of_a_new_month_are_moved_out_of_default(self):
+        name, start, _ = ledger_partition(date(2099, 5, 1))
+        created_at = datetime(2099, 5, 15, tzinfo=timezone.utc)
+        self.assertEqual(
+            await self._partition_of(created_at), "bonus_transactions_default"
+        )
+
+        async with self.transaction() as scope:
+            repository = BonusLedgerRepository(scope)
+            self.assertEqual(await repository.create_partition(start), 1)
+            self.assertEqual(await repository.create_partition(start), 0)
+
+        async with self.transaction() as scope:
+            result = await scope.session.execute(
+                select(
+                    literal_column("tableoid::regclass::text"), func.count()
+                )
+                .select_from(bonus_transactions)
+                .group_by(literal_column("tableoid"))
+            )
+            self.assertEqual(dict(result.all()), {name: 1})
+        self.assertEqual(
+            await self._partition_of(
+                datetime(2099, 9, 1, tzinfo=timezone.utc)
+            ),
+            "bonus_transactions_default",
+        )
+
+
+class FailingCompactor(LedgerCompactor):
+    def __init__(self, failing: date):
+        super().__init__(partitions_ahead=2)
+        self.failing = failing
+        self.created: list[date] = []
+
+    async def _create_partition(self, month: date) -> int:
+        if month == self.failing:
+            raise RuntimeError("partition constraint violated")
+        self.created.append(month)
+        return 0
+
+
+class CreatePartitionsTest(IsolatedAsyncioTestCase):
+    async def test_a_failed_month_does_not_stop_later_months(self):
+        months = [date.today().replace(day=1)]
+        for _ in range(2):
+            months.append(ledger_partition(months[-1])[2])
+        compactor = FailingCompactor(months[0])
+
+        with self.assertLogs("carry.telegram_bot.ledger", "ERROR"):
+            await compactor.create_partitions()
+        self.assertEqual(compactor.created, months[1:])
+
+        compactor.failing = None
+        await compactor.create_partitions()
+        self.assertEqual(compactor.created, [*months[1:], months[0]])
@@ -0,0 +1,219 @@
+import asyncio
+from types import SimpleNamespace
+from datetime import timedelta
+
+from sqlalchemy import func, insert, select
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from carry.db import outbox
+from tests.postgres import PostgresTestCase
+from benchmarks.fake_api import FakeTelegramAPI
+from carry.core.entities import User
+from carry.core.repositories import OutboxRepository
+from carry.telegram_bot.outbox import OutboxDispatcher, balance_message
+from carry.telegram_bot.rate_limiter import PriorityRateLimiter
+
+INCREASE = "telegram/increase_bonuses/user.jinja2"
+DECREASE = "telegram/decrease_bonuses/user.jinja2"
+LEASE = timedelta(seconds=60)
+WINDOW = timedelta(seconds=10)
+MAX_ATTEMPTS = 3
+
+
+def _balance(chat_id: int, delta: int, total: int) -> dict:
+    user = User(chat_id, chat_id, "User", None, None, total)
+    return balance_message(user, delta, INCREASE if delta > 0 else DECREASE)
+
+
+class OutboxTestCase(PostgresTestCase):
+    tables = (outbox,)
+
+    async def _add(self, *messages: dict, delay: timedelta | None = WINDOW):
+        async with self.transaction() as scope:
+            await OutboxRepository(scope).add_messages(list(messages), delay)
+
+    async def _claim(self, limit: int = 10, flush: bool = False) -> list[int]:
+        async with self.transaction() as scope:
+            messages = await OutboxRepository(scope).claim_messages(
+                limit, LEASE, MAX_ATTEMPTS, flush
+            )
+        return [message.id for message in messages]
+
+    async def _fetch(self, column) -> dict[int, object]:
+        async with self.transaction() as scope:
+            result = await scope.session.execute(
+                select(outbox.c.id, column).order_by(outbox.c.id)
+            )
+            return dict(result.all())
+
+    async def _due(self) -> list[int]:
+        due = await self._fetch(outbox.c.available_at <= func.now())
+        return [message_id for message_id, is_due in due.items() if is_due]
+
+
+class OutboxClaimTest(OutboxTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.transaction() as scope:
+            for available_in, messages in (
+                (timedelta(), [_balance(10, 5, 5)]),
+                (
+                    timedelta(minutes=5),
+                    [
+                        _balance(10, -2, 3),
+                        _balance(20, 7, 7),
+                        {
+                            **_balance(10, 1, 4),
+                            "coalesce_key": None,
+                        },
+                    ],
+                ),
+            ):
+                await scope.session.execute(
+                    insert(outbox).values(
+                        available_at=func.now() + available_in
+                    ),
+                    messages,
+                )
+
+    async def test_claim_takes_pending_siblings_of_due_messages(self):
+        self.assertEqual(await self._claim(), [1, 2])
+        self.assertEqual(
+            await self._fetch(outbox.c.attempts), {1: 1, 2: 1, 3: 0, 4: 0}
+        )
+
+    async def test_claimed_messages_are_leased(self):
+        await self._claim()
+
+        self.assertEqual(await self._claim(), [])
+
+    async def test_flush_claims_every_coalescable_message(self):
+        self.assertEqual(await self._claim(flush=True), [1, 2, 3])
+
+    async def test_claim_limit_does_not_split_a_group(self):
+        self.assertEqual(await self._claim(limit=1), [1, 2])
+
+    async def test_abandoned_last_attempts_are_failed(self):
+        async with self.transaction() as scope:
+            await scope.session.execute(
+                insert(outbox).values(
+                    chat_id=30,
+                    template=INCREASE,
+                    params={},
+                    attempts=MAX_ATTEMPTS,
+                    available_at=func.now() - timedelta(seconds=1),
+                )
+            )
+            exhausted = await OutboxRepository(scope).fail_exhausted(
+                MAX_ATTEMPTS
+            )
+
+        self.assertEqual(exhausted, [5])
+        self.assertEqual(await self._claim(), [1, 2])
+        self.assertIsNotNone((await self._fetch(outbox.c.failed_at))[5])
+
+    async def test_finished_messages_are_deleted_after_retention(self):
+        async with self.transaction() as scope:
+            repository = OutboxRepository(scope)
+            await repository.mark_sent([1])
+            await repository.mark_failed([2])
+            await scope.session.execute(
+                outbox.update()
+                .where(outbox.c.id == 1)
+                .values(sent_at=func.now() - timedelta(days=8))
+            )
+            deleted = await repository.delete_finished(
+                timedelta(days=7), limit=10
+            )
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(await self._fetch(outbox.c.id)), [2, 3, 4])
+
+
+class OutboxCoalesceDelayTest(OutboxTestCase):
+    async def test_lone_messages_are_due_immediately(self):
+        await self._add(_balance(10, 5, 5), _balance(20, 7, 7))
+
+        self.assertEqual(await self._due(), [1, 2])
+
+    async def test_messages_with_pending_siblings_wait_for_the_window(self):
+        await self._add(_balance(10, 5, 5))
+        await self._add(_balance(10, -2, 3), _balance(10, 1, 4))
+
+        self.assertEqual(await self._due(), [1])
+        self.assertEqual(await self._claim(), [1, 2, 3])
+
+    async def test_messages_after_a_recent_send_wait_for_the_window(self):
+        await self._add(_balance(10, 5, 5))
+        async with self.transaction() as scope:
+            await OutboxRepository(scope).mark_sent([1])
+        await self._add(_balance(10, -2, 3))
+        self.assertEqual(await self._due(), [])
+
+        async with self.transaction() as scope:
+            await scope.session.execute(
+                outbox.update().values(sent_at=func.now() - 2 * WINDOW)
+            )
+        await self._add(_balance(10, 1, 4))
+        self.assertEqual(await self._due(), [3])
+
+
+class OutboxDispatcherTest(OutboxTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.api = FakeTelegramAPI(port=0)
+        await self.api.start()
+        self.bot = ExtBot(
+            "1:fake",
+            base_url=self.api.base_url,
+            base_file_url=self.api.base_file_url,
+            request=HTTPXRequest(http_version="1.1"),
+            rate_limiter=PriorityRateLimiter(),
+        )
+        await self.bot.initialize()
+        self.dispatcher = OutboxDispatcher(
+            batch_size=10, coalesce_window=WINDOW.total_seconds()
+        )
+
+    async def asyncTearDown(self):
+        await self.bot.shutdown()
+        await self.api.stop()
+        await super().asyncTearDown()
+
+    async def _dispatch(self, expected: int) -> dict[int, str]:
+        await self.dispatcher.start(SimpleNamespace(bot=self.bot))
+        try:
+            async with asyncio.timeout(2):
+                while len(self.api.calls_to("sendMessage")) < expected:
+                    await asyncio.sleep(0.01)
+        finally:
+            await self.dispatcher.stop()
+
+        calls = self.api.calls_to("sendMessage")
+        self.assertEqual(len(calls), expected)
+        return {
+            int(call.params["chat_id"]): call.params["text"] for call in calls
+        }
+
+    async def test_lone_change_is_sent_without_waiting(self):
+        await self._add(_balance(10, 5, 5))
+
+        texts = await self._dispatch(1)
+
+        self.assertIn("5", texts[10])
+        self.assertIsNotNone((await self._fetch(outbox.c.sent_at))[1])
+
+    async def test_burst_is_sent_as_one_summary_per_customer(self):
+        await self._add(_balance(10, 5, 5))
+        await self._add(_balance(10, -2, 3))
+        await self._add(_balance(20, 7, 7))
+
+        texts = await self._dispatch(2)
+
+        self.assertIn("+5", texts[10])
+        self.assertIn("-2", texts[10])
+        self.assertIn("<b>+3</b>", texts[10])
+        self.assertIn("7", texts[20])
+        sent_at = await self._fetch(outbox.c.sent_at)
+        self.assertTrue(all(sent_at.values()))
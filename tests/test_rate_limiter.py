@@ -0,0 +1,102 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from telegram.error import RetryAfter
+
+from carry.telegram_bot.rate_limiter import Priority, PriorityRateLimiter
+
+
+class PriorityRateLimiterTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sent: list[str] = []
+        self.limiter = PriorityRateLimiter(
+            global_rate=20.0, chat_rate=20.0, chat_burst=20.0
+        )
+        await self.limiter.initialize()
+
+    async def asyncTearDown(self):
+        await self.limiter.shutdown()
+
+    def _request(
+        self, name: str, chat_id: int, priority: Priority | None = None
+    ) -> asyncio.Task:
+        async def callback() -> str:
+            self.sent.append(name)
+            return name
+
+        return asyncio.create_task(
+            self.limiter.process_request(
+                callback, (), {}, "sendMessage", {"chat_id": chat_id}, priority
+            )
+        )
+
+    async def _exhaust_global(self) -> None:
+        tokens = int(self.limiter._global.tokens)
+        await asyncio.gather(
+            *(self._request(f"warm-{i}", 1000 + i) for i in range(tokens))
+        )
+        self.sent.clear()
+
+    async def test_higher_priority_lanes_are_served_first(self):
+        await self._exhaust_global()
+        tasks = []
+        for name, priority in (
+            ("broadcast", Priority.BROADCAST),
+            ("notification", Priority.NOTIFICATION),
+            ("reply", Priority.REPLY),
+        ):
+            tasks.append(self._request(name, len(tasks) + 1, priority))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(self.sent, ["reply", "notification", "broadcast"])
+
+    async def test_requests_keep_order_within_a_lane(self):
+        await self._exhaust_global()
+        tasks = [
+            self._request(f"broadcast-{i}", i + 1, Priority.BROADCAST)
+            for i in range(3)
+        ]
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(
+            self.sent, ["broadcast-0", "broadcast-1", "broadcast-2"]
+        )
+
+    async def test_throttled_chat_does_not_block_other_chats(self):
+        self.limiter.chat_rate, self.limiter.chat_burst = 2.0, 1.0
+        await self._request("first", 1)
+        tasks = [self._request("second", 1), self._request("other", 2)]
+        await asyncio.gather(*tasks)
+
+        self.assertEqual(self.sent, ["first", "other", "second"])
+
+    async def test_retry_after_blocks_the_chat_and_retries(self):
+        attempts = 0
+
+        async def callback() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise RetryAfter(0.05)
+            return "sent"
+
+        result = await self.limiter.process_request(
+            callback, (), {}, "sendMessage", {"chat_id": 1}, None
+        )
+
+        self.assertEqual(result, "sent")
+        self.assertEqual(attempts, 2)
+        self.assertEqual(self.limiter.stats.retry_after, 1)
+
+    async def test_requests_without_chat_are_not_limited(self):
+        self.limiter._global.tokens = 0
+
+        async def callback() -> str:
+            return "me"
+
+        result = await asyncio.wait_for(
+            self.limiter.process_request(callback, (), {}, "getMe", {}, None),
+            0.01,
+        )
+        self.assertEqual(result, "me")